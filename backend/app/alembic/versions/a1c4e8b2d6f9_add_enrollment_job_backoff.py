@@ -0,0 +1,28 @@
+"""Add not_before to enrollment_jobs for retry backoff
+
+Revision ID: a1c4e8b2d6f9
+Revises: f3b9d2c71a48
+Create Date: 2026-10-19 20:31:08.114562
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c4e8b2d6f9'
+down_revision: Union[str, Sequence[str], None] = 'f3b9d2c71a48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('enrollment_jobs', sa.Column('not_before', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('enrollment_jobs', 'not_before')
@@ -0,0 +1,65 @@
+"""Move raw photo bytes into range-partitioned photo_blobs
+
+Revision ID: b81e4a6f0c27
+Revises: 3f7b2c9d1e45
+Create Date: 2026-10-19 11:40:27.902114
+
+"""
+from datetime import date, timedelta
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b81e4a6f0c27'
+down_revision: Union[str, Sequence[str], None] = '3f7b2c9d1e45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        CREATE TABLE photo_blobs (
+            photo_id integer NOT NULL REFERENCES photos(id) ON DELETE CASCADE,
+            created_at timestamp NOT NULL,
+            image_data bytea NOT NULL,
+            PRIMARY KEY (photo_id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("CREATE TABLE photo_blobs_default PARTITION OF photo_blobs DEFAULT")
+
+    # One partition per month from the oldest photo until three months from now
+    oldest = op.get_bind().execute(sa.text("SELECT min(created_at) FROM photos")).scalar()
+    month = (oldest.date() if oldest else date.today()).replace(day=1)
+    last = date.today().replace(day=1)
+    for _ in range(3):
+        last = _next_month(last)
+
+    while month <= last:
+        end = _next_month(month)
+        op.execute(
+            f"CREATE TABLE photo_blobs_y{month.year:04d}m{month.month:02d} PARTITION OF photo_blobs "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        month = end
+
+    op.execute("UPDATE photos SET created_at = now() WHERE created_at IS NULL")
+    op.execute("INSERT INTO photo_blobs (photo_id, created_at, image_data) SELECT id, created_at, image_data FROM photos")
+    op.drop_column('photos', 'image_data')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('photos', sa.Column('image_data', sa.LargeBinary(), nullable=True))
+    op.execute("UPDATE photos p SET image_data = b.image_data FROM photo_blobs b WHERE b.photo_id = p.id")
+    # Photos whose bytes were dropped by retention can't be restored
+    op.execute("DELETE FROM photos WHERE image_data IS NULL")
+    op.alter_column('photos', 'image_data', nullable=False)
+    op.execute("DROP TABLE photo_blobs")
@@ -0,0 +1,56 @@
+"""Add owner_id to gallery tables with per-owner vector indexes
+
+Revision ID: c4d09a7e5b13
+Revises: b81e4a6f0c27
+Create Date: 2026-10-19 14:05:51.630447
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d09a7e5b13'
+down_revision: Union[str, Sequence[str], None] = 'b81e4a6f0c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OWNED_TABLES = ['photos', 'detected_faces', 'face_encodings', 'person_info', 'enrollment_jobs']
+
+# sha1("default")[:16] - same naming as services.vector_index.owner_index_name
+DEFAULT_OWNER_INDEX = 'ix_face_encodings_hnsw_7505d64a54e061b7'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in OWNED_TABLES:
+        op.add_column(table, sa.Column('owner_id', sa.String(), server_default='default', nullable=False))
+        op.create_index(f'ix_{table}_owner_id', table, ['owner_id'], unique=False)
+
+    # Idempotency keys are only unique within one owner
+    op.drop_constraint('enrollment_jobs_idempotency_key_key', 'enrollment_jobs', type_='unique')
+    op.create_unique_constraint('uq_enrollment_jobs_owner_idempotency_key', 'enrollment_jobs',
+                                ['owner_id', 'idempotency_key'])
+
+    # Existing rows all belong to the default owner; other owners get theirs from services.vector_index
+    op.execute(
+        f"CREATE INDEX {DEFAULT_OWNER_INDEX} ON face_encodings "
+        f"USING hnsw (encoding vector_l2_ops) WHERE owner_id = 'default'"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(
+        "DO $$ DECLARE r record; BEGIN "
+        "FOR r IN SELECT indexname FROM pg_indexes WHERE indexname LIKE 'ix_face_encodings_hnsw_%' "
+        "LOOP EXECUTE 'DROP INDEX ' || quote_ident(r.indexname); END LOOP; END $$"
+    )
+    op.drop_constraint('uq_enrollment_jobs_owner_idempotency_key', 'enrollment_jobs', type_='unique')
+    op.create_unique_constraint('enrollment_jobs_idempotency_key_key', 'enrollment_jobs', ['idempotency_key'])
+
+    for table in reversed(OWNED_TABLES):
+        op.drop_index(f'ix_{table}_owner_id', table_name=table)
+        op.drop_column(table, 'owner_id')
@@ -0,0 +1,43 @@
+"""Add gallery_changes log for delta gallery sync
+
+Revision ID: d5e8f1a23b67
+Revises: c4d09a7e5b13
+Create Date: 2026-10-19 15:21:37.904512
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e8f1a23b67'
+down_revision: Union[str, Sequence[str], None] = 'c4d09a7e5b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('gallery_changes',
+    sa.Column('version', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('owner_id', sa.String(), nullable=False),
+    sa.Column('face_id', sa.Integer(), nullable=False),
+    sa.Column('op', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('version')
+    )
+    op.create_index('ix_gallery_changes_owner_id_version', 'gallery_changes', ['owner_id', 'version'], unique=False)
+
+    # Existing encodings become version 1..n so the first sync sees them
+    op.execute(
+        "INSERT INTO gallery_changes (owner_id, face_id, op, created_at) "
+        "SELECT owner_id, face_id, 'upsert', now() FROM face_encodings ORDER BY id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_gallery_changes_owner_id_version', table_name='gallery_changes')
+    op.drop_table('gallery_changes')
@@ -0,0 +1,52 @@
+"""Add generated tsvector columns and GIN indexes for full-text search
+
+Revision ID: e7a3c5f90d12
+Revises: d5e8f1a23b67
+Create Date: 2026-10-19 16:02:44.217093
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3c5f90d12'
+down_revision: Union[str, Sequence[str], None] = 'd5e8f1a23b67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same expressions as models.face_scan.search_vector_column
+TRANSCRIPT_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(extracted_name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(context, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(raw_text, '')), 'C')"
+)
+PERSON_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(conversation_context, '')), 'B')"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Stored generated columns are filled for existing rows and kept current by Postgres
+    op.add_column('transcripts', sa.Column('search_vector', postgresql.TSVECTOR(),
+                                           sa.Computed(TRANSCRIPT_VECTOR, persisted=True), nullable=True))
+    op.create_index('ix_transcripts_search_vector', 'transcripts', ['search_vector'],
+                    unique=False, postgresql_using='gin')
+
+    op.add_column('person_info', sa.Column('search_vector', postgresql.TSVECTOR(),
+                                           sa.Computed(PERSON_VECTOR, persisted=True), nullable=True))
+    op.create_index('ix_person_info_search_vector', 'person_info', ['search_vector'],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_person_info_search_vector', table_name='person_info', postgresql_using='gin')
+    op.drop_column('person_info', 'search_vector')
+    op.drop_index('ix_transcripts_search_vector', table_name='transcripts', postgresql_using='gin')
+    op.drop_column('transcripts', 'search_vector')
@@ -0,0 +1,33 @@
+"""Add shard_repairs queue for failed gallery shard writes
+
+Revision ID: f3b9d2c71a48
+Revises: e7a3c5f90d12
+Create Date: 2026-10-19 18:47:12.530218
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b9d2c71a48'
+down_revision: Union[str, Sequence[str], None] = 'e7a3c5f90d12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('shard_repairs',
+    sa.Column('face_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('owner_id', sa.String(), nullable=False),
+    sa.Column('failed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('face_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('shard_repairs')
@@ -27,15 +27,181 @@ class Config:
     
     # DeepFace Model Settings
     FACE_MODEL = os.getenv("FACE_MODEL", "Facenet")
-    """Face recognition model: Facenet, VGG-Face, OpenFace, DeepFace, etc."""
+    """
+    Face recognition model: Facenet, VGG-Face, OpenFace, DeepFace, etc.
+    - face_encodings stores 128-d vectors, so only 128-d models (Facenet, OpenFace, SFace, Dlib)
+      fit without a migration; switching models also means re-embedding the gallery
+    - Compare options with `python -m services.benchmark`
+    """
     
     DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "retinaface")
-    """Face detector: retinaface, mtcnn, opencv, ssd, dlib"""
-    
+    """Face detector: retinaface, mtcnn, opencv, ssd, dlib (see `python -m services.benchmark`)"""
+
+    # Face Quality Gate (runs between detection and embedding)
+    QUALITY_GATE_ENABLED = os.getenv("QUALITY_GATE_ENABLED", "true").lower() == "true"
+    """Skip the embedding pass for faces that fail the quality checks below"""
+
+    QUALITY_MIN_FACE_SIZE = int(os.getenv("QUALITY_MIN_FACE_SIZE", "40"))
+    """Minimum face width/height in pixels"""
+
+    QUALITY_MIN_SHARPNESS = float(os.getenv("QUALITY_MIN_SHARPNESS", "60"))
+    """Minimum Laplacian variance inside the face box (lower = blurrier)"""
+
+    QUALITY_MAX_YAW = float(os.getenv("QUALITY_MAX_YAW", "45"))
+    """Maximum estimated head yaw in degrees (0 = facing the camera); skipped when the detector gives no eye landmarks"""
+
+    QUALITY_MIN_BRIGHTNESS = float(os.getenv("QUALITY_MIN_BRIGHTNESS", "40"))
+    QUALITY_MAX_BRIGHTNESS = float(os.getenv("QUALITY_MAX_BRIGHTNESS", "220"))
+    """Allowed mean gray level of the face (0-255)"""
+
+    QUALITY_DEFER_REASONS = os.getenv("QUALITY_DEFER_REASONS", "blurry,profile").split(",")
+    """
+    Rejection reasons reported as 'defer' (try the next frame) instead of 'reject'
+    - Options: too_small, blurry, profile, too_dark, too_bright
+    """
+
     # API Settings
     MENTRAOS_API_KEY = os.getenv("MENTRAOS_API_KEY")
     BACKEND_PORT = int(os.getenv("BACKEND_PORT", "8000"))
     
+    # Inference Admission Control
+    INFERENCE_CONCURRENCY = int(os.getenv("INFERENCE_CONCURRENCY", "2"))
+    """Detections + embeddings running at once per worker process"""
+
+    INFERENCE_QUEUE_DEPTH = int(os.getenv("INFERENCE_QUEUE_DEPTH", "8"))
+    """Requests allowed to wait for inference before new ones get 503"""
+
+    INFERENCE_SHED_DEPTH = int(os.getenv("INFERENCE_SHED_DEPTH", "4"))
+    """Queue depth at which enrollment requests get 429 so recognition keeps headroom"""
+
+    REQUEST_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", "0"))
+    """Default deadline when a request has no X-Deadline-Ms header (0 = none)"""
+
+    # CPU Pinning
+    CPU_PINNING_ENABLED = os.getenv("CPU_PINNING_ENABLED", "false").lower() == "true"
+    """Pin each worker process to its own cores and size TF/OpenCV/BLAS pools to them"""
+
+    CPU_WORKERS = int(os.getenv("CPU_WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
+    """Worker processes sharing this host's cores (match uvicorn --workers)"""
+
+    CPU_THREAD_BUDGET = int(os.getenv("CPU_THREAD_BUDGET", "0"))
+    """Logical CPUs split between the workers, whole cores at a time (0 = all this process may use)"""
+
+    CPU_SLOT_DIR = os.getenv("CPU_SLOT_DIR", "/tmp/visage-cpu-slots")
+    """Lock files workers claim their slot with; must be shared by every worker on the host"""
+
+    # Admin Profiling
+    ADMIN_PROFILING_ENABLED = os.getenv("ADMIN_PROFILING_ENABLED", "false").lower() == "true"
+    """Mount /api/admin profiling and memory endpoints (not even routed when off)"""
+
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+    """Shared secret expected in the X-Admin-Token header of admin requests"""
+
+    # Traffic Capture
+    CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "false").lower() == "true"
+    """Record sampled first-meeting/recognize requests for `python -m services.replay`"""
+
+    CAPTURE_DIR = os.getenv("CAPTURE_DIR", "captures")
+    """Corpus directory (images/ + manifest.jsonl); holds raw face photos"""
+
+    CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "0.1"))
+    """Fraction of requests captured (0.0 - 1.0)"""
+
+    # Vector Indexes
+    VECTOR_INDEX_INTERVAL_MINUTES = float(os.getenv("VECTOR_INDEX_INTERVAL_MINUTES", "5"))
+    """How often new owners' partial HNSW indexes are built in the background (0 = only via `python -m services.vector_index`)"""
+
+    # Gallery Snapshot
+    GALLERY_SNAPSHOT_ENABLED = os.getenv("GALLERY_SNAPSHOT_ENABLED", "false").lower() == "true"
+    """Match against a memory-mapped snapshot + delta log instead of querying pgvector"""
+
+    GALLERY_SNAPSHOT_DIR = os.getenv("GALLERY_SNAPSHOT_DIR", "gallery_snapshot")
+    """Snapshot directory, shared by every worker on this host"""
+
+    GALLERY_COMPACT_INTERVAL_MINUTES = float(os.getenv("GALLERY_COMPACT_INTERVAL_MINUTES", "10"))
+    """How often workers check whether the delta log needs compacting (0 = never)"""
+
+    GALLERY_COMPACT_LOG_BYTES = int(os.getenv("GALLERY_COMPACT_LOG_BYTES", str(8 * 1024 * 1024)))
+    """Delta log size that triggers folding it into a new snapshot"""
+
+    # Gallery Shards
+    GALLERY_SHARD_URLS = [url.strip() for url in os.getenv("GALLERY_SHARD_URLS", "").split(",") if url.strip()]
+    """
+    Postgres URLs holding the searchable encodings, comma-separated (empty = search the primary)
+    - Encodings are placed by position in this list: only ever append to it
+    """
+
+    GALLERY_SHARD_TIMEOUT_MS = float(os.getenv("GALLERY_SHARD_TIMEOUT_MS", "250"))
+    """Per-shard search budget (also bounds connect and pool checkout); a shard that misses it is left out and the result flagged partial (0 = no limit)"""
+
+    GALLERY_SHARD_REPAIR_INTERVAL_SECONDS = float(os.getenv("GALLERY_SHARD_REPAIR_INTERVAL_SECONDS", "60"))
+    """How often shard writes that failed after the primary committed are retried (0 = only via the CLI)"""
+
+    # Asynchronous Enrollment
+    ENROLLMENT_WORKERS = int(os.getenv("ENROLLMENT_WORKERS", "2"))
+    """Background enrollment worker threads per process (0 = don't process jobs here)"""
+
+    ENROLLMENT_POLL_INTERVAL = float(os.getenv("ENROLLMENT_POLL_INTERVAL", "1.0"))
+    """Seconds an idle worker waits before polling the queue again"""
+
+    ENROLLMENT_JOB_TIMEOUT = int(os.getenv("ENROLLMENT_JOB_TIMEOUT", "300"))
+    """Seconds before a 'running' job is considered abandoned and reclaimed"""
+
+    ENROLLMENT_MAX_ATTEMPTS = int(os.getenv("ENROLLMENT_MAX_ATTEMPTS", "3"))
+
+    ENROLLMENT_RETRY_BACKOFF = float(os.getenv("ENROLLMENT_RETRY_BACKOFF", "5"))
+    """Seconds before a failed attempt is retried, doubled after every attempt"""
+
+    # Person Profile Cache
+    PERSON_CACHE_SIZE = int(os.getenv("PERSON_CACHE_SIZE", "2048"))
+    """Maximum cached name-lookup profiles per worker process (0 = disabled); recognition reads its profile in the match query instead"""
+
+    PERSON_CACHE_LISTEN = os.getenv("PERSON_CACHE_LISTEN", "true").lower() == "true"
+    """Listen for invalidations from other workers via Postgres LISTEN/NOTIFY"""
+
+    # Stranger Gallery
+    STRANGER_GALLERY_SIZE = int(os.getenv("STRANGER_GALLERY_SIZE", "256"))
+    """Recently unmatched faces remembered per worker process (0 = disabled)"""
+
+    STRANGER_TTL_SECONDS = float(os.getenv("STRANGER_TTL_SECONDS", "120"))
+    """How long an unmatched face is remembered after it was last seen"""
+
+    STRANGER_MATCH_RADIUS = float(os.getenv("STRANGER_MATCH_RADIUS", "0.6"))
+    """Max L2 distance between frames treated as the same stranger"""
+
+    # Data Retention
+    RETENTION_PHOTO_DAYS = int(os.getenv("RETENTION_PHOTO_DAYS", "0"))
+    """
+    Drop raw photo bytes after this many days (0 = keep forever)
+    - Removed a monthly partition at a time, so data lives up to one month longer
+    - Crops, encodings and person info are kept
+    """
+
+    RETENTION_CROP_DAYS = int(os.getenv("RETENTION_CROP_DAYS", "0"))
+    """Clear cropped face images after this many days (0 = keep forever)"""
+
+    RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "24"))
+    """How often the compaction job runs (0 = only via `python -m services.retention`)"""
+
+    RETENTION_PARTITION_MONTHS_AHEAD = int(os.getenv("RETENTION_PARTITION_MONTHS_AHEAD", "3"))
+    RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "1000"))
+
+    # Identity Deduplication
+    DEDUP_RADIUS = float(os.getenv("DEDUP_RADIUS", "0.6"))
+    """Max L2 distance between encodings treated as the same person (stricter than FACE_MATCH_THRESHOLD)"""
+
+    DEDUP_MIN_SAMPLES = int(os.getenv("DEDUP_MIN_SAMPLES", "1"))
+    """DBSCAN min_samples; 1 = merge every connected group of close encodings"""
+
+    DEDUP_AUTO_MERGE = os.getenv("DEDUP_AUTO_MERGE", "false").lower() == "true"
+    """Merge non-conflicting clusters automatically instead of only logging proposals"""
+
+    DEDUP_INTERVAL_HOURS = float(os.getenv("DEDUP_INTERVAL_HOURS", "0"))
+    """How often the background dedup job runs (0 = only via `python -m services.dedup`)"""
+
+    DEDUP_WORKERS = int(os.getenv("DEDUP_WORKERS", "1"))
+    """Processes for the background job; keep 1 inside the API server (forking a threaded server is unsafe)"""
+
     # Image Processing
     MAX_IMAGE_SIZE_MB = int(os.getenv("MAX_IMAGE_SIZE_MB", "10"))
     ALLOWED_IMAGE_FORMATS = ["jpg", "jpeg", "png", "webp"]
@@ -1,13 +1,55 @@
+# Pin this worker and size its thread pools before numpy, OpenCV or TensorFlow are imported
+from services.cpu_topology import pin_worker, placement
+pin_worker()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import scan
+from routes import scan, admin
 from services.database import init_db
+from services.enrollment import start_enrollment_workers, stop_enrollment_workers
+from services.person_cache import start_invalidation_listener, stop_invalidation_listener
+from services.retention import run_retention
+from services.dedup import run_dedup
+from services.vector_index import build_owner_indexes
+from services.scheduler import start_periodic_job, stop_periodic_jobs
+from services.gallery_snapshot import gallery, compact_if_needed
+from services.shards import shards
+from services.profiling import RequestCounterMiddleware
+from services.timing import ServerTimingMiddleware
+from services.capture import CaptureMiddleware
+from config import config
 import uvicorn
 
+placement.configure_libraries()
+
 # Initialize database
 init_db()
 
-app = FastAPI(title="Visage Face Recognition API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background workers for asynchronous first-meeting enrollments
+    start_enrollment_workers()
+    # Keeps this worker's person cache in sync with writes made by other workers
+    start_invalidation_listener()
+    start_periodic_job("retention", config.RETENTION_INTERVAL_HOURS * 3600, run_retention)
+    start_periodic_job("dedup", config.DEDUP_INTERVAL_HOURS * 3600, run_dedup)
+    # New owners' HNSW indexes are built here, never inside an enrollment request
+    start_periodic_job("vector-indexes", config.VECTOR_INDEX_INTERVAL_MINUTES * 60, build_owner_indexes)
+    if shards.enabled:
+        start_periodic_job("shard-repair", config.GALLERY_SHARD_REPAIR_INTERVAL_SECONDS, shards.repair)
+    if config.GALLERY_SNAPSHOT_ENABLED:
+        # mmap + delta log replay; only the very first start reads Postgres
+        gallery.load()
+        # The snapshot directory is per host, so compaction uses a file lock, not the Postgres one
+        start_periodic_job("gallery-compaction", config.GALLERY_COMPACT_INTERVAL_MINUTES * 60,
+                           compact_if_needed, exclusive=False)
+    yield
+    stop_periodic_jobs()
+    stop_invalidation_listener()
+    stop_enrollment_workers()
+
+app = FastAPI(title="Visage Face Recognition API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,14 +57,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After", "X-Gallery-Version"],
 )
 
+# Per-stage latency in a Server-Timing header on every response
+app.add_middleware(ServerTimingMiddleware)
+
+# Sampled traffic capture for services.replay (added after, so it sees Server-Timing)
+if config.CAPTURE_ENABLED:
+    app.add_middleware(CaptureMiddleware)
+
 # Include routes from scan.py
 app.include_router(scan.app, prefix="/api")
 
+# Admin-only profiling; when disabled neither the routes nor the middleware exist
+if config.ADMIN_PROFILING_ENABLED:
+    if not config.ADMIN_TOKEN:
+        raise RuntimeError("ADMIN_PROFILING_ENABLED requires ADMIN_TOKEN")
+    app.add_middleware(RequestCounterMiddleware)
+    app.include_router(admin.app, prefix="/api/admin")
+
 @app.get("/")
 def root():
     return {"status": "Visage API is running"}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,23 +1,60 @@
-from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, ForeignKey, Float, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, LargeBinary, DateTime, ForeignKey, Float, Text, JSON, Index, UniqueConstraint, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
 from pgvector.sqlalchemy import Vector
 
 Base = declarative_base()
 
+DEFAULT_OWNER_ID = "default"
+"""Owner of rows created before multi-user support, and of requests without an owner"""
+
+SEARCH_CONFIG = "english"
+"""Text search configuration of the generated search_vector columns (changing it needs a migration)"""
+
+def search_vector_column(*weighted_columns):
+    """
+    Generated tsvector over (column, weight) pairs, kept current by Postgres on every insert/update
+    Weights A-D rank name hits above context hits above raw text hits
+    Deferred: only search queries ever need the vector itself
+    """
+    expression = " || ".join(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({column}, '')), '{weight}')"
+        for column, weight in weighted_columns
+    )
+    return deferred(Column(TSVECTOR, Computed(expression, persisted=True)))
+
+def owner_column():
+    """Owner (glasses wearer) a row belongs to - every gallery query is scoped by it"""
+    return Column(String, nullable=False, default=DEFAULT_OWNER_ID, server_default=DEFAULT_OWNER_ID, index=True)
+
 class Photo(Base):
     __tablename__ = "photos"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
+    owner_id = owner_column()
     filename = Column(String, nullable=True)
-    image_data = Column(LargeBinary, nullable=False)
     created_at = Column(DateTime, default=func.now())
     
+    # Raw image bytes live in the partitioned photo_blobs table (see PhotoBlob)
+    blob = relationship("PhotoBlob", uselist=False, cascade="all, delete-orphan")
+    
     transcript = relationship("Transcript", back_populates="photo", uselist=False, cascade="all, delete-orphan")  # ← ADDED cascade
     faces = relationship("DetectedFace", back_populates="photo", cascade="all, delete-orphan")
 
 
+class PhotoBlob(Base):
+    __tablename__ = "photo_blobs"
+    
+    # Range-partitioned by created_at so expired raw images are dropped a month at a time
+    photo_id = Column(Integer, ForeignKey("photos.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime, primary_key=True, default=func.now())
+    image_data = Column(LargeBinary, nullable=False)
+    
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
+
+
 class Transcript(Base):
     __tablename__ = "transcripts"
     
@@ -27,14 +64,20 @@ class Transcript(Base):
     extracted_name = Column(String, nullable=True)
     context = Column(Text, nullable=True)
     created_at = Column(DateTime, default=func.now())
+    search_vector = search_vector_column(("extracted_name", "A"), ("context", "B"), ("raw_text", "C"))
     
     photo = relationship("Photo", back_populates="transcript")
+    
+    __table_args__ = (
+        Index("ix_transcripts_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
 
 class DetectedFace(Base):
     __tablename__ = "detected_faces"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
+    owner_id = owner_column()
     photo_id = Column(Integer, ForeignKey("photos.id", ondelete="CASCADE"), nullable=False)  # ← ADDED ondelete and nullable
    
     # Bounding box coordinates
@@ -57,6 +100,7 @@ class FaceEncoding(Base):
     __tablename__ = "face_encodings"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
+    owner_id = owner_column()
     face_id = Column(Integer, ForeignKey("detected_faces.id", ondelete="CASCADE"), unique=True, nullable=False)
     
     # 128 embedding vector
@@ -72,6 +116,7 @@ class PersonInfo(Base):
     __tablename__ = "person_info"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
+    owner_id = owner_column()
     face_id = Column(Integer, ForeignKey("detected_faces.id", ondelete="CASCADE"), unique=True, nullable=True)
     
     name = Column(String, nullable=True)
@@ -80,5 +125,81 @@ class PersonInfo(Base):
     first_met_at = Column(DateTime, default=func.now())
     last_seen_at = Column(DateTime, default=func.now())
     times_met = Column(Integer, default=1)
+    search_vector = search_vector_column(("name", "A"), ("conversation_context", "B"))
+    
+    face = relationship("DetectedFace", back_populates="person_info")
+    
+    __table_args__ = (
+        Index("ix_person_info_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+
+class EnrollmentJob(Base):
+    __tablename__ = "enrollment_jobs"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    owner_id = owner_column()
+    # Client-supplied key so retried uploads map to the same job (unique per owner)
+    idempotency_key = Column(String, nullable=True)
+    photo_id = Column(Integer, ForeignKey("photos.id", ondelete="CASCADE"), nullable=False)
+    
+    name = Column(String, nullable=True)
+    conversation_context = Column(Text, nullable=True)
+    
+    # queued -> running -> succeeded / failed
+    status = Column(String, nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    locked_at = Column(DateTime, nullable=True)
+    # A retried job isn't claimed again before this time (backoff after a failed attempt)
+    not_before = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_enrollment_jobs_status_created_at", "status", "created_at"),
+        UniqueConstraint("owner_id", "idempotency_key", name="uq_enrollment_jobs_owner_idempotency_key"),
+    )
+
+
+class GalleryChange(Base):
+    __tablename__ = "gallery_changes"
+    
+    # Monotonically increasing gallery version, shared by all owners
+    version = Column(BigInteger, primary_key=True, autoincrement=True)
+    owner_id = Column(String, nullable=False)
+    # No foreign key: tombstones outlive the face they refer to
+    face_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)  # upsert, delete
+    created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index("ix_gallery_changes_owner_id_version", "owner_id", "version"),
+    )
+
+
+class ShardRepair(Base):
+    __tablename__ = "shard_repairs"
+    
+    # A face whose shard write (upsert or delete) failed after the primary committed;
+    # the shard-repair job makes its shard match face_encodings again
+    face_id = Column(Integer, primary_key=True, autoincrement=False)
+    owner_id = Column(String, nullable=False)
+    failed_at = Column(DateTime, default=func.now())
+
+
+# Gallery shards (see services/shards.py) are separate databases with their own schema,
+# created by `python -m services.shards init` rather than by Alembic
+ShardBase = declarative_base()
+
+
+class ShardEncoding(ShardBase):
+    __tablename__ = "face_encodings"
     
-    face = relationship("DetectedFace", back_populates="person_info")
\ No newline at end of file
+    # detected_faces.id on the primary database - no foreign key across databases
+    face_id = Column(Integer, primary_key=True, autoincrement=False)
+    owner_id = owner_column()
+    encoding = Column(Vector(128), nullable=False)
+    created_at = Column(DateTime, default=func.now())
@@ -0,0 +1,88 @@
+import hmac
+from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from services.profiling import (
+    ProfilerBusyError,
+    start_profile,
+    finish_profile,
+    start_tracemalloc,
+    stop_tracemalloc,
+    tracemalloc_diff,
+    memory_report
+)
+from config import config
+
+MAX_PROFILE_SECONDS = 300
+MIN_PROFILE_INTERVAL_MS = 1
+
+
+def require_admin_token(x_admin_token: str | None = Header(None)):
+    """Every admin route needs X-Admin-Token to match ADMIN_TOKEN"""
+    if not config.ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+# Only mounted by main.py when ADMIN_PROFILING_ENABLED is set
+app = APIRouter(dependencies=[Depends(require_admin_token)])
+
+# ==================== CPU PROFILING ====================
+
+@app.post("/profile", response_class=PlainTextResponse)
+async def profile(seconds: float = 10, requests: int = 0, interval_ms: float = 5):
+    """
+    Sample every thread of this worker and return folded stacks
+    - seconds: profiling window (with requests, the maximum wait)
+    - requests: stop after this many non-admin requests have finished
+    - Output feeds flamegraph.pl, speedscope or inferno directly
+    """
+    seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+    # A zero or negative interval would spin the sampler thread
+    interval_ms = max(interval_ms, MIN_PROFILE_INTERVAL_MS)
+    try:
+        profiler = start_profile(interval_ms / 1000, requests or None)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    try:
+        await run_in_threadpool(profiler.wait, seconds)
+    finally:
+        finish_profile(profiler)
+
+    summary = profiler.summary()
+    print(f"✅ Profiled {summary['samples']} samples over {summary['duration_s']}s ({summary['requests']} requests)")
+    return PlainTextResponse(
+        profiler.folded(),
+        headers={f"X-Profile-{key.replace('_', '-')}": str(value) for key, value in summary.items()}
+    )
+
+# ==================== MEMORY ====================
+
+@app.post("/tracemalloc/start")
+def tracemalloc_start(frames: int = 25):
+    """Start tracing Python allocations (slows the worker down until stopped)"""
+    start_tracemalloc(frames)
+    return {"tracing": True, "frames": frames}
+
+@app.get("/tracemalloc/diff")
+def tracemalloc_snapshot(limit: int = 25, group_by: str = "lineno"):
+    """
+    Top allocation growth since tracing started or the previous diff
+    - group_by: lineno, filename or traceback
+    """
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="group_by must be lineno, filename or traceback")
+    try:
+        return tracemalloc_diff(limit, group_by)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/tracemalloc/stop")
+def tracemalloc_stop():
+    stop_tracemalloc()
+    return {"tracing": False}
+
+@app.get("/memory")
+def memory():
+    """RSS, Python heap and TensorFlow/ONNX Runtime memory of this worker"""
+    return memory_report()
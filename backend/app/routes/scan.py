@@ -1,18 +1,38 @@
-from fastapi import APIRouter, HTTPException, Form
+from fastapi import APIRouter, HTTPException, Form, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 from services.database import (
     save_photo, 
-    save_detected_face, 
-    save_face_encoding, 
-    save_person_info,
     save_transcript,
-    find_matching_face,
-    get_person_info_by_face_id,
-    get_person_info_by_name,
-    update_person_last_seen
+    recognize_face,
+    get_person_profile_by_name,
+    search_conversations,
+    enqueue_enrollment_job,
+    get_enrollment_job
 )
+from services.admission import (
+    RECOGNITION,
+    ENROLLMENT,
+    AdmissionRejected,
+    DeadlineExceeded,
+    admission,
+    deadline_from_header
+)
+from services.enrollment import enroll_detected_face
 from services.face_detection import detect_and_encode_face
+from services.face_quality import FaceQualityError
+from services.gallery_export import export_gallery
+from services.person_cache import person_cache
+from services.gallery_snapshot import gallery
+from services.shards import shards, ShardUnavailable
+from services.cpu_topology import placement
+from services.stranger_gallery import strangers
+from services.timing import stage
+from models.face_scan import DEFAULT_OWNER_ID
 import base64
+import re
+from datetime import date, timedelta
 from config import config
 
 # ==================== PYDANTIC MODELS ====================
@@ -24,6 +44,41 @@ class TranscriptData(BaseModel):
 
 app = APIRouter()
 
+OWNER_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.@:+-]{1,128}$")
+
+def resolve_owner(x_owner_id: str | None) -> str:
+    """Gallery owner from the X-Owner-Id header (the glasses' user id)"""
+    if not x_owner_id:
+        return DEFAULT_OWNER_ID
+    if not OWNER_ID_PATTERN.match(x_owner_id):
+        raise HTTPException(status_code=400, detail="Invalid X-Owner-Id header")
+    return x_owner_id
+
+def quality_http_error(error: FaceQualityError) -> HTTPException:
+    """422 response telling the glasses why the face was not usable"""
+    return HTTPException(status_code=422, detail={
+        "message": "Face quality too low",
+        "reason": error.reason,
+        "action": error.action,
+        "quality": error.metrics
+    })
+
+def admission_http_error(error: Exception) -> HTTPException:
+    """503/429 with Retry-After when shed, 504 when the request's deadline passed in the queue"""
+    if isinstance(error, DeadlineExceeded):
+        return HTTPException(status_code=504, detail=str(error))
+    return HTTPException(
+        status_code=error.status_code,
+        detail=error.reason,
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+async def detect_admitted(image_bytes: bytes, priority: int, deadline: float | None):
+    """Run face detection + encoding off the event loop, once admitted by the inference queue"""
+    return await run_in_threadpool(
+        admission.run, detect_and_encode_face, image_bytes, priority=priority, deadline=deadline
+    )
+
 # ==================== ROUTES ====================
 
 @app.get("/")
@@ -35,7 +90,11 @@ def read_root():
             "POST /workflow1/first-meeting": "Capture photo + name for first meeting",
             "POST /workflow2/recognize": "Recognize person from photo",
             "GET /people/search": "Search for person by name",
-            "POST /transcript": "Save conversation transcript"
+            "GET /search": "Full-text search over people's context and transcripts",
+            "POST /transcript": "Save conversation transcript",
+            "GET /jobs/{job_id}": "Status of an asynchronous enrollment job",
+            "GET /gallery/export": "Binary gallery snapshot or delta for on-device matching",
+            "GET /metrics": "Cache and inference queue counters for this worker"
         }
     }
 
@@ -43,78 +102,125 @@ def read_root():
 
 @app.post("/workflow1/first-meeting")
 async def first_meeting(
-    image_data: str = Form(...),  # Base64-encoded image from glasses
+    image_data: str = Form(""),  # Base64-encoded image from glasses
+    stranger_id: str = Form(""),  # From a recent /workflow2/recognize miss
     name: str = Form(""),
-    conversation_context: str = Form("")
+    conversation_context: str = Form(""),
+    prefer: str | None = Header(None),
+    idempotency_key: str | None = Header(None),
+    x_owner_id: str | None = Header(None),
+    x_deadline_ms: str | None = Header(None)
 ):
     """
     Workflow 1: First time meeting someone
     - Receives base64-encoded image from MentraLive glasses
     - Optionally provide name from voice transcription
     - Detect face, generate encoding, store in database
+    - A "stranger_id" from a recent recognize miss enrolls that frame's cached
+      detection instead (no inference); image_data is then only a fallback
+    - With "Prefer: respond-async" the upload is queued and 202 + job id is returned;
+      an "Idempotency-Key" header makes retries return the same job
+      (the key is ignored on the synchronous path)
+    - The person is stored in the gallery of the X-Owner-Id user
+    - Inference waits behind recognitions; "X-Deadline-Ms" bounds the wait
     """
+    deadline = deadline_from_header(x_deadline_ms)
     try:
-        # Convert base64 to bytes
-        image_bytes = base64.b64decode(image_data)
-        
+        owner_id = resolve_owner(x_owner_id)
+
         # Convert empty strings to None
         name = name if name else None
         conversation_context = conversation_context if conversation_context else None
-        
-        # Save photo to database
-        photo_id = save_photo(
-            filename="glasses_capture.jpg",
-            image_data=image_bytes
-        )
-        print(f"✅ Saved photo #{photo_id}")
+
+        stranger = strangers.take(owner_id, stranger_id) if stranger_id else None
+        if stranger:
+            # Already detected and embedded, so enroll synchronously even with respond-async
+            photo_id = save_photo(
+                filename="glasses_capture.jpg",
+                image_data=stranger.image_bytes,
+                owner_id=owner_id
+            )
+            print(f"✅ Saved photo #{photo_id} of stranger {stranger.id}")
+            
+            with stage("store"):
+                result = enroll_detected_face(
+                    photo_id=photo_id,
+                    face_result=stranger.face_result,
+                    name=name,
+                    conversation_context=conversation_context,
+                    owner_id=owner_id
+                )
+            
+            return {
+                "success": True,
+                "message": f"Successfully registered {name or 'unknown person'}",
+                "data": result
+            }
+
+        if not image_data:
+            if stranger_id:
+                raise HTTPException(status_code=410, detail="Stranger expired; send image_data instead")
+            raise HTTPException(status_code=400, detail="image_data or stranger_id is required")
+
+        # Convert base64 to bytes
+        image_bytes = base64.b64decode(image_data)
+
+        if prefer and "respond-async" in prefer.lower():
+            job, created = enqueue_enrollment_job(
+                image_data=image_bytes,
+                name=name,
+                conversation_context=conversation_context,
+                idempotency_key=idempotency_key,
+                owner_id=owner_id
+            )
+            print(f"✅ {'Queued' if created else 'Found existing'} enrollment job #{job['id']}")
+            return JSONResponse(
+                status_code=202,
+                headers={"Location": f"/api/jobs/{job['id']}"},
+                content={
+                    "success": True,
+                    "message": "Enrollment queued",
+                    "job_id": job['id'],
+                    "status": job['status']
+                }
+            )
         
         # Detect face and generate encoding using DeepFace
-        face_result = detect_and_encode_face(image_bytes)
+        # (before saving, so shed requests don't leave photos behind)
+        face_result = await detect_admitted(image_bytes, ENROLLMENT, deadline)
         
         if not face_result:
             raise HTTPException(status_code=400, detail="No face detected in image")
         
-        # Save detected face
-        face_id = save_detected_face(
-            photo_id=photo_id,
-            x=face_result['bbox']['x'],
-            y=face_result['bbox']['y'],
-            width=face_result['bbox']['w'],
-            height=face_result['bbox']['h'],
-            face_image_data=face_result.get('cropped_face'),
-            confidence=face_result.get('confidence')
-        )
-        print(f"✅ Saved detected face #{face_id}")
-        
-        # Save face encoding (128-d vector)
-        encoding_id = save_face_encoding(
-            face_id=face_id,
-            encoding=face_result['encoding'],
-            model_name="Facenet"
+        # Save photo to database
+        photo_id = save_photo(
+            filename="glasses_capture.jpg",
+            image_data=image_bytes,
+            owner_id=owner_id
         )
-        print(f"✅ Saved face encoding #{encoding_id}")
+        print(f"✅ Saved photo #{photo_id}")
         
-        # Save person info
-        person_info_id = save_person_info(
-            face_id=face_id,
-            name=name,
-            conversation_context=conversation_context
-        )
-        print(f"✅ Saved person info #{person_info_id}: {name}")
+        with stage("store"):
+            result = enroll_detected_face(
+                photo_id=photo_id,
+                face_result=face_result,
+                name=name,
+                conversation_context=conversation_context,
+                owner_id=owner_id
+            )
         
         return {
             "success": True,
             "message": f"Successfully registered {name or 'unknown person'}",
-            "data": {
-                "photo_id": photo_id,
-                "face_id": face_id,
-                "person_info_id": person_info_id,
-                "name": name
-            }
+            "data": result
         }
         
     except HTTPException:
         raise
+    except FaceQualityError as e:
+        raise quality_http_error(e)
+    except (AdmissionRejected, DeadlineExceeded) as e:
+        raise admission_http_error(e)
     except Exception as e:
         print(f"❌ Error in first_meeting: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -122,38 +228,71 @@ async def first_meeting(
 # ==================== WORKFLOW 2: RECOGNIZE PERSON ====================
 
 @app.post("/workflow2/recognize")
-async def recognize_person(image_data: str = Form(...)):  # Base64-encoded image
+async def recognize_person(
+    image_data: str = Form(...),  # Base64-encoded image
+    x_owner_id: str | None = Header(None),
+    x_deadline_ms: str | None = Header(None)
+):
     """
     Workflow 2: Recognize someone you've met before
     - Receives base64-encoded image from MentraLive glasses
-    - Match face against stored encodings
+    - Match face against the X-Owner-Id user's stored encodings
     - Return person's info if match found
+    - Unknown faces get a "stranger_id" for first_meeting; repeats of them skip the database
+    - Served ahead of enrollments; "X-Deadline-Ms" bounds the wait for inference
     """
+    deadline = deadline_from_header(x_deadline_ms)
     try:
+        owner_id = resolve_owner(x_owner_id)
+
         # Convert base64 to bytes
         image_bytes = base64.b64decode(image_data)
         
         # Detect face and generate encoding
-        face_result = detect_and_encode_face(image_bytes)
+        face_result = await detect_admitted(image_bytes, RECOGNITION, deadline)
         
         if not face_result:
             raise HTTPException(status_code=400, detail="No face detected in image")
         
         query_encoding = face_result['encoding']
         
-        # Find matching face in database
-        matched_encoding, distance = find_matching_face(query_encoding, threshold=config.FACE_MATCH_THRESHOLD)
+        with stage("match"):
+            # A repeat of a recent unknown face can skip the database entirely
+            stranger = strangers.lookup(owner_id, query_encoding, config.FACE_MATCH_THRESHOLD)
+            if not stranger:
+                # Match, fetch the person and record the sighting in one round trip
+                person_info, matched_face_id, distance, partial = recognize_face(
+                    query_encoding, threshold=config.FACE_MATCH_THRESHOLD, owner_id=owner_id
+                )
         
-        if not matched_encoding:
+        if stranger:
             return {
                 "success": True,
                 "recognized": False,
                 "message": "Haven't met this person before",
-                "distance": float(distance) if distance else None
+                "distance": stranger.gallery_distance,
+                "stranger_id": stranger.id
             }
         
-        # Get person info
-        person_info = get_person_info_by_face_id(matched_encoding.face_id)
+        if not matched_face_id and partial:
+            # Some shards didn't answer: the face may be one of theirs, so don't call it a stranger
+            return {
+                "success": True,
+                "recognized": False,
+                "partial": True,
+                "message": "Couldn't search the whole gallery, try again",
+                "distance": float(distance) if distance else None,
+                "stranger_id": None
+            }
+        
+        if not matched_face_id:
+            return {
+                "success": True,
+                "recognized": False,
+                "message": "Haven't met this person before",
+                "distance": float(distance) if distance else None,
+                "stranger_id": strangers.remember(owner_id, query_encoding, face_result, image_bytes, distance)
+            }
         
         if not person_info:
             return {
@@ -163,24 +302,27 @@ async def recognize_person(image_data: str = Form(...)):  # Base64-encoded image
                 "distance": distance
             }
         
-        # Update last seen
-        update_person_last_seen(person_info.id)
-        
         return {
             "success": True,
             "recognized": True,
             "distance": float(distance),
             "person": {
-                "name": person_info.name,
-                "conversation_context": person_info.conversation_context,
-                "first_met_at": person_info.first_met_at.isoformat(),
-                "last_seen_at": person_info.last_seen_at.isoformat(),
-                "times_met": person_info.times_met
+                "name": person_info['name'],
+                "conversation_context": person_info['conversation_context'],
+                "first_met_at": person_info['first_met_at'],
+                "last_seen_at": person_info['last_seen_at'],
+                "times_met": person_info['times_met']
             }
         }
         
     except HTTPException:
         raise
+    except FaceQualityError as e:
+        raise quality_http_error(e)
+    except (AdmissionRejected, DeadlineExceeded) as e:
+        raise admission_http_error(e)
+    except ShardUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         print(f"❌ Error in recognize_person: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -188,28 +330,30 @@ async def recognize_person(image_data: str = Form(...)):  # Base64-encoded image
 # ==================== WORKFLOW 3: QUERY PERSON BY NAME ====================
 
 @app.get("/people/search")
-async def search_person_by_name(name: str):
+async def search_person_by_name(name: str, x_owner_id: str | None = Header(None)):
     """
     Workflow 3: Query person information by name
-    - Search for person by name (case-insensitive, partial match)
+    - Search the X-Owner-Id user's people by name (case-insensitive, partial match)
     - Return person's info if found
     """
     try:
+        owner_id = resolve_owner(x_owner_id)
+
         if not name or name.strip() == "":
             raise HTTPException(status_code=400, detail="Name parameter is required")
         
         # Search for person by name
-        person_info = get_person_info_by_name(name.strip())
+        person_info = get_person_profile_by_name(name.strip(), owner_id)
         
         if not person_info:
             raise HTTPException(status_code=404, detail=f"No person found with name: {name}")
         
         return {
-            "name": person_info.name,
-            "conversation_context": person_info.conversation_context,
-            "first_met_at": person_info.first_met_at.isoformat() if person_info.first_met_at else None,
-            "last_seen_at": person_info.last_seen_at.isoformat() if person_info.last_seen_at else None,
-            "times_met": person_info.times_met
+            "name": person_info['name'],
+            "conversation_context": person_info['conversation_context'],
+            "first_met_at": person_info['first_met_at'],
+            "last_seen_at": person_info['last_seen_at'],
+            "times_met": person_info['times_met']
         }
         
     except HTTPException:
@@ -218,6 +362,55 @@ async def search_person_by_name(name: str):
         print(f"❌ Error in search_person_by_name: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ==================== WORKFLOW 4: FULL-TEXT SEARCH ====================
+
+@app.get("/search")
+def search_conversations_text(
+    q: str,
+    since: date | None = None,
+    until: date | None = None,
+    kind: str | None = None,
+    limit: int = 20,
+    offset: int = 0,
+    x_owner_id: str | None = Header(None)
+):
+    """
+    Workflow 4: Search what was said - "who did I meet at the coffee shop"
+    - q supports web search syntax ("quoted phrase", or, -word)
+    - since/until: inclusive date range on when the person was met / transcript recorded
+    - kind: person or transcript (default both)
+    - Results are ranked, with matches wrapped in <b></b> in `highlight`
+    """
+    owner_id = resolve_owner(x_owner_id)
+
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="q parameter is required")
+    if kind not in (None, "person", "transcript"):
+        raise HTTPException(status_code=400, detail="kind must be person or transcript")
+    limit = min(max(limit, 1), 100)
+    offset = max(offset, 0)
+    
+    try:
+        results, has_more = search_conversations(
+            owner_id,
+            q.strip(),
+            since=since,
+            until=until + timedelta(days=1) if until else None,
+            kinds=(kind,) if kind else ("person", "transcript"),
+            limit=limit,
+            offset=offset
+        )
+    except Exception as e:
+        print(f"❌ Error in search_conversations_text: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return {
+        "results": results,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if has_more else None
+    }
+
 # ==================== TRANSCRIPT ENDPOINT ====================
 
 @app.post("/transcript")
@@ -244,6 +437,59 @@ def save_conversation_transcript(photo_id: int, transcript: TranscriptData):
         print(f"❌ Error saving transcript: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ==================== ENROLLMENT JOBS ====================
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: int, x_owner_id: str | None = Header(None)):
+    """
+    Poll the status of an asynchronous enrollment job
+    - status: queued, running, succeeded or failed
+    - result holds the same data as a synchronous first-meeting response
+    """
+    job = get_enrollment_job(job_id, resolve_owner(x_owner_id))
+    
+    if not job:
+        raise HTTPException(status_code=404, detail=f"No job with id: {job_id}")
+    
+    return job
+
+# ==================== GALLERY EXPORT ====================
+
+@app.get("/gallery/export")
+def export_owner_gallery(since: int = 0, dtype: str = "float16", x_owner_id: str | None = Header(None)):
+    """
+    Compact binary copy of the owner's gallery for on-device matching
+    - since: last version the client applied (0 = full snapshot)
+    - dtype: float16 or int8 (per-row scaled)
+    - X-Gallery-Version holds the version to send as `since` next time
+    """
+    owner_id = resolve_owner(x_owner_id)
+    
+    try:
+        version, payload = export_gallery(owner_id, since, dtype)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return Response(
+        content=payload,
+        media_type="application/octet-stream",
+        headers={"X-Gallery-Version": str(version)}
+    )
+
+# ==================== METRICS ====================
+
+@app.get("/metrics")
+def get_metrics():
+    """In-process counters for this worker"""
+    return {
+        "person_cache": person_cache.stats(),
+        "admission": admission.stats(),
+        "gallery_snapshot": gallery.stats() if config.GALLERY_SNAPSHOT_ENABLED else None,
+        "gallery_shards": shards.stats() if shards.enabled else None,
+        "cpu": placement.stats() if config.CPU_PINNING_ENABLED else None,
+        "strangers": strangers.stats() if strangers.enabled else None
+    }
+
 # ==================== HEALTH CHECK ====================
 
 @app.get("/health")
@@ -0,0 +1,201 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from config import config
+from services.timing import stage
+
+# Lower value = served first
+RECOGNITION = 0
+ENROLLMENT = 1
+BATCH = 2
+
+PRIORITY_NAMES = {RECOGNITION: "recognition", ENROLLMENT: "enrollment", BATCH: "batch"}
+
+
+class AdmissionRejected(Exception):
+    """Raised when inference work is shed instead of queued"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passes before its inference could start"""
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "sheddable", "evicted")
+
+    def __init__(self, priority: int, seq: int, sheddable: bool):
+        self.priority = priority
+        self.seq = seq
+        self.sheddable = sheddable
+        self.evicted = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """
+    Bounded priority queue in front of the inference path
+
+    At most `concurrency` callers run inference at once; the rest wait in
+    priority order (FIFO within a priority). When `queue_depth` callers are
+    already waiting, a new caller either evicts a lower-priority waiter or is
+    rejected with 503. Non-recognition work is shed with 429 earlier, once
+    `shed_depth` callers are waiting, so recognition keeps some headroom.
+
+    Non-sheddable callers (the background enrollment workers, whose backlog
+    lives in the enrollment_jobs table) always wait and don't count towards
+    the queue depth.
+    """
+
+    def __init__(self, concurrency: int, queue_depth: int, shed_depth: int):
+        self.concurrency = max(1, concurrency)
+        self.queue_depth = queue_depth
+        self.shed_depth = shed_depth
+
+        self._cond = threading.Condition()
+        self._waiters = []  # heap of _Waiter
+        self._seq = itertools.count()
+        self._running = 0
+        self._service_time = None  # EWMA of inference seconds
+        self._counters = {
+            "admitted": 0,
+            "completed": 0,
+            "rejected_full": 0,
+            "shed_low_priority": 0,
+            "evicted": 0,
+            "expired": 0
+        }
+
+    def _retry_after(self) -> int:
+        """Seconds until the current queue should have drained"""
+        service_time = self._service_time or 1.0
+        return max(1, math.ceil(service_time * (len(self._waiters) + 1) / self.concurrency))
+
+    def _remove(self, waiter: _Waiter):
+        self._waiters.remove(waiter)
+        heapq.heapify(self._waiters)
+        self._cond.notify_all()
+
+    def _check_capacity(self, priority: int):
+        queued = [w for w in self._waiters if w.sheddable]
+
+        if priority > RECOGNITION and len(queued) >= self.shed_depth:
+            self._counters["shed_low_priority"] += 1
+            raise AdmissionRejected(429, "Inference queue busy, shedding low-priority work", self._retry_after())
+
+        if len(queued) >= self.queue_depth:
+            victim = max(queued) if queued else None
+            if victim is None or victim.priority <= priority:
+                self._counters["rejected_full"] += 1
+                raise AdmissionRejected(503, "Inference queue full", self._retry_after())
+            # Make room by dropping the newest, lowest-priority waiter
+            victim.evicted = True
+            self._counters["evicted"] += 1
+            self._remove(victim)
+
+    def acquire(self, priority: int, deadline: Optional[float] = None, sheddable: bool = True):
+        """
+        Wait for an inference slot
+        deadline is a time.monotonic() value; work still queued when it passes is dropped
+        """
+        with self._cond:
+            # Limits apply to callers that would have to wait, not to ones a free slot admits now
+            if sheddable and (self._waiters or self._running >= self.concurrency):
+                self._check_capacity(priority)
+
+            waiter = _Waiter(priority, next(self._seq), sheddable)
+            heapq.heappush(self._waiters, waiter)
+
+            while not waiter.evicted and not (self._waiters[0] is waiter and self._running < self.concurrency):
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    self._counters["expired"] += 1
+                    self._remove(waiter)
+                    raise DeadlineExceeded("Deadline passed while queued for inference")
+                self._cond.wait(timeout)
+
+            if waiter.evicted:
+                raise AdmissionRejected(503, "Evicted by higher-priority work", self._retry_after())
+
+            heapq.heappop(self._waiters)
+            self._running += 1
+            self._counters["admitted"] += 1
+            # The next waiter may be able to run too
+            self._cond.notify_all()
+
+    def release(self, duration: float = None):
+        with self._cond:
+            self._running -= 1
+            self._counters["completed"] += 1
+            if duration is not None:
+                self._service_time = duration if self._service_time is None else 0.8 * self._service_time + 0.2 * duration
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int, deadline: Optional[float] = None, sheddable: bool = True):
+        """Hold an inference slot for the duration of the block"""
+        with stage("queue"):
+            self.acquire(priority, deadline, sheddable)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def run(self, fn: Callable, *args, priority: int = RECOGNITION, deadline: Optional[float] = None,
+            sheddable: bool = True, **kwargs):
+        """Call fn(*args, **kwargs) once admitted"""
+        with self.slot(priority, deadline, sheddable):
+            return fn(*args, **kwargs)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            queued_by_priority = {name: 0 for name in PRIORITY_NAMES.values()}
+            for waiter in self._waiters:
+                queued_by_priority[PRIORITY_NAMES[waiter.priority]] += 1
+
+            return {
+                "concurrency": self.concurrency,
+                "running": self._running,
+                "queue_depth": len(self._waiters),
+                "queue_limit": self.queue_depth,
+                "queued_by_priority": queued_by_priority,
+                "service_time_ms": round(self._service_time * 1000, 1) if self._service_time else None,
+                **self._counters
+            }
+
+
+def deadline_from_header(x_deadline_ms: str | None) -> Optional[float]:
+    """
+    Absolute time.monotonic() deadline from the X-Deadline-Ms header
+    (milliseconds the client is still willing to wait), falling back to REQUEST_DEADLINE_MS
+    """
+    budget_ms = config.REQUEST_DEADLINE_MS
+    if x_deadline_ms:
+        try:
+            budget_ms = float(x_deadline_ms)
+        except ValueError:
+            pass
+
+    if budget_ms <= 0:
+        return None
+    return time.monotonic() + budget_ms / 1000
+
+
+# One queue per worker process
+admission = AdmissionController(
+    concurrency=config.INFERENCE_CONCURRENCY,
+    queue_depth=config.INFERENCE_QUEUE_DEPTH,
+    shed_depth=config.INFERENCE_SHED_DEPTH
+)
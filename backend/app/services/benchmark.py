@@ -0,0 +1,332 @@
+"""
+Detector x embedding model benchmark on a local labeled image corpus
+
+Runs every DETECTOR_BACKEND x FACE_MODEL pair over the same frames, each pair
+in a fresh spawned process so cold start and peak memory are its own:
+
+    cold start      import + first detection + first embedding
+    latency         decode / detect / embed per image, p50 and p95, at each resolution
+    peak RSS        of the pair's process, and its growth over the baseline taken
+                    before deepface is imported (the models and their working set)
+    recall          images in which at least one face was detected
+    verification    equal error rate over all genuine/impostor pairs of the
+                    embeddings (same distances as services.calibration), and
+                    accuracy at the recommended threshold
+
+The corpus is one directory per person, every image showing that person:
+
+    corpus/alice/001.jpg
+    corpus/alice/002.jpg
+    corpus/bob/001.jpg
+
+Usage:
+    cd backend/app
+    python -m services.benchmark ~/frames --resolutions 480,720,1080 --output benchmark
+    python -m services.benchmark ~/frames --detectors retinaface,opencv --models Facenet,SFace
+"""
+import os
+import resource
+import time
+from multiprocessing import get_context
+from typing import Dict, List, Tuple
+import numpy as np
+from config import config
+
+DETECTORS = ["retinaface", "mtcnn", "opencv", "ssd", "dlib"]
+MODELS = ["Facenet", "OpenFace", "SFace", "Dlib", "Facenet512", "ArcFace", "VGG-Face"]
+RESOLUTIONS = [480, 720, 1080]
+
+SCHEMA_DIMENSIONS = 128
+"""face_encodings.encoding is Vector(128); other sizes need a migration"""
+
+IMAGE_EXTENSIONS = tuple(f".{ext}" for ext in config.ALLOWED_IMAGE_FORMATS)
+
+
+def load_corpus(corpus_dir: str, per_identity: int = None) -> List[Tuple[str, str]]:
+    """(identity, image path) for every image, identities taken from directory names"""
+    images = []
+    for identity in sorted(os.listdir(corpus_dir)):
+        identity_dir = os.path.join(corpus_dir, identity)
+        if not os.path.isdir(identity_dir):
+            continue
+        files = sorted(f for f in os.listdir(identity_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+        images.extend((identity, os.path.join(identity_dir, f)) for f in files[:per_identity])
+    return images
+
+
+def _resized_jpeg(path: str, long_side: int) -> bytes:
+    """The image scaled down (never up) to long_side and re-encoded like a glasses upload"""
+    import cv2 as cv
+
+    img = cv.imread(path, cv.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"Cannot read {path}")
+    scale = long_side / max(img.shape[:2])
+    if scale < 1:
+        img = cv.resize(img, None, fx=scale, fy=scale, interpolation=cv.INTER_AREA)
+    _, buffer = cv.imencode(".jpg", img, [cv.IMWRITE_JPEG_QUALITY, 90])
+    return buffer.tobytes()
+
+
+def _latency(values: List[float]) -> Dict:
+    if not values:
+        return {}
+    p50, p95 = np.percentile(values, [50, 95])
+    return {"p50": round(float(p50), 1), "p95": round(float(p95), 1)}
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_cell(detector: str, model: str, images: List[Tuple[str, str]], resolutions: List[int],
+             target_far: float) -> Dict:
+    """Benchmark one detector/model pair; meant to run in its own spawned process"""
+    import cv2 as cv
+    identities = [identity for identity, _ in images]
+    warmup = cv.imdecode(np.frombuffer(_resized_jpeg(images[0][1], resolutions[-1]), np.uint8), cv.IMREAD_COLOR)
+    baseline_rss = _peak_rss_mb()
+
+    started = time.perf_counter()
+    from deepface import DeepFace
+    from services.face_detection import _embed_face
+    from services.calibration import calibrate
+    imported = time.perf_counter()
+
+    def detect(img):
+        faces = DeepFace.extract_faces(
+            img_path=img,
+            detector_backend=detector,
+            enforce_detection=False,
+            align=True,
+            color_face="bgr"
+        )
+        # With enforce_detection=False a whole-frame placeholder is returned when nothing is found
+        faces = [f for f in faces if f.get('confidence', 0) > 0]
+        return max(faces, key=lambda f: f['facial_area']['w'] * f['facial_area']['h']) if faces else None
+
+    # First call of each builds the model
+    first_face = detect(warmup)
+    detected = time.perf_counter()
+    embedding = _embed_face(first_face['face'] if first_face else warmup, model)
+    embedded = time.perf_counter()
+
+    result = {
+        "detector": detector,
+        "model": model,
+        "embedding_dimensions": len(embedding),
+        "fits_schema": len(embedding) == SCHEMA_DIMENSIONS,
+        "cold_start_ms": {
+            "import": round((imported - started) * 1000, 1),
+            "first_detect": round((detected - imported) * 1000, 1),
+            "first_embed": round((embedded - detected) * 1000, 1),
+            "total": round((embedded - started) * 1000, 1)
+        },
+        "resolutions": {}
+    }
+
+    for resolution in resolutions:
+        # One resolution's frames at a time, prepared before any of them is timed
+        frames = [_resized_jpeg(path, resolution) for _, path in images]
+        timings = {"decode": [], "detect": [], "embed": []}
+        encodings, names = [], []
+        for identity, image_bytes in zip(identities, frames):
+            t0 = time.perf_counter()
+            img = cv.imdecode(np.frombuffer(image_bytes, np.uint8), cv.IMREAD_COLOR)
+            t1 = time.perf_counter()
+            face = detect(img)
+            t2 = time.perf_counter()
+            timings["decode"].append((t1 - t0) * 1000)
+            timings["detect"].append((t2 - t1) * 1000)
+            if face is None:
+                continue
+
+            embedding = _embed_face(face['face'], model)
+            timings["embed"].append((time.perf_counter() - t2) * 1000)
+            encodings.append(embedding / np.linalg.norm(embedding))
+            names.append(identity)
+
+        stats = {
+            "images": len(identities),
+            "latency_ms": {stage: _latency(values) for stage, values in timings.items()},
+            "recall": round(len(encodings) / len(identities), 4) if identities else None,
+            "verification": None
+        }
+        if len(set(names)) > 1:
+            report = calibrate(np.vstack(encodings).astype(np.float32), names,
+                               target_far=target_far, workers=1)
+            recommended = report["recommended"]
+            genuine, impostor = report["genuine_pairs"], report["impostor_pairs"]
+            correct = genuine * (1 - recommended["frr"]) + impostor * (1 - recommended["far"])
+            stats["verification"] = {
+                "genuine_pairs": genuine,
+                "impostor_pairs": impostor,
+                "equal_error_rate": report["equal_error_rate"],
+                "recommended_threshold": recommended,
+                # Pairs decided correctly at the recommended threshold (impostor pairs dominate),
+                # and the mean of the genuine and impostor accuracies
+                "accuracy": round(correct / max(genuine + impostor, 1), 4),
+                "balanced_accuracy": round(1 - (recommended["far"] + recommended["frr"]) / 2, 4)
+            }
+        result["resolutions"][str(resolution)] = stats
+        del frames
+
+    peak_rss = _peak_rss_mb()
+    result["peak_rss_mb"] = peak_rss
+    result["model_rss_mb"] = round(peak_rss - baseline_rss, 1)
+    return result
+
+
+def run_matrix(images: List[Tuple[str, str]], detectors: List[str], models: List[str],
+               resolutions: List[int], target_far: float = 0.001, timeout: float = 3600) -> List[Dict]:
+    """Every detector x model pair, one fresh process each"""
+    context = get_context("spawn")
+    results = []
+    for detector in detectors:
+        for model in models:
+            print(f"🔍 {detector} x {model}")
+            with context.Pool(1) as pool:
+                try:
+                    cell = pool.apply_async(run_cell, (detector, model, images, resolutions, target_far))
+                    results.append(cell.get(timeout))
+                except Exception as e:
+                    # Missing optional packages (dlib, mtcnn, ...) fail only their own cells
+                    print(f"❌ {detector} x {model} failed: {e}")
+                    results.append({"detector": detector, "model": model, "error": str(e)})
+    return results
+
+
+def recommend(results: List[Dict], resolution: int, max_recall_loss: float = 0.02,
+              max_eer_increase: float = 0.01) -> Dict:
+    """
+    Cheapest schema-compatible pair (detect + embed p50 at `resolution`) whose
+    recall and equal error rate are within the given margins of the best pair
+    """
+    key = str(resolution)
+    candidates = [
+        r for r in results
+        if "error" not in r and r["fits_schema"] and r["resolutions"][key]["verification"]
+    ]
+    if not candidates:
+        return None
+
+    def recall(r):
+        return r["resolutions"][key]["recall"]
+
+    def eer(r):
+        rates = r["resolutions"][key]["verification"]["equal_error_rate"]
+        return (rates["far"] + rates["frr"]) / 2
+
+    def cost(r):
+        latency = r["resolutions"][key]["latency_ms"]
+        return latency["detect"].get("p50", 0) + latency["embed"].get("p50", 0)
+
+    best_recall = max(recall(r) for r in candidates)
+    best_eer = min(eer(r) for r in candidates)
+    good_enough = [
+        r for r in candidates
+        if recall(r) >= best_recall - max_recall_loss and eer(r) <= best_eer + max_eer_increase
+    ]
+    choice = min(good_enough, key=cost)
+    return {
+        "DETECTOR_BACKEND": choice["detector"],
+        "FACE_MODEL": choice["model"],
+        "FACE_MATCH_THRESHOLD": choice["resolutions"][key]["verification"]["recommended_threshold"]["threshold"],
+        "resolution": resolution
+    }
+
+
+def markdown_report(results: List[Dict], resolutions: List[int], recommendation: Dict = None) -> str:
+    lines = ["# Detector x model benchmark", ""]
+    if recommendation:
+        lines += [
+            f"Recommended at {recommendation['resolution']}px: "
+            f"`DETECTOR_BACKEND={recommendation['DETECTOR_BACKEND']}` "
+            f"`FACE_MODEL={recommendation['FACE_MODEL']}` "
+            f"`FACE_MATCH_THRESHOLD={recommendation['FACE_MATCH_THRESHOLD']}`",
+            ""
+        ]
+
+    lines += [
+        "| Detector | Model | Dims | Cold start (s) | Peak RSS (MB) | Over baseline (MB) |",
+        "|---|---|---|---|---|---|"
+    ]
+    for r in results:
+        if "error" in r:
+            lines.append(f"| {r['detector']} | {r['model']} | - | failed: {r['error'][:60]} | - | - |")
+        else:
+            dims = f"{r['embedding_dimensions']}" + ("" if r["fits_schema"] else " (needs migration)")
+            lines.append(f"| {r['detector']} | {r['model']} | {dims} | "
+                         f"{r['cold_start_ms']['total'] / 1000:.1f} | {r['peak_rss_mb']} | {r['model_rss_mb']} |")
+
+    for resolution in resolutions:
+        key = str(resolution)
+        lines += [
+            "",
+            f"## {resolution}px",
+            "",
+            "| Detector | Model | Decode p50 | Detect p50 / p95 (ms) | Embed p50 / p95 (ms) | Recall | EER | "
+            "Threshold | FAR / FRR | Accuracy (balanced) |",
+            "|---|---|---|---|---|---|---|---|---|---|"
+        ]
+        for r in results:
+            if "error" in r:
+                continue
+            stats = r["resolutions"][key]
+            latency = stats["latency_ms"]
+            verification = stats["verification"]
+            eer = verification["equal_error_rate"] if verification else None
+            if verification:
+                recommended = verification["recommended_threshold"]
+                at_threshold = (
+                    f"{recommended['threshold']} | {recommended['far']:.4f} / {recommended['frr']:.4f} | "
+                    f"{verification['accuracy']} ({verification['balanced_accuracy']})"
+                )
+            else:
+                at_threshold = "- | - | -"
+            lines.append(
+                f"| {r['detector']} | {r['model']} | {latency['decode'].get('p50', '-')} | "
+                f"{latency['detect'].get('p50', '-')} / {latency['detect'].get('p95', '-')} | "
+                f"{latency['embed'].get('p50', '-')} / {latency['embed'].get('p95', '-')} | "
+                f"{stats['recall']} | "
+                f"{round((eer['far'] + eer['frr']) / 2, 4) if eer else '-'} | "
+                f"{at_threshold} |"
+            )
+    return "\n".join(lines) + "\n"
+
+
+# For command-line runs
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Benchmark every detector x model pair on a labeled image corpus')
+    parser.add_argument('corpus', help='Directory with one sub-directory of images per person')
+    parser.add_argument('--detectors', default=",".join(DETECTORS))
+    parser.add_argument('--models', default=",".join(MODELS))
+    parser.add_argument('--resolutions', default=",".join(map(str, RESOLUTIONS)), help='Long side in pixels')
+    parser.add_argument('--per-identity', type=int, help='Use at most N images per person')
+    parser.add_argument('--target-far', type=float, default=0.001, help='FAR for the recommended threshold')
+    parser.add_argument('--timeout', type=float, default=3600, help='Seconds allowed per pair')
+    parser.add_argument('--output', default='benchmark', help='Writes <output>.json and <output>.md')
+    args = parser.parse_args()
+
+    images = load_corpus(args.corpus, args.per_identity)
+    if len({identity for identity, _ in images}) < 2:
+        print("❌ Need images of at least two people")
+        raise SystemExit(1)
+
+    resolutions = sorted(int(r) for r in args.resolutions.split(","))
+    print(f"🔍 Benchmarking on {len(images)} images at {resolutions}")
+    results = run_matrix(images, args.detectors.split(","), args.models.split(","),
+                         resolutions, args.target_far, args.timeout)
+    recommendation = recommend(results, resolutions[-1])
+
+    with open(f"{args.output}.json", 'w') as f:
+        json.dump({"images": len(images), "recommendation": recommendation, "results": results}, f, indent=2)
+    with open(f"{args.output}.md", 'w') as f:
+        f.write(markdown_report(results, resolutions, recommendation))
+    print(f"✅ Wrote {args.output}.json and {args.output}.md")
+    if recommendation:
+        print(json.dumps(recommendation, indent=2))
@@ -0,0 +1,151 @@
+"""
+Offline FACE_MATCH_THRESHOLD calibration on the real gallery
+
+Streams every labeled encoding out of face_encodings, computes all-pairs
+distances block by block on every core and turns the genuine (same owner
+and name) and impostor distance distributions into FAR/FRR curves.
+
+Usage:
+    cd backend/app
+    python -m services.calibration --target-far 0.001 --output calibration.json
+"""
+import os
+
+if __name__ == "__main__":
+    # One BLAS thread per process - parallelism comes from the process pool.
+    # Has to be set before numpy is imported.
+    for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(_var, "1")
+
+import numpy as np
+from typing import Dict, List
+from config import config
+from services.pairwise import map_distance_blocks, pair_mask
+from services.person_cache import normalize_name
+
+MAX_DISTANCE = 2.0
+"""Upper bound of L2 distance between unit vectors"""
+
+N_BINS = 2000
+"""Histogram resolution: 0.001 distance per bin"""
+
+
+def _histogram_block(i0: int, j0: int, distances: np.ndarray, labels: np.ndarray):
+    """Genuine and impostor distance histograms of one block"""
+    rows = labels[i0:i0 + distances.shape[0]]
+    cols = labels[j0:j0 + distances.shape[1]]
+
+    counted = pair_mask(i0, j0, distances.shape)
+    same = rows[:, None] == cols[None, :]
+    bins = np.minimum((distances * (N_BINS / MAX_DISTANCE)).astype(np.int32), N_BINS - 1)
+
+    genuine = np.bincount(bins[counted & same], minlength=N_BINS)
+    impostor = np.bincount(bins[counted & ~same], minlength=N_BINS)
+    return genuine, impostor
+
+
+def identity_labels(names: List[str], owner_ids: List[str] = None) -> List[str]:
+    """Identity of each encoding: its normalized name within its owner's gallery"""
+    owner_ids = owner_ids or [""] * len(names)
+    return [f"{owner}\x00{normalize_name(name)}" for owner, name in zip(owner_ids, names)]
+
+
+def distance_histograms(encodings: np.ndarray, names: List[str], owner_ids: List[str] = None,
+                        block_size: int = 2048, workers: int = None):
+    """
+    Genuine/impostor histograms over all pairs of labeled encodings
+    Pairs with the same owner and normalized name count as genuine
+    """
+    _, labels = np.unique(identity_labels(names, owner_ids), return_inverse=True)
+
+    genuine = np.zeros(N_BINS, dtype=np.int64)
+    impostor = np.zeros(N_BINS, dtype=np.int64)
+    for block_genuine, block_impostor in map_distance_blocks(
+        encodings, _histogram_block, context=labels, block_size=block_size, workers=workers
+    ):
+        genuine += block_genuine
+        impostor += block_impostor
+
+    return genuine, impostor
+
+
+def error_curves(genuine: np.ndarray, impostor: np.ndarray):
+    """
+    FAR and FRR for a threshold at every bin edge (match = distance < threshold)
+    Returns (thresholds, far, frr)
+    """
+    thresholds = np.arange(1, N_BINS + 1) * (MAX_DISTANCE / N_BINS)
+    far = np.cumsum(impostor) / max(impostor.sum(), 1)
+    frr = 1 - np.cumsum(genuine) / max(genuine.sum(), 1)
+    return thresholds, far, frr
+
+
+def _at(thresholds, far, frr, index: int) -> Dict:
+    return {
+        "threshold": round(float(thresholds[index]), 3),
+        "far": float(far[index]),
+        "frr": float(frr[index])
+    }
+
+
+def calibrate(encodings: np.ndarray, names: List[str], owner_ids: List[str] = None,
+              target_far: float = None, block_size: int = 2048, workers: int = None) -> Dict:
+    """Build the calibration report for a set of labeled encodings"""
+    genuine, impostor = distance_histograms(encodings, names, owner_ids, block_size, workers)
+    thresholds, far, frr = error_curves(genuine, impostor)
+
+    eer_index = int(np.argmin(np.abs(far - frr)))
+    current_index = min(int(config.FACE_MATCH_THRESHOLD * N_BINS / MAX_DISTANCE) - 1, N_BINS - 1)
+
+    report = {
+        "encodings": len(encodings),
+        "identities": len(set(identity_labels(names, owner_ids))),
+        "genuine_pairs": int(genuine.sum()),
+        "impostor_pairs": int(impostor.sum()),
+        "equal_error_rate": _at(thresholds, far, frr, eer_index),
+        "current": _at(thresholds, far, frr, current_index),
+        "recommended": _at(thresholds, far, frr, eer_index),
+        "curve": [_at(thresholds, far, frr, i) for i in range(9, N_BINS, 10)]
+    }
+
+    if target_far is not None:
+        # Loosest threshold that still keeps false accepts under the target
+        allowed = np.flatnonzero(far <= target_far)
+        if len(allowed):
+            report["recommended"] = _at(thresholds, far, frr, int(allowed[-1]))
+        report["target_far"] = target_far
+
+    return report
+
+
+# For command-line runs
+if __name__ == "__main__":
+    import argparse
+    import json
+    from services.database import engine, load_face_encodings
+
+    parser = argparse.ArgumentParser(description='Calibrate FACE_MATCH_THRESHOLD from stored encodings')
+    parser.add_argument('--target-far', type=float, help='Recommend the loosest threshold with FAR at or below this')
+    parser.add_argument('--block-size', type=int, default=2048, help='Rows per distance block')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: all cores)')
+    parser.add_argument('--output', help='Write the full report (with curve) to this JSON file')
+    args = parser.parse_args()
+
+    _, encodings, names, owner_ids = load_face_encodings(labeled_only=True)
+    # Don't let forked workers inherit open database connections
+    engine.dispose()
+
+    if len(encodings) < 2:
+        print("❌ Need at least two labeled encodings")
+        raise SystemExit(1)
+
+    print(f"🔍 Calibrating on {len(encodings)} labeled encodings")
+    report = calibrate(encodings, names, owner_ids, args.target_far, args.block_size, args.workers)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Wrote report to {args.output}")
+
+    summary = {k: v for k, v in report.items() if k != "curve"}
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,141 @@
+"""
+Opt-in capture of real glasses traffic into a replayable corpus
+
+Sampled first-meeting and recognition requests are written to CAPTURE_DIR:
+
+    images/<id>.jpg     raw image bytes as received
+    manifest.jsonl      one line per request: form fields, owner, arrival time,
+                        status, latency, per-stage Server-Timing and the response
+
+The corpus is what `python -m services.replay` re-drives against a build.
+Captured photos are biometric data - keep the directory as private as the database.
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+from config import config
+from services.timing import parse_server_timing
+
+CAPTURE_PATHS = {
+    "/api/workflow1/first-meeting": "first_meeting",
+    "/api/workflow2/recognize": "recognize"
+}
+
+REPLAY_HEADER = b"x-replay"
+"""Requests sent by the replay tool carry this header and are never captured"""
+
+MAX_RESPONSE_BYTES = 64 * 1024
+
+_manifest_lock = threading.Lock()
+
+
+def write_capture(capture_dir: str, record: Dict, image_bytes: Optional[bytes]):
+    """Store one captured request (image file first, then its manifest line)"""
+    os.makedirs(os.path.join(capture_dir, "images"), exist_ok=True)
+
+    if image_bytes:
+        record["image"] = f"images/{record['id']}.jpg"
+        record["image_bytes"] = len(image_bytes)
+        record["image_sha256"] = hashlib.sha256(image_bytes).hexdigest()
+        with open(os.path.join(capture_dir, record["image"]), "wb") as f:
+            f.write(image_bytes)
+
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with _manifest_lock, open(os.path.join(capture_dir, "manifest.jsonl"), "a") as f:
+        f.write(line)
+
+
+def _parse_form(body: bytes, content_type: str):
+    """Split an urlencoded workflow form into (image bytes, other fields)"""
+    if not content_type.startswith("application/x-www-form-urlencoded"):
+        # The glasses app only sends urlencoded forms
+        return None, {}
+
+    fields = {k: v[0] for k, v in parse_qs(body.decode("latin-1"), keep_blank_values=True).items()}
+    image_data = fields.pop("image_data", None)
+    try:
+        image_bytes = base64.b64decode(image_data) if image_data else None
+    except (binascii.Error, ValueError):
+        image_bytes = None
+    return image_bytes, fields
+
+
+class CaptureMiddleware:
+    """
+    Plain ASGI middleware that tees sampled workflow requests and their responses
+    into the capture corpus. Only installed when CAPTURE_ENABLED is set; it must
+    wrap ServerTimingMiddleware so it can see the Server-Timing header.
+    """
+
+    def __init__(self, app, capture_dir: str = None, sample_rate: float = None):
+        self.app = app
+        self.capture_dir = capture_dir or config.CAPTURE_DIR
+        self.sample_rate = config.CAPTURE_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    async def __call__(self, scope, receive, send):
+        endpoint = CAPTURE_PATHS.get(scope.get("path")) if scope["type"] == "http" else None
+        headers = dict(scope.get("headers", [])) if endpoint else {}
+
+        if (not endpoint or scope["method"] != "POST" or REPLAY_HEADER in headers
+                or random.random() >= self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        arrived = time.time()
+        started = time.perf_counter()
+        body = bytearray()
+        response = {"status": None, "headers": {}, "body": bytearray()}
+
+        async def receive_and_copy():
+            message = await receive()
+            if message["type"] == "http.request":
+                body.extend(message.get("body", b""))
+            return message
+
+        async def send_and_copy(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = {k.decode("latin-1"): v.decode("latin-1") for k, v in message.get("headers", [])}
+            elif message["type"] == "http.response.body" and len(response["body"]) < MAX_RESPONSE_BYTES:
+                response["body"].extend(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_and_copy, send_and_copy)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            image_bytes, fields = _parse_form(bytes(body), headers.get(b"content-type", b"").decode("latin-1"))
+
+            try:
+                response_json = json.loads(bytes(response["body"]))
+            except ValueError:
+                response_json = None
+
+            record = {
+                "id": uuid.uuid4().hex,
+                "endpoint": endpoint,
+                "captured_at": datetime.fromtimestamp(arrived, timezone.utc).isoformat(),
+                "timestamp": arrived,
+                "owner_id": headers.get(b"x-owner-id", b"").decode("latin-1") or None,
+                "fields": fields,
+                "status": response["status"],
+                "duration_ms": round(duration_ms, 1),
+                "stages": parse_server_timing(response["headers"].get("server-timing")),
+                "response": response_json
+            }
+
+            try:
+                # Disk writes stay off the event loop
+                await asyncio.to_thread(write_capture, self.capture_dir, record, image_bytes)
+            except Exception as e:
+                print(f"❌ Failed to capture request: {e}")
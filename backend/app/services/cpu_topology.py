@@ -0,0 +1,311 @@
+"""
+CPU topology-aware pinning and thread budgeting for inference workers
+
+TensorFlow (inside DeepFace), OpenCV and NumPy's BLAS each size a thread pool
+to every core on the box, so N uvicorn workers start N x 3 pools that fight
+over the same cores. With CPU_PINNING_ENABLED each worker process instead:
+
+    1. claims a slot (a flock'ed file in CPU_SLOT_DIR, released when it exits)
+    2. gets that slot's core set from one host-wide plan: physical cores (with
+       their SMT siblings) split between CPU_WORKERS slots, without crossing a
+       NUMA node when there are at least as many slots as nodes
+    3. pins itself to the core set and sizes every pool from it
+
+pin_worker() must run before numpy, cv2 or tensorflow are imported - the BLAS
+and TensorFlow pools read their size from the environment on import.
+
+Usage:
+    cd backend/app
+    python -m services.cpu_topology --workers 4   # print the topology and plan
+"""
+import fcntl
+import glob
+import os
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from config import config
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+Core = Tuple[int, ...]
+"""Logical CPUs sharing one physical core (SMT siblings)"""
+
+
+def parse_cpu_list(value: str) -> List[int]:
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in value.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def read_topology(sysfs: str = "/sys/devices/system") -> Dict[int, List[Core]]:
+    """
+    Physical cores this process may run on, grouped by NUMA node
+    Falls back to one node of single-CPU cores when sysfs says nothing
+    """
+    allowed = sorted(os.sched_getaffinity(0))
+
+    node_of = {}
+    for node_path in glob.glob(os.path.join(sysfs, "node", "node[0-9]*")):
+        cpulist = _read(os.path.join(node_path, "cpulist"))
+        if cpulist:
+            node = int(re.search(r"(\d+)$", node_path).group(1))
+            for cpu in parse_cpu_list(cpulist):
+                node_of[cpu] = node
+
+    cores: Dict[Tuple[int, Core], None] = {}
+    for cpu in allowed:
+        siblings = _read(os.path.join(sysfs, "cpu", f"cpu{cpu}", "topology", "thread_siblings_list"))
+        core = tuple(c for c in parse_cpu_list(siblings) if c in allowed) if siblings else (cpu,)
+        cores[(node_of.get(cpu, 0), core or (cpu,))] = None
+
+    topology: Dict[int, List[Core]] = {}
+    for node, core in cores:
+        topology.setdefault(node, []).append(core)
+    return {node: sorted(node_cores) for node, node_cores in sorted(topology.items())}
+
+
+def _trim_to_budget(topology: Dict[int, List[Core]], budget: int) -> Dict[int, List[Core]]:
+    """Keep whole cores, taken round-robin across nodes, until `budget` CPUs are used"""
+    if budget <= 0:
+        return topology
+
+    kept = {node: [] for node in topology}
+    remaining = {node: list(cores) for node, cores in topology.items()}
+    used = 0
+    while used < budget and any(remaining.values()):
+        for node in topology:
+            if remaining[node] and used < budget:
+                core = remaining[node].pop(0)
+                kept[node].append(core)
+                used += len(core)
+    return {node: cores for node, cores in kept.items() if cores}
+
+
+def _split(items: List, parts: int) -> List[List]:
+    """Contiguous, near-equal chunks; with more parts than items, items are shared"""
+    if parts <= len(items):
+        size, extra = divmod(len(items), parts)
+        chunks, start = [], 0
+        for i in range(parts):
+            end = start + size + (1 if i < extra else 0)
+            chunks.append(items[start:end])
+            start = end
+        return chunks
+    return [[items[i % len(items)]] for i in range(parts)]
+
+
+def _workers_per_node(topology: Dict[int, List[Core]], workers: int) -> Dict[int, int]:
+    """At least one worker per node, the rest proportional to core count (largest remainder)"""
+    total = sum(len(cores) for cores in topology.values())
+    spare = workers - len(topology)
+    shares = {node: spare * len(cores) / total for node, cores in topology.items()}
+    counts = {node: 1 + int(share) for node, share in shares.items()}
+    leftover = workers - sum(counts.values())
+    for node in sorted(shares, key=lambda n: shares[n] - int(shares[n]), reverse=True)[:leftover]:
+        counts[node] += 1
+    return counts
+
+
+def plan_layout(topology: Dict[int, List[Core]], workers: int, budget: int = 0,
+                concurrency: int = 1) -> List[Dict]:
+    """
+    Core set and thread counts for each of `workers` slots
+    - intra_op: one TensorFlow thread per physical core
+    - inter_op: one per concurrently admitted inference (INFERENCE_CONCURRENCY)
+    - blas / opencv: the cores divided between those concurrent inferences
+    """
+    topology = _trim_to_budget(topology, budget)
+    workers = max(1, workers)
+    nodes = list(topology)
+
+    assignments: List[Tuple[List[int], List[Core]]] = []
+    if workers <= len(nodes):
+        # Whole nodes per worker
+        for slot in range(workers):
+            slot_nodes = nodes[slot::workers]
+            assignments.append((slot_nodes, [core for node in slot_nodes for core in topology[node]]))
+    else:
+        for node, count in _workers_per_node(topology, workers).items():
+            for chunk in _split(topology[node], count):
+                assignments.append(([node], chunk))
+
+    layout = []
+    for slot, (slot_nodes, cores) in enumerate(assignments):
+        physical = max(1, len(cores))
+        concurrent = max(1, min(concurrency, physical))
+        layout.append({
+            "slot": slot,
+            "nodes": slot_nodes,
+            "cpus": sorted({cpu for core in cores for cpu in core}),
+            "physical_cores": physical,
+            "intra_op_threads": physical,
+            "inter_op_threads": concurrent,
+            "blas_threads": max(1, physical // concurrent),
+            "opencv_threads": max(1, physical // concurrent)
+        })
+    return layout
+
+
+def claim_slot(directory: str, slots: int) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Lock the first free slot file; the lock lives as long as the process
+    Returns (slot, fd) or (None, None) when every slot is taken
+    """
+    os.makedirs(directory, exist_ok=True)
+    for slot in range(slots):
+        fd = os.open(os.path.join(directory, f"slot-{slot}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        return slot, fd
+    return None, None
+
+
+def _cpu_ticks() -> Dict[int, Tuple[int, int]]:
+    """(busy, total) jiffies per logical CPU from /proc/stat"""
+    ticks = {}
+    for line in (_read("/proc/stat") or "").splitlines():
+        match = re.match(r"cpu(\d+)\s+(.*)", line)
+        if match:
+            values = [int(v) for v in match.group(2).split()]
+            idle = values[3] + (values[4] if len(values) > 4 else 0)
+            ticks[int(match.group(1))] = (sum(values) - idle, sum(values))
+    return ticks
+
+
+class WorkerPlacement:
+    """This process's slot, core set and thread budget, plus utilization since the last look"""
+
+    def __init__(self):
+        self.layout: Optional[Dict] = None
+        self.plan: List[Dict] = []
+        self.topology: Dict[int, List[Core]] = {}
+        self._slot_fd = None
+        self._lock = threading.Lock()
+        self._last_sample = None
+
+    def pin(self, workers: int, budget: int, slot_dir: str, concurrency: int) -> Optional[Dict]:
+        self.topology = read_topology()
+        self.plan = plan_layout(self.topology, workers, budget, concurrency)
+        slot, self._slot_fd = claim_slot(slot_dir, len(self.plan))
+
+        if slot is None:
+            # More processes than CPU_WORKERS: stay unpinned but still don't oversubscribe
+            layout = dict(min(self.plan, key=lambda l: l["physical_cores"]), slot=None)
+            print(f"⚠️ No free CPU slot in {slot_dir} (CPU_WORKERS={workers}); running unpinned")
+        else:
+            layout = self.plan[slot]
+            os.sched_setaffinity(0, layout["cpus"])
+
+        for name in THREAD_ENV_VARS:
+            os.environ[name] = str(layout["blas_threads"])
+        os.environ["TF_NUM_INTRAOP_THREADS"] = str(layout["intra_op_threads"])
+        os.environ["TF_NUM_INTEROP_THREADS"] = str(layout["inter_op_threads"])
+
+        self.layout = layout
+        self._last_sample = self._sample()
+        print(f"✅ Worker {os.getpid()} slot {layout['slot']}: CPUs {layout['cpus']}, "
+              f"{layout['intra_op_threads']} intra-op / {layout['inter_op_threads']} inter-op threads")
+        return layout
+
+    def configure_libraries(self):
+        """Apply the budget to libraries that also take it at runtime (call after importing them)"""
+        if self.layout is None:
+            return
+        try:
+            import cv2
+            cv2.setNumThreads(self.layout["opencv_threads"])
+        except ImportError:
+            pass
+
+        if "tensorflow" in sys.modules:
+            tf = sys.modules["tensorflow"]
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(self.layout["intra_op_threads"])
+                tf.config.threading.set_inter_op_parallelism_threads(self.layout["inter_op_threads"])
+            except RuntimeError:
+                # Already initialized: the TF_NUM_*_THREADS variables set in pin() applied
+                pass
+
+    def _sample(self):
+        times = os.times()
+        return time.monotonic(), times.user + times.system, _cpu_ticks()
+
+    def stats(self) -> Dict:
+        """Layout plus process and per-core utilization since the previous call"""
+        with self._lock:
+            previous, current = self._last_sample, self._sample()
+            self._last_sample = current
+
+        cpus = self.layout["cpus"] if self.layout else sorted(os.sched_getaffinity(0))
+        utilization, core_busy = None, {}
+        if previous:
+            wall = current[0] - previous[0]
+            if wall > 0:
+                utilization = round((current[1] - previous[1]) / wall / len(cpus), 3)
+            for cpu in cpus:
+                if cpu in current[2] and cpu in previous[2]:
+                    busy = current[2][cpu][0] - previous[2][cpu][0]
+                    total = current[2][cpu][1] - previous[2][cpu][1]
+                    core_busy[cpu] = round(busy / total, 3) if total else 0.0
+
+        return {
+            "pid": os.getpid(),
+            "layout": self.layout,
+            "plan": self.plan,
+            "threads": len(os.listdir("/proc/self/task")) if os.path.isdir("/proc/self/task") else None,
+            "utilization": utilization,
+            "cpu_busy": core_busy
+        }
+
+
+placement = WorkerPlacement()
+
+
+def pin_worker() -> Optional[Dict]:
+    """Pin this worker process if CPU_PINNING_ENABLED (before heavy imports)"""
+    if not config.CPU_PINNING_ENABLED:
+        return None
+    return placement.pin(config.CPU_WORKERS, config.CPU_THREAD_BUDGET, config.CPU_SLOT_DIR,
+                         config.INFERENCE_CONCURRENCY)
+
+
+# For command-line runs
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Show the CPU topology and the per-worker plan')
+    parser.add_argument('--workers', type=int, default=config.CPU_WORKERS)
+    parser.add_argument('--budget', type=int, default=config.CPU_THREAD_BUDGET, help='CPUs to use (0 = all)')
+    parser.add_argument('--concurrency', type=int, default=config.INFERENCE_CONCURRENCY)
+    args = parser.parse_args()
+
+    topology = read_topology()
+    print(json.dumps({
+        "topology": {str(node): [list(core) for core in cores] for node, cores in topology.items()},
+        "plan": plan_layout(topology, args.workers, args.budget, args.concurrency)
+    }, indent=2))
@@ -1,8 +1,25 @@
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, func
+from datetime import timedelta
+from sqlalchemy import create_engine, func, or_, and_, text, select, literal, union_all, Integer, bindparam
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
-from models.face_scan import Base, Photo, Transcript, DetectedFace, FaceEncoding, PersonInfo
+from models.face_scan import (
+    Base, Photo, PhotoBlob, Transcript, DetectedFace, FaceEncoding, PersonInfo, EnrollmentJob, GalleryChange,
+    ShardRepair,
+    DEFAULT_OWNER_ID, SEARCH_CONFIG
+)
+from services.person_cache import (
+    NOTIFY_CHANNEL,
+    person_cache,
+    normalize_name,
+    notify_invalidation,
+    invalidation_message
+)
+from services.gallery_snapshot import gallery, append_upsert, append_delete
+from services.shards import shards
 from config import config
+from pgvector.sqlalchemy import Vector
 import numpy as np
 
 load_dotenv()
@@ -14,7 +31,14 @@ SessionLocal = sessionmaker(bind=engine)
 #create tables
 def init_db():
     """Initialize database tables"""
+    from services.retention import ensure_photo_partitions
+
     Base.metadata.create_all(engine)
+    try:
+        ensure_photo_partitions()
+    except Exception as e:
+        # Photos still land in the default partition; the retention job retries
+        print(f"❌ Failed to create photo_blobs partitions: {e}")
 
 def get_db():
     """Get database session"""
@@ -26,10 +50,10 @@ def get_db():
 
 # Photo helper functions ----------------------------------------
 
-def save_photo(filename: str, image_data: bytes):
+def save_photo(filename: str, image_data: bytes, owner_id: str = DEFAULT_OWNER_ID):
     with SessionLocal() as session:
         try:
-            photo = Photo(filename=filename, image_data=image_data)
+            photo = Photo(owner_id=owner_id, filename=filename, blob=PhotoBlob(image_data=image_data))
             session.add(photo)
             session.commit()
             return photo.id
@@ -41,118 +65,437 @@ def get_photo_by_id(photo_id: int):
     with SessionLocal() as session:
         return session.query(Photo).filter(Photo.id == photo_id).first()
 
+def get_photo_image_data(photo_id: int):
+    """Raw image bytes of a photo, or None if the retention policy already dropped them"""
+    with SessionLocal() as session:
+        return session.query(PhotoBlob.image_data).filter(PhotoBlob.photo_id == photo_id).scalar()
+
 def get_most_recent_photo():
     with SessionLocal() as session:
         return session.query(Photo).order_by(Photo.created_at.desc()).first()
     
 # Face helper functions ------------------------------------------
 
-def save_detected_face(photo_id: int, x: int, y:int, width: int, height: int,
-                       face_image_data: bytes = None, confidence: float = None):
-    """Save a detected face to the database"""
+def record_gallery_change(session, owner_id: str, face_id: int, op: str = "upsert"):
+    """
+    Append to the gallery changelog inside the caller's transaction
+    The advisory lock makes versions commit in order, so a client that has
+    seen version N can never miss a change numbered below N
+    """
+    session.execute(text("SELECT pg_advisory_xact_lock(hashtext('gallery_changes'))"))
+    change = GalleryChange(owner_id=owner_id, face_id=face_id, op=op)
+    session.add(change)
+    return change
+
+def _publish_encoding(owner_id: str, face_id: int, normalized_encoding: list, version: int):
+    """Copy a committed encoding to the gallery snapshot log and shards"""
+    if config.GALLERY_SNAPSHOT_ENABLED:
+        append_upsert(owner_id, face_id, normalized_encoding, version)
+    if shards.enabled:
+        try:
+            shards.upsert(owner_id, face_id, normalized_encoding)
+        except Exception as e:
+            # The primary row is committed; the shard-repair job retries this face
+            print(f"❌ Failed to write encoding {face_id} to its gallery shard: {e}")
+            queue_shard_repair(owner_id, [face_id])
+
+def queue_shard_repair(owner_id: str, face_ids: list):
+    """Record faces whose shard write failed so the shard-repair job fixes just those"""
+    statement = insert(ShardRepair).values(
+        [{"face_id": face_id, "owner_id": owner_id} for face_id in face_ids]
+    ).on_conflict_do_nothing(index_elements=[ShardRepair.face_id])
     with SessionLocal() as session:
         try:
-            face = DetectedFace(
-                photo_id=photo_id,
-                x=x, y=y, width=width, height=height,
-                face_image_data=face_image_data,
-                confidence=confidence
-            )
-            session.add(face)
+            session.execute(statement)
             session.commit()
-            session.refresh(face)
-            return face.id
         except Exception as e:
             session.rollback()
-            raise e
-        
-def save_face_encoding(face_id: int, encoding: list, model_name: str = "Facenet"):
-    """Save a face encoding (128-d vector)"""
+            print(f"❌ Failed to queue shard repair for faces {face_ids}, run `python -m services.shards backfill`: {e}")
+
+def _enrollment_result(session, photo_id: int):
+    """What an earlier enrollment of this photo stored, or None"""
+    row = session.query(DetectedFace.id, PersonInfo.id, PersonInfo.name).join(
+        FaceEncoding, FaceEncoding.face_id == DetectedFace.id
+    ).outerjoin(PersonInfo, PersonInfo.face_id == DetectedFace.id).filter(
+        DetectedFace.photo_id == photo_id
+    ).order_by(DetectedFace.id).first()
+    if row is None:
+        return None
+    return {"photo_id": photo_id, "face_id": row[0], "person_info_id": row[1], "name": row[2]}
+
+def get_enrollment_result(photo_id: int):
+    """Result of a completed enrollment of this photo, or None"""
+    with SessionLocal() as session:
+        return _enrollment_result(session, photo_id)
+
+def save_enrollment(photo_id: int, face_result: dict, name: str = None, conversation_context: str = None,
+                    model_name: str = "Facenet", owner_id: str = DEFAULT_OWNER_ID):
+    """
+    Store the detected face, its encoding and the person's info in one transaction
+    The photo row is locked first; if the photo was already enrolled (a retried
+    or reclaimed job) nothing is written and the earlier result is returned
+    Returns (result dict, created)
+    """
+
+    encoding_array = np.array(face_result['encoding'])
+    normalized_encoding = (encoding_array / np.linalg.norm(encoding_array)).tolist()
+    bbox = face_result['bbox']
+
     with SessionLocal() as session:
         try:
-            # Normalize encoding before save
+            session.query(Photo.id).filter(Photo.id == photo_id).with_for_update().one()
+            existing = _enrollment_result(session, photo_id)
+            if existing:
+                session.rollback()
+                return existing, False
 
-            encoding_array = np.array(encoding)
-            normalized_encoding = (encoding_array / np.linalg.norm(encoding_array)).tolist()
+            face = DetectedFace(
+                owner_id=owner_id,
+                photo_id=photo_id,
+                x=bbox['x'], y=bbox['y'], width=bbox['w'], height=bbox['h'],
+                face_image_data=face_result.get('cropped_face'),
+                confidence=face_result.get('confidence')
+            )
+            session.add(face)
+            session.flush()
 
-            face_encoding = FaceEncoding(
-                face_id=face_id,
+            session.add(FaceEncoding(
+                owner_id=owner_id,
+                face_id=face.id,
                 encoding=normalized_encoding,
-                model_name=model_name   
+                model_name=model_name
+            ))
+            person_info = PersonInfo(
+                owner_id=owner_id,
+                face_id=face.id,
+                name=name,
+                conversation_context=conversation_context
             )
-            session.add(face_encoding)
+            session.add(person_info)
+            change = record_gallery_change(session, owner_id, face.id)
+            # A new person can change which row a name search returns
+            notify_invalidation(session, "names")
             session.commit()
-            return face_encoding.id
         except Exception as e:
             session.rollback()
             raise e
 
-def find_matching_face(query_encoding: list, threshold: float = None):
+        person_cache.invalidate_names()
+        _publish_encoding(owner_id, face.id, normalized_encoding, change.version)
+        return {
+            "photo_id": photo_id,
+            "face_id": face.id,
+            "person_info_id": person_info.id,
+            "name": name
+        }, True
+
+def _search_gallery(owner_id: str, query_normalized, threshold: float):
+    """Snapshot or shard search; returns (face_id or None, distance or None, partial)"""
+    if config.GALLERY_SNAPSHOT_ENABLED:
+        face_id, distance = gallery.search(owner_id, query_normalized, threshold)
+        return face_id, distance, False
+    return shards.nearest(owner_id, query_normalized, threshold)
+
+# Nearest neighbour by pgvector, or the face already found in the gallery snapshot or shards
+_NEAREST_BY_VECTOR = """
+    SELECT face_id, encoding <-> :query AS distance
+    FROM face_encodings
+    WHERE owner_id = :owner_id
+    ORDER BY encoding <-> :query
+    LIMIT 1
+"""
+_NEAREST_GIVEN = "SELECT CAST(:face_id AS integer) AS face_id, CAST(:distance AS double precision) AS distance"
+
+# Match, sighting update and cache invalidation in one statement. The self-join
+# returns the profile as it was before this sighting, which is what the API shows.
+# `notified` must be referenced by the outer query or Postgres never runs it.
+_RECOGNIZE_SQL = """
+WITH nearest AS ({nearest}),
+sighted AS (
+    UPDATE person_info AS p
+    SET last_seen_at = now(), times_met = p.times_met + 1
+    FROM person_info AS previous, nearest
+    WHERE previous.id = p.id
+      AND p.face_id = nearest.face_id
+      AND nearest.distance < :threshold
+    RETURNING p.id, p.owner_id, p.face_id, p.name, p.conversation_context, p.first_met_at,
+              p.last_seen_at, p.times_met,
+              previous.last_seen_at AS previous_last_seen_at,
+              previous.times_met AS previous_times_met
+),
+notified AS (
+    SELECT pg_notify(:channel, :notify_prefix || id::text) FROM sighted
+)
+SELECT nearest.face_id, nearest.distance,
+       sighted.id, sighted.owner_id, sighted.name, sighted.conversation_context, sighted.first_met_at,
+       sighted.last_seen_at, sighted.times_met, sighted.previous_last_seen_at, sighted.previous_times_met,
+       (SELECT count(*) FROM notified) AS notified
+FROM nearest
+LEFT JOIN sighted ON sighted.face_id = nearest.face_id
+"""
+
+def recognize_face(query_encoding: list, threshold: float = None, owner_id: str = DEFAULT_OWNER_ID):
     """
-    Find a matching face using pgvector similarity search
-    Returns the best match if distance < threshold, else None
+    Nearest face, its person's profile and the sighting update in one round trip
+    (none at all when the gallery snapshot or shards find no match)
+    Returns (profile as before this sighting or None, matched face_id or None, distance or None, partial)
+    partial is True when some gallery shards didn't answer, so a miss isn't definitive
     """
-    # Normalize query encoding
-    query_array = np.array(query_encoding)
-    query_normalized = query_array / np.linalg.norm(query_array)
-        
     if threshold is None:
         threshold = config.FACE_MATCH_THRESHOLD
 
-    with SessionLocal() as session:
-        # Use pgvector's <-> operator for L2 distance
-        result = session.query(
-            FaceEncoding,
-            FaceEncoding.encoding.l2_distance(query_normalized).label('distance')
-        ).order_by('distance').first()
-
-        if not result:
-            return None, None
-        
-        if result.distance < threshold:
-            return result[0], result.distance
-        else:
-            return None, result.distance
+    query_array = np.array(query_encoding)
+    query_normalized = query_array / np.linalg.norm(query_array)
 
-# Person info helper functions ---------------------------------------
+    partial = False
+    params = {
+        "threshold": threshold,
+        "channel": NOTIFY_CHANNEL,
+        "notify_prefix": invalidation_message("")
+    }
+    if config.GALLERY_SNAPSHOT_ENABLED or shards.enabled:
+        face_id, distance, partial = _search_gallery(owner_id, query_normalized, threshold)
+        if face_id is None:
+            return None, None, distance, partial
+        statement = text(_RECOGNIZE_SQL.format(nearest=_NEAREST_GIVEN))
+        params.update(face_id=face_id, distance=distance)
+    else:
+        statement = text(_RECOGNIZE_SQL.format(nearest=_NEAREST_BY_VECTOR)).bindparams(
+            bindparam("query", type_=Vector(128))
+        )
+        params.update(query=query_normalized.tolist(), owner_id=owner_id)
 
-def save_person_info(face_id: int, name: str = None, conversation_context: str = None):
-    """Save person information"""
     with SessionLocal() as session:
         try:
-            person_info = PersonInfo(
-                face_id=face_id,
-                name=name,
-                conversation_context=conversation_context
-            )
-            session.add(person_info)
+            row = session.execute(statement, params).first()
             session.commit()
-            return person_info.id
         except Exception as e:
             session.rollback()
             raise e
 
+    if row is None:
+        return None, None, None, partial
+    if row.distance >= threshold:
+        return None, None, row.distance, partial
+    if row.id is None:
+        # Matched a face that has no person info
+        return None, row.face_id, row.distance, partial
+
+    # Write-through the post-sighting profile; other workers got the NOTIFY
+    person_cache.update_person(person_to_profile(row))
+
+    profile = person_to_profile(row)
+    profile["last_seen_at"] = row.previous_last_seen_at.isoformat() if row.previous_last_seen_at else None
+    profile["times_met"] = row.previous_times_met
+    return profile, row.face_id, row.distance, partial
+
+def list_owner_ids():
+    """Every owner that has at least one stored encoding"""
+    with SessionLocal() as session:
+        return [row[0] for row in session.query(FaceEncoding.owner_id).distinct().all()]
+
+def iter_face_encoding_batches(batch_size: int = 5000, labeled_only: bool = False, owner_id: str = None):
+    """
+    Stream stored encodings (all owners, or one) in batches through a server-side cursor
+    Yields (face_ids int64 array, encodings float32 n x 128 matrix, names list, owner_ids list)
+    """
+    def to_arrays(rows):
+        face_ids = np.fromiter((r.face_id for r in rows), dtype=np.int64, count=len(rows))
+        encodings = np.vstack([np.asarray(r.encoding, dtype=np.float32) for r in rows])
+        return face_ids, encodings, [r.name for r in rows], [r.owner_id for r in rows]
+
+    with SessionLocal() as session:
+        query = session.query(
+            FaceEncoding.face_id, FaceEncoding.encoding, PersonInfo.name, FaceEncoding.owner_id
+        ).outerjoin(PersonInfo, PersonInfo.face_id == FaceEncoding.face_id).order_by(FaceEncoding.face_id)
+
+        if owner_id is not None:
+            query = query.filter(FaceEncoding.owner_id == owner_id)
+        if labeled_only:
+            query = query.filter(PersonInfo.name.isnot(None), PersonInfo.name != "")
+
+        batch = []
+        for row in query.yield_per(batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield to_arrays(batch)
+                batch = []
+        if batch:
+            yield to_arrays(batch)
+
+def load_face_encodings(labeled_only: bool = False, owner_id: str = None):
+    """All encodings as one (face_ids, float32 matrix, names, owner_ids) tuple - for offline analysis"""
+    face_ids, encodings, names, owner_ids = [], [], [], []
+    for batch in iter_face_encoding_batches(labeled_only=labeled_only, owner_id=owner_id):
+        face_ids.append(batch[0])
+        encodings.append(batch[1])
+        names.extend(batch[2])
+        owner_ids.extend(batch[3])
+
+    if not face_ids:
+        return np.empty(0, dtype=np.int64), np.empty((0, 128), dtype=np.float32), [], []
+    return np.concatenate(face_ids), np.vstack(encodings), names, owner_ids
+
+def get_gallery_version():
+    """Latest gallery changelog version across all owners"""
+    with SessionLocal() as session:
+        return session.query(func.max(GalleryChange.version)).scalar() or 0
+
+def get_gallery_changes(owner_id: str, since: int = 0):
+    """
+    One owner's gallery as of now, or only what changed after version `since`
+    Returns (version, rows, tombstones) where rows are
+    (face_id, encoding, person_info_id, name, conversation_context) and
+    tombstones are face ids deleted since `since`
+    """
+    with SessionLocal() as session:
+        # Changelog and gallery rows must come from the same snapshot
+        session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+        version = session.query(func.max(GalleryChange.version)).filter(
+            GalleryChange.owner_id == owner_id
+        ).scalar() or 0
+
+        query = session.query(
+            FaceEncoding.face_id, FaceEncoding.encoding,
+            PersonInfo.id, PersonInfo.name, PersonInfo.conversation_context
+        ).outerjoin(PersonInfo, PersonInfo.face_id == FaceEncoding.face_id).filter(
+            FaceEncoding.owner_id == owner_id
+        )
+
+        if not since:
+            return version, query.order_by(FaceEncoding.face_id).all(), []
+
+        changed = {row[0] for row in session.query(GalleryChange.face_id).filter(
+            GalleryChange.owner_id == owner_id,
+            GalleryChange.version > since
+        ).distinct()}
+        if not changed:
+            return version, [], []
+
+        rows = query.filter(FaceEncoding.face_id.in_(changed)).order_by(FaceEncoding.face_id).all()
+        tombstones = sorted(changed - {row.face_id for row in rows})
+        return version, rows, tombstones
+
+# Person info helper functions ---------------------------------------
+
+def person_to_profile(person_info: PersonInfo):
+    """Serialize a PersonInfo row into the profile dict returned by the API"""
+    return {
+        "id": person_info.id,
+        "owner_id": person_info.owner_id,
+        "face_id": person_info.face_id,
+        "name": person_info.name,
+        "conversation_context": person_info.conversation_context,
+        "first_met_at": person_info.first_met_at.isoformat() if person_info.first_met_at else None,
+        "last_seen_at": person_info.last_seen_at.isoformat() if person_info.last_seen_at else None,
+        "times_met": person_info.times_met
+    }
+
 def get_person_info_by_face_id(face_id:int):
     """Get person info for a face"""
     with SessionLocal() as session:
         return session.query(PersonInfo).filter(PersonInfo.face_id == face_id).first()
 
-def get_person_info_by_name(name: str):
-    """Get person info by name (case-insensitive partial match)"""
+def get_person_info_by_name(name: str, owner_id: str = DEFAULT_OWNER_ID):
+    """Get one owner's person info by name (case-insensitive partial match)"""
     with SessionLocal() as session:
         return session.query(PersonInfo).filter(
+            PersonInfo.owner_id == owner_id,
             PersonInfo.name.ilike(f"%{name}%")
         ).first()
 
-def update_person_last_seen(person_info_id: int):
-    """Update last seen timestamp and increment times_met"""        
+def get_person_profile_by_name(name: str, owner_id: str = DEFAULT_OWNER_ID):
+    """Cached profile dict for a name search (case-insensitive partial match), or None"""
+    key = ("name", owner_id, normalize_name(name))
+    profile = person_cache.get(key)
+    if profile is not None:
+        return profile
+
+    generation = person_cache.generation
+    person_info = get_person_info_by_name(name, owner_id)
+    if not person_info:
+        return None
+
+    profile = person_to_profile(person_info)
+    person_cache.put(key, profile, generation)
+    return profile
+
+def get_people_by_face_ids(face_ids: list):
+    """Map face_id -> profile dict for every face that has person info"""
+    with SessionLocal() as session:
+        people = session.query(PersonInfo).filter(PersonInfo.face_id.in_(face_ids)).all()
+        return {p.face_id: person_to_profile(p) for p in people}
+
+def merge_duplicate_faces(keep_face_id: int, duplicate_face_ids: list):
+    """
+    Fold duplicate identities into the one owning keep_face_id
+    - times_met is summed, first/last seen widened, distinct contexts concatenated
+    - the kept person takes the first non-empty name if it has none
+    - duplicate encodings and person info rows are deleted (their photos and crops stay)
+    Returns the merged profile
+    """
     with SessionLocal() as session:
         try:
-            person_info = session.query(PersonInfo).filter(PersonInfo.id == person_info_id).first()
-            if person_info:
-                person_info.last_seen_at = func.now()
-                person_info.times_met += 1
-                session.commit()
+            keep = session.query(PersonInfo).filter(PersonInfo.face_id == keep_face_id).with_for_update().first()
+            duplicates = session.query(PersonInfo).filter(
+                PersonInfo.face_id.in_(duplicate_face_ids)
+            ).order_by(PersonInfo.first_met_at).with_for_update().all()
+
+            if keep is None:
+                owner_id = session.query(FaceEncoding.owner_id).filter(
+                    FaceEncoding.face_id == keep_face_id
+                ).scalar() or DEFAULT_OWNER_ID
+                keep = PersonInfo(owner_id=owner_id, face_id=keep_face_id, times_met=0)
+                session.add(keep)
+
+            duplicate_ids = [d.id for d in duplicates]
+            contexts = [keep.conversation_context] if keep.conversation_context else []
+            for duplicate in duplicates:
+                if not keep.name and duplicate.name:
+                    keep.name = duplicate.name
+                if duplicate.conversation_context and duplicate.conversation_context not in contexts:
+                    contexts.append(duplicate.conversation_context)
+                keep.times_met = (keep.times_met or 0) + (duplicate.times_met or 0)
+                if duplicate.first_met_at and (not keep.first_met_at or duplicate.first_met_at < keep.first_met_at):
+                    keep.first_met_at = duplicate.first_met_at
+                if duplicate.last_seen_at and (not keep.last_seen_at or duplicate.last_seen_at > keep.last_seen_at):
+                    keep.last_seen_at = duplicate.last_seen_at
+                notify_invalidation(session, str(duplicate.id))
+                session.delete(duplicate)
+
+            owner_id = keep.owner_id or DEFAULT_OWNER_ID
+            for face_id in duplicate_face_ids:
+                record_gallery_change(session, owner_id, face_id, "delete")
+            record_gallery_change(session, owner_id, keep_face_id)
+
+            keep.conversation_context = "\n".join(contexts) or None
+
+            session.query(FaceEncoding).filter(
+                FaceEncoding.face_id.in_(duplicate_face_ids)
+            ).delete(synchronize_session=False)
+
+            session.flush()
+            notify_invalidation(session, str(keep.id))
+            notify_invalidation(session, "names")
+            session.commit()
+            session.refresh(keep)
+
+            if config.GALLERY_SNAPSHOT_ENABLED:
+                for face_id in duplicate_face_ids:
+                    append_delete(owner_id, face_id)
+            if shards.enabled:
+                try:
+                    shards.delete(duplicate_face_ids)
+                except Exception as e:
+                    print(f"❌ Failed to delete merged encodings from the gallery shards: {e}")
+                    queue_shard_repair(owner_id, duplicate_face_ids)
+
+            for person_id in duplicate_ids:
+                person_cache.invalidate_person(person_id)
+            person_cache.invalidate_person(keep.id)
+            person_cache.invalidate_names()
+            return person_to_profile(keep)
         except Exception as e:
             session.rollback()
             raise e
@@ -174,4 +517,226 @@ def save_transcript(photo_id: int, raw_text: str = None, extracted_name: str = N
             return transcript.id
         except Exception as e:
             session.rollback()
-            raise e
\ No newline at end of file
+            raise e
+
+# Full-text search helper functions ----------------------------------
+
+HEADLINE_OPTIONS = "StartSel=<b>, StopSel=</b>, MaxWords=35, MinWords=15, MaxFragments=2"
+
+def search_conversations(owner_id: str, query: str, since=None, until=None,
+                         kinds=("person", "transcript"), limit: int = 20, offset: int = 0):
+    """
+    Ranked full-text search over one owner's people and transcripts
+    - query uses web search syntax: words, "quoted phrases", or, -excluded
+    - since/until filter on when the person was met / the transcript was recorded
+    - Only the returned page is highlighted (ts_headline re-parses the text)
+    Returns (results, has_more)
+    """
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    sources = []
+
+    if "person" in kinds:
+        sources.append(select(
+            literal("person").label("kind"),
+            PersonInfo.id.label("id"),
+            PersonInfo.face_id.label("face_id"),
+            literal(None, Integer).label("photo_id"),
+            PersonInfo.name.label("name"),
+            func.coalesce(PersonInfo.conversation_context, "").label("text"),
+            PersonInfo.first_met_at.label("at"),
+            func.ts_rank(PersonInfo.search_vector, tsquery).label("rank")
+        ).where(
+            PersonInfo.owner_id == owner_id,
+            PersonInfo.search_vector.op("@@")(tsquery),
+            *_date_range(PersonInfo.first_met_at, since, until)
+        ))
+
+    if "transcript" in kinds:
+        sources.append(select(
+            literal("transcript").label("kind"),
+            Transcript.id.label("id"),
+            literal(None, Integer).label("face_id"),
+            Transcript.photo_id.label("photo_id"),
+            Transcript.extracted_name.label("name"),
+            func.concat_ws("\n", Transcript.context, Transcript.raw_text).label("text"),
+            Transcript.created_at.label("at"),
+            func.ts_rank(Transcript.search_vector, tsquery).label("rank")
+        ).join(Photo, Photo.id == Transcript.photo_id).where(
+            Photo.owner_id == owner_id,
+            Transcript.search_vector.op("@@")(tsquery),
+            *_date_range(Transcript.created_at, since, until)
+        ))
+
+    if not sources:
+        return [], False
+
+    matches = union_all(*sources).subquery() if len(sources) > 1 else sources[0].subquery()
+    # One extra row tells whether another page exists
+    page = select(matches).order_by(
+        matches.c.rank.desc(), matches.c.at.desc(), matches.c.kind, matches.c.id
+    ).limit(limit + 1).offset(offset).subquery()
+
+    statement = select(
+        page,
+        func.ts_headline(SEARCH_CONFIG, page.c.text, tsquery, HEADLINE_OPTIONS).label("highlight")
+    ).order_by(page.c.rank.desc(), page.c.at.desc(), page.c.kind, page.c.id)
+
+    with SessionLocal() as session:
+        rows = session.execute(statement).all()
+
+    results = [{
+        "kind": row.kind,
+        "id": row.id,
+        "face_id": row.face_id,
+        "photo_id": row.photo_id,
+        "name": row.name,
+        "highlight": row.highlight,
+        "at": row.at.isoformat() if row.at else None,
+        "rank": round(float(row.rank), 4)
+    } for row in rows[:limit]]
+    return results, len(rows) > limit
+
+def _date_range(column, since, until):
+    conditions = []
+    if since is not None:
+        conditions.append(column >= since)
+    if until is not None:
+        conditions.append(column < until)
+    return conditions
+
+# Enrollment job helper functions ------------------------------------
+
+def _job_to_dict(job: EnrollmentJob):
+    return {
+        "id": job.id,
+        "owner_id": job.owner_id,
+        "photo_id": job.photo_id,
+        "name": job.name,
+        "conversation_context": job.conversation_context,
+        "status": job.status,
+        "attempts": job.attempts,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None
+    }
+
+def enqueue_enrollment_job(image_data: bytes, name: str = None, conversation_context: str = None,
+                           idempotency_key: str = None, filename: str = "glasses_capture.jpg",
+                           owner_id: str = DEFAULT_OWNER_ID):
+    """
+    Persist the upload and queue an enrollment job in one transaction
+    Returns (job dict, created) - created is False when the idempotency key was already used
+    """
+    with SessionLocal() as session:
+        if idempotency_key:
+            existing = session.query(EnrollmentJob).filter(
+                EnrollmentJob.owner_id == owner_id,
+                EnrollmentJob.idempotency_key == idempotency_key
+            ).first()
+            if existing:
+                return _job_to_dict(existing), False
+
+        try:
+            photo = Photo(owner_id=owner_id, filename=filename, blob=PhotoBlob(image_data=image_data))
+            session.add(photo)
+            session.flush()
+
+            job = EnrollmentJob(
+                owner_id=owner_id,
+                idempotency_key=idempotency_key,
+                photo_id=photo.id,
+                name=name,
+                conversation_context=conversation_context,
+                status="queued",
+                attempts=0
+            )
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+            return _job_to_dict(job), True
+        except IntegrityError:
+            # A concurrent retry with the same key won the race
+            session.rollback()
+            if not idempotency_key:
+                raise
+            existing = session.query(EnrollmentJob).filter(
+                EnrollmentJob.owner_id == owner_id,
+                EnrollmentJob.idempotency_key == idempotency_key
+            ).first()
+            return _job_to_dict(existing), False
+        except Exception as e:
+            session.rollback()
+            raise e
+
+def claim_enrollment_job(stale_after_seconds: int):
+    """
+    Claim the oldest runnable job using SELECT ... FOR UPDATE SKIP LOCKED
+    Queued jobs wait until their not_before (retry backoff) has passed
+    Jobs stuck in 'running' longer than stale_after_seconds (crashed worker) are reclaimed
+    Returns the job dict, or None if the queue is empty
+    """
+    stale_before = func.now() - timedelta(seconds=stale_after_seconds)
+
+    with SessionLocal() as session:
+        try:
+            job = session.query(EnrollmentJob).filter(
+                or_(
+                    and_(
+                        EnrollmentJob.status == "queued",
+                        or_(EnrollmentJob.not_before.is_(None), EnrollmentJob.not_before <= func.now())
+                    ),
+                    and_(EnrollmentJob.status == "running", EnrollmentJob.locked_at < stale_before)
+                )
+            ).order_by(EnrollmentJob.created_at).with_for_update(skip_locked=True).first()
+
+            if not job:
+                return None
+
+            job.status = "running"
+            job.attempts += 1
+            job.locked_at = func.now()
+            session.commit()
+            session.refresh(job)
+            return _job_to_dict(job)
+        except Exception as e:
+            session.rollback()
+            raise e
+
+def finish_enrollment_job(job_id: int, attempt: int, status: str, result: dict = None, error: str = None,
+                          retry_in: float = None) -> bool:
+    """
+    Mark a job succeeded/failed, or put it back in the queue with status='queued'
+    Only applies while this worker still owns the attempt it claimed (status 'running'
+    with the same attempts count); a job reclaimed by another worker is left alone
+    retry_in: seconds before a requeued job may be claimed again
+    Returns whether the job was updated
+    """
+    with SessionLocal() as session:
+        try:
+            updated = session.query(EnrollmentJob).filter(
+                EnrollmentJob.id == job_id,
+                EnrollmentJob.status == "running",
+                EnrollmentJob.attempts == attempt
+            ).update({
+                EnrollmentJob.status: status,
+                EnrollmentJob.result: result,
+                EnrollmentJob.error: error,
+                EnrollmentJob.locked_at: None,
+                EnrollmentJob.not_before: func.now() + timedelta(seconds=retry_in) if retry_in else None,
+                EnrollmentJob.updated_at: func.now()
+            }, synchronize_session=False)
+            session.commit()
+            return updated > 0
+        except Exception as e:
+            session.rollback()
+            raise e
+
+def get_enrollment_job(job_id: int, owner_id: str = DEFAULT_OWNER_ID):
+    """Get one owner's enrollment job as a dict, or None"""
+    with SessionLocal() as session:
+        job = session.query(EnrollmentJob).filter(
+            EnrollmentJob.id == job_id,
+            EnrollmentJob.owner_id == owner_id
+        ).first()
+        return _job_to_dict(job) if job else None
@@ -0,0 +1,192 @@
+"""
+Background identity deduplication
+
+Builds a radius-neighbour graph over every stored encoding with blocked
+matmuls, clusters it DBSCAN-style with union-find and proposes (or applies)
+merges of duplicate identities.
+
+Usage:
+    cd backend/app
+    python -m services.dedup --radius 0.6           # report proposals
+    python -m services.dedup --radius 0.6 --merge   # apply them
+"""
+import os
+
+if __name__ == "__main__":
+    # One BLAS thread per process - parallelism comes from the process pool.
+    # Has to be set before numpy is imported.
+    for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(_var, "1")
+
+import numpy as np
+from typing import Dict, List
+from config import config
+from services.database import (
+    engine,
+    list_owner_ids,
+    load_face_encodings,
+    get_people_by_face_ids,
+    merge_duplicate_faces
+)
+from services.pairwise import map_distance_blocks, pair_mask
+from services.person_cache import normalize_name
+
+
+def _close_pairs_block(i0: int, j0: int, distances: np.ndarray, radius: float):
+    """(i, j) row pairs of one block that are within radius of each other"""
+    rows, cols = np.nonzero((distances < radius) & pair_mask(i0, j0, distances.shape))
+    return rows + i0, cols + j0
+
+
+def close_pairs(encodings: np.ndarray, radius: float, block_size: int = 2048, workers: int = None):
+    """Edges of the radius-neighbour graph as two index arrays"""
+    rows, cols = [], []
+    for block_rows, block_cols in map_distance_blocks(
+        encodings, _close_pairs_block, context=radius, block_size=block_size, workers=workers
+    ):
+        rows.append(block_rows)
+        cols.append(block_cols)
+
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+class UnionFind:
+    def __init__(self, n: int):
+        self.parent = np.arange(n)
+
+    def find(self, i: int) -> int:
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # Path compression
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, a: int, b: int):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def cluster(n: int, rows: np.ndarray, cols: np.ndarray, min_samples: int = 1) -> List[List[int]]:
+    """
+    DBSCAN over a precomputed neighbour graph, returning clusters of 2+ points
+
+    Points with at least min_samples neighbours (counting themselves) are core
+    points; connected core points form a cluster and border points join the
+    cluster of one core neighbour. min_samples=1 is plain connected components.
+    """
+    degree = np.bincount(np.concatenate([rows, cols]), minlength=n) + 1
+    core = degree >= min_samples
+
+    union_find = UnionFind(n)
+    both_core = core[rows] & core[cols]
+    for a, b in zip(rows[both_core], cols[both_core]):
+        union_find.union(a, b)
+
+    # Attach each border point to the first core point it touches
+    attached = np.zeros(n, dtype=bool)
+    for a, b in zip(rows[~both_core], cols[~both_core]):
+        if core[a] and not core[b] and not attached[b]:
+            union_find.union(a, b)
+            attached[b] = True
+        elif core[b] and not core[a] and not attached[a]:
+            union_find.union(b, a)
+            attached[a] = True
+
+    members: Dict[int, List[int]] = {}
+    for i in np.unique(np.concatenate([rows, cols])):
+        members.setdefault(union_find.find(i), []).append(int(i))
+
+    return [m for m in members.values() if len(m) > 1]
+
+
+def propose_merges(radius: float = None, min_samples: int = None,
+                   block_size: int = 2048, workers: int = None) -> List[Dict]:
+    """
+    Find duplicate identity clusters in every owner's gallery
+
+    Owners are clustered separately - two users' contacts are never merged.
+    Each proposal keeps the earliest-met person. Clusters whose members carry
+    different names are flagged as conflicting and are never merged automatically.
+    """
+    proposals = []
+    for owner_id in list_owner_ids():
+        proposals.extend(_propose_owner_merges(owner_id, radius, min_samples, block_size, workers))
+    return proposals
+
+
+def _propose_owner_merges(owner_id: str, radius: float = None, min_samples: int = None,
+                          block_size: int = 2048, workers: int = None) -> List[Dict]:
+    radius = radius if radius is not None else config.DEDUP_RADIUS
+    min_samples = min_samples if min_samples is not None else config.DEDUP_MIN_SAMPLES
+
+    face_ids, encodings, _, _ = load_face_encodings(owner_id=owner_id)
+    if len(face_ids) < 2:
+        return []
+
+    if workers != 1:
+        # Forked workers must not inherit pooled database connections
+        engine.dispose()
+
+    rows, cols = close_pairs(encodings, radius, block_size, workers)
+    clusters = cluster(len(face_ids), rows, cols, min_samples)
+
+    cluster_face_ids = [[int(face_ids[i]) for i in members] for members in clusters]
+    people = get_people_by_face_ids([f for members in cluster_face_ids for f in members])
+
+    proposals = []
+    for members in cluster_face_ids:
+        profiles = [people.get(f) for f in members]
+        # Prefer the earliest-met person; faces without person info sort last
+        ordered = sorted(zip(members, profiles), key=lambda m: (m[1] is None, (m[1] or {}).get('first_met_at') or ""))
+        names = {normalize_name(p['name']) for p in profiles if p and p['name']}
+
+        proposals.append({
+            "owner_id": owner_id,
+            "keep_face_id": ordered[0][0],
+            "duplicate_face_ids": [f for f, _ in ordered[1:]],
+            "names": sorted(names),
+            "conflicting": len(names) > 1
+        })
+
+    return proposals
+
+
+def run_dedup(merge: bool = None, radius: float = None, min_samples: int = None,
+              workers: int = None) -> Dict:
+    """Propose duplicate identities and, if enabled, merge the non-conflicting ones"""
+    merge = config.DEDUP_AUTO_MERGE if merge is None else merge
+    proposals = propose_merges(radius, min_samples, workers=workers or config.DEDUP_WORKERS)
+
+    merged = 0
+    for proposal in proposals:
+        if merge and not proposal["conflicting"]:
+            merge_duplicate_faces(proposal["keep_face_id"], proposal["duplicate_face_ids"])
+            proposal["merged"] = True
+            merged += 1
+        else:
+            proposal["merged"] = False
+
+    removed = sum(len(p["duplicate_face_ids"]) for p in proposals if p["merged"])
+    print(f"✅ Dedup: {len(proposals)} duplicate cluster(s), {merged} merged, {removed} encoding(s) removed")
+    return {"proposals": proposals, "clusters_merged": merged, "encodings_removed": removed}
+
+
+# For command-line runs
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Find and merge duplicate identities in the gallery')
+    parser.add_argument('--radius', type=float, default=config.DEDUP_RADIUS, help='Max L2 distance between duplicates')
+    parser.add_argument('--min-samples', type=int, default=config.DEDUP_MIN_SAMPLES, help='DBSCAN core point size')
+    parser.add_argument('--merge', action='store_true', help='Merge non-conflicting clusters')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (default: all cores)')
+    args = parser.parse_args()
+
+    report = run_dedup(args.merge, args.radius, args.min_samples, args.workers)
+    print(json.dumps(report, indent=2))
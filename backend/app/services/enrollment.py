@@ -0,0 +1,137 @@
+import threading
+from typing import Dict, List
+from config import config
+from models.face_scan import DEFAULT_OWNER_ID
+from services.database import (
+    save_enrollment,
+    get_enrollment_result,
+    get_photo_image_data,
+    claim_enrollment_job,
+    finish_enrollment_job
+)
+from services.admission import BATCH, admission
+from services.face_detection import detect_and_encode_face
+from services.face_quality import FaceQualityError
+from services.stranger_gallery import strangers
+
+
+class NoFaceDetectedError(Exception):
+    """Raised when an enrollment photo contains no usable face"""
+
+
+def enroll_detected_face(photo_id: int, face_result: Dict, name: str = None,
+                         conversation_context: str = None, owner_id: str = DEFAULT_OWNER_ID) -> Dict:
+    """
+    Store a detected face, its encoding and the person's info (one transaction)
+    Shared by the synchronous first-meeting route and the background workers;
+    enrolling an already enrolled photo returns the earlier result
+    """
+    result, created = save_enrollment(
+        photo_id=photo_id,
+        face_result=face_result,
+        name=name,
+        conversation_context=conversation_context,
+        model_name=config.FACE_MODEL,
+        owner_id=owner_id
+    )
+    if created:
+        print(f"✅ Saved face #{result['face_id']} and person info #{result['person_info_id']}: {name}")
+        strangers.observe_enrollment(owner_id, face_result['encoding'])
+    else:
+        print(f"✅ Photo #{photo_id} was already enrolled as face #{result['face_id']}")
+    return result
+
+
+def _finish(job: Dict, status: str, **kwargs):
+    if not finish_enrollment_job(job['id'], job['attempts'], status, **kwargs):
+        print(f"⚠️ Enrollment job #{job['id']} attempt {job['attempts']} was reclaimed; not recording '{status}'")
+
+
+def process_enrollment_job(job: Dict):
+    """Run detection + enrollment for a claimed job and record the outcome"""
+    if job['attempts'] > config.ENROLLMENT_MAX_ATTEMPTS:
+        # Reclaimed after its worker died too many times
+        _finish(job, "failed", error=job['error'] or "Exceeded max attempts")
+        return
+
+    try:
+        # A previous attempt may have committed before its worker died
+        result = get_enrollment_result(job['photo_id'])
+        if result:
+            _finish(job, "succeeded", result=result)
+            print(f"✅ Enrollment job #{job['id']} was already enrolled")
+            return
+
+        image_data = get_photo_image_data(job['photo_id'])
+        if not image_data:
+            raise NoFaceDetectedError(f"Photo #{job['photo_id']} image is no longer available")
+
+        # Lowest priority and never shed - the job table is this work's queue
+        face_result = admission.run(detect_and_encode_face, image_data, priority=BATCH, sheddable=False)
+        if not face_result:
+            raise NoFaceDetectedError("No face detected in image")
+
+        result = enroll_detected_face(
+            photo_id=job['photo_id'],
+            face_result=face_result,
+            name=job['name'],
+            conversation_context=job['conversation_context'],
+            owner_id=job['owner_id']
+        )
+        _finish(job, "succeeded", result=result)
+        print(f"✅ Enrollment job #{job['id']} succeeded")
+
+    except (NoFaceDetectedError, FaceQualityError) as e:
+        # Retrying the same photo won't help
+        _finish(job, "failed", error=str(e))
+        print(f"❌ Enrollment job #{job['id']} failed: {e}")
+    except Exception as e:
+        retry = job['attempts'] < config.ENROLLMENT_MAX_ATTEMPTS
+        # Back off so a brief database or model outage doesn't use up every attempt at once
+        retry_in = config.ENROLLMENT_RETRY_BACKOFF * 2 ** (job['attempts'] - 1)
+        _finish(job, "queued" if retry else "failed", error=str(e),
+                              retry_in=retry_in if retry else None)
+        print(f"❌ Enrollment job #{job['id']} attempt {job['attempts']} errored"
+              f"{f', retrying in {retry_in:.0f}s' if retry else ''}: {e}")
+
+
+# ==================== WORKER POOL ====================
+
+_stop_event = threading.Event()
+_workers: List[threading.Thread] = []
+
+
+def _worker_loop(worker_id: int):
+    while not _stop_event.is_set():
+        try:
+            job = claim_enrollment_job(stale_after_seconds=config.ENROLLMENT_JOB_TIMEOUT)
+        except Exception as e:
+            print(f"❌ Enrollment worker {worker_id} could not claim a job: {e}")
+            job = None
+
+        if job:
+            process_enrollment_job(job)
+        else:
+            _stop_event.wait(config.ENROLLMENT_POLL_INTERVAL)
+
+
+def start_enrollment_workers():
+    """Start the background enrollment workers (no-op if already running)"""
+    if _workers:
+        return
+
+    _stop_event.clear()
+    for i in range(config.ENROLLMENT_WORKERS):
+        worker = threading.Thread(target=_worker_loop, args=(i,), name=f"enrollment-worker-{i}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+
+    print(f"✅ Started {len(_workers)} enrollment worker(s)")
+
+
+def stop_enrollment_workers(timeout: float = 5.0):
+    """Signal the workers to stop and wait for in-flight jobs"""
+    _stop_event.set()
+    for worker in _workers:
+        worker.join(timeout)
+    _workers.clear()
@@ -5,10 +5,41 @@ from PIL import Image
 import cv2 as cv
 from typing import Dict, Optional, List
 from config import config
+from services.face_quality import (
+    FaceQualityError,
+    score_faces,
+    evaluate_quality,
+    quality_action,
+    face_metrics
+)
+from services.timing import stage
+
+
+def _embed_face(face: np.ndarray, model_name: str = None) -> np.ndarray:
+    """Run the embedding model (FACE_MODEL by default) on an already detected and aligned face"""
+    results = DeepFace.represent(
+        img_path=face,
+        model_name=model_name or config.FACE_MODEL,
+        detector_backend="skip",  # Detection already done by extract_faces
+        enforce_detection=False
+    )
+    return np.array(results[0]['embedding'])
+
+
+def _crop_face_bytes(img: np.ndarray, bbox: Dict) -> bytes:
+    """Crop a face from the frame and JPEG-encode it for storage"""
+    x, y, w, h = bbox['x'], bbox['y'], bbox['w'], bbox['h']
+    _, buffer = cv.imencode('.jpg', img[y:y+h, x:x+w])
+    return buffer.tobytes()
+
 
 def detect_and_encode_face(image_data: bytes) -> Optional[Dict]:
     """
-    Detect face and generate 128-d encoding using DeepFace + RetinaFace
+    Detect face and generate 128-d encoding using DeepFace
+    (DETECTOR_BACKEND for detection, FACE_MODEL for the embedding)
+
+    Detection and embedding run as separate passes so the quality gate can
+    drop blurry, tiny, dark or profile faces before the expensive embedding call.
     
     Args:
         image_data: Raw image bytes from MentraLive glasses or database
@@ -19,57 +50,74 @@ def detect_and_encode_face(image_data: bytes) -> Optional[Dict]:
             'encoding': list,  # 128-d face embedding
             'bbox': dict,      # {x, y, w, h} bounding box
             'confidence': float,
-            'cropped_face': bytes  # Optional cropped face image
+            'cropped_face': bytes,  # Optional cropped face image
+            'quality': dict    # Quality metrics of the face
         }
         Returns None if no face detected
+
+    Raises:
+        FaceQualityError: If the face fails the quality gate
     """
     try:
         # Convert bytes to numpy array
-        nparr = np.frombuffer(image_data, np.uint8)
-        img = cv.imdecode(nparr, cv.IMREAD_COLOR)
+        with stage("decode"):
+            nparr = np.frombuffer(image_data, np.uint8)
+            img = cv.imdecode(nparr, cv.IMREAD_COLOR)
         
         if img is None:
             print("❌ Failed to decode image")
             return None
         
-        results = DeepFace.represent(
-            img_path=img,
-            model_name="Facenet",         
-            detector_backend="retinaface", 
-            enforce_detection=True,
-            align=True                     
-        )
+        with stage("detect"):
+            faces = DeepFace.extract_faces(
+                img_path=img,
+                detector_backend=config.DETECTOR_BACKEND,
+                enforce_detection=True,
+                align=True,
+                color_face="bgr"
+            )
         
         # If multiple faces detected, pick the largest one (closest person)
-        if len(results) > 1:
-            print(f"⚠️  Detected {len(results)} faces, using largest one")
-            results = [max(results, key=lambda x: x['facial_area']['w'] * x['facial_area']['h'])]
+        if len(faces) > 1:
+            print(f"⚠️  Detected {len(faces)} faces, using largest one")
+            faces = [max(faces, key=lambda x: x['facial_area']['w'] * x['facial_area']['h'])]
         
-        face_data = results[0]
+        face_data = faces[0]
         
         # Extract bounding box
         bbox = face_data['facial_area']
 
-        confidence = face_data.get('face_confidence', 0.99)
+        confidence = face_data.get('confidence', 0.99)
         if confidence < config.FACE_CONFIDENCE_MIN:
             print(f"⚠️  Face confidence too low: {confidence}")
             return None
+
+        with stage("quality"):
+            scores = score_faces(img, [bbox])
+            quality = face_metrics(scores, 0)
+
+        if config.QUALITY_GATE_ENABLED:
+            reason = evaluate_quality(scores)[0]
+            if reason:
+                print(f"⚠️  Face failed quality gate ({reason}): {quality}")
+                raise FaceQualityError(reason, quality_action(reason), quality)
+
+        with stage("embed"):
+            embedding = _embed_face(face_data['face'])
         
-        # Crop the face from the image (optional, for storage)
-        x, y, w, h = bbox['x'], bbox['y'], bbox['w'], bbox['h']
-        cropped_face = img[y:y+h, x:x+w]
-        
-        # Convert cropped face to bytes
-        _, buffer = cv.imencode('.jpg', cropped_face)
-        cropped_face_bytes = buffer.tobytes()
+        with stage("crop"):
+            cropped_face = _crop_face_bytes(img, bbox)
         
         return {
-            'encoding': face_data['embedding'] / np.linalg.norm(face_data['embedding']),  # 128-d vector
+            'encoding': embedding / np.linalg.norm(embedding),  # 128-d vector
             'bbox': bbox,                        # {x, y, w, h}
             'confidence': confidence,
-            'cropped_face': cropped_face_bytes
+            'cropped_face': cropped_face,
+            'quality': quality
         }
         
+    except FaceQualityError:
+        raise
     except ValueError as e:
         # No face detected
         print(f"❌ No face detected: {e}")
@@ -82,6 +130,8 @@ def detect_and_encode_face(image_data: bytes) -> Optional[Dict]:
 def detect_multiple_faces(image_data: bytes) -> List[Dict]:
     """
     Detect ALL faces in an image (for group photos)
+
+    Faces failing the quality gate are skipped without being embedded.
     
     Args:
         image_data: Raw image bytes
@@ -99,29 +149,35 @@ def detect_multiple_faces(image_data: bytes) -> List[Dict]:
             return []
         
         # Detect all faces
-        results = DeepFace.represent(
+        detected = DeepFace.extract_faces(
             img_path=img,
-            model_name="Facenet",
-            detector_backend="retinaface",
+            detector_backend=config.DETECTOR_BACKEND,
             enforce_detection=False,  # Don't throw error if no faces
-            align=True
+            align=True,
+            color_face="bgr"
         )
+        # With enforce_detection=False a whole-frame placeholder is returned when nothing is found
+        detected = [f for f in detected if f.get('confidence', 0) > 0]
+        if not detected:
+            print("✅ Detected 0 face(s)")
+            return []
+
+        scores = score_faces(img, [f['facial_area'] for f in detected])
+        reasons = evaluate_quality(scores) if config.QUALITY_GATE_ENABLED else [None] * len(detected)
         
         faces = []
-        for face_data in results:
+        for i, face_data in enumerate(detected):
+            if reasons[i]:
+                print(f"⚠️  Skipping face #{i} ({reasons[i]})")
+                continue
+
             bbox = face_data['facial_area']
-            x, y, w, h = bbox['x'], bbox['y'], bbox['w'], bbox['h']
-            
-            # Crop face
-            cropped_face = img[y:y+h, x:x+w]
-            _, buffer = cv.imencode('.jpg', cropped_face)
-            cropped_face_bytes = buffer.tobytes()
-            
             faces.append({
-                'encoding': face_data['embedding'],
+                'encoding': _embed_face(face_data['face']),
                 'bbox': bbox,
-                'confidence': face_data.get('face_confidence', 0.99),
-                'cropped_face': cropped_face_bytes
+                'confidence': face_data.get('confidence', 0.99),
+                'cropped_face': _crop_face_bytes(img, bbox),
+                'quality': face_metrics(scores, i)
             })
         
         print(f"✅ Detected {len(faces)} face(s)")
@@ -175,7 +231,7 @@ def test_detection_on_photo_id(photo_id: int):
     Test face detection on a photo from the database
     For debugging purposes
     """
-    from services.database import get_photo_by_id
+    from services.database import get_photo_by_id, get_photo_image_data
     
     photo = get_photo_by_id(photo_id)
     if not photo:
@@ -183,7 +239,7 @@ def test_detection_on_photo_id(photo_id: int):
         return
     
     print(f"🔍 Testing face detection on photo #{photo_id}")
-    result = detect_and_encode_face(photo.image_data)
+    result = detect_and_encode_face(get_photo_image_data(photo.id))
     
     if result:
         print(f"✅ Face detected!")
@@ -198,7 +254,7 @@ def test_detection_on_latest_photo():
     """
     Test face detection on the most recent photo in database
     """
-    from services.database import get_most_recent_photo
+    from services.database import get_most_recent_photo, get_photo_image_data
     
     photo = get_most_recent_photo()
     if not photo:
@@ -206,7 +262,7 @@ def test_detection_on_latest_photo():
         return
     
     print(f"🔍 Testing face detection on most recent photo (#{photo.id})")
-    result = detect_and_encode_face(photo.image_data)
+    result = detect_and_encode_face(get_photo_image_data(photo.id))
     
     if result:
         print(f"✅ Face detected!")
@@ -0,0 +1,148 @@
+import numpy as np
+import cv2 as cv
+from typing import Dict, List
+from config import config
+
+
+class FaceQualityError(Exception):
+    """
+    Raised when a detected face fails the quality gate
+
+    Attributes:
+        reason: Short machine-readable reason (e.g. 'blurry', 'profile')
+        action: 'defer' if a later frame is likely to pass, 'reject' otherwise
+        metrics: Quality metrics of the rejected face
+    """
+
+    def __init__(self, reason: str, action: str, metrics: Dict):
+        super().__init__(f"Face rejected by quality gate: {reason}")
+        self.reason = reason
+        self.action = action
+        self.metrics = metrics
+
+
+def _box_means(integral: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """Mean of an image over every (x, y, w, h) box using its integral image"""
+    x0, y0 = boxes[:, 0], boxes[:, 1]
+    x1, y1 = x0 + boxes[:, 2], y0 + boxes[:, 3]
+    sums = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    return sums / np.maximum(boxes[:, 2] * boxes[:, 3], 1)
+
+
+def _estimate_yaw(facial_areas: List[Dict]) -> np.ndarray:
+    """
+    Approximate head yaw in degrees from detector landmarks
+
+    Uses the nose position between the eyes when available, otherwise
+    the eye midpoint offset from the box center. Yaw is NaN (unknown) when
+    the detector gives no eye landmarks - several backends (e.g. opencv,
+    ssd) never do - so the yaw check is skipped rather than failed.
+    """
+    yaw = np.full(len(facial_areas), np.nan)
+
+    for i, area in enumerate(facial_areas):
+        left_eye, right_eye = area.get('left_eye'), area.get('right_eye')
+        if not left_eye or not right_eye:
+            continue
+
+        eye_x = np.array([left_eye[0], right_eye[0]], dtype=np.float64)
+        eye_span = abs(eye_x[1] - eye_x[0])
+        if eye_span < 1:
+            continue
+
+        nose = area.get('nose')
+        if nose:
+            # 0.0 = nose on the leftmost eye, 1.0 = on the rightmost eye
+            offset = 2 * ((nose[0] - eye_x.min()) / eye_span) - 1
+        else:
+            center_x = area['x'] + area['w'] / 2
+            offset = (eye_x.mean() - center_x) / max(area['w'] / 2, 1)
+
+        yaw[i] = np.degrees(np.arcsin(np.clip(offset, -1.0, 1.0)))
+
+    return np.abs(yaw)
+
+
+def score_faces(img: np.ndarray, facial_areas: List[Dict]) -> Dict[str, np.ndarray]:
+    """
+    Compute quality metrics for every detected face in one pass
+
+    Sharpness (Laplacian variance) and brightness are read from integral
+    images of the whole frame, so the cost does not grow with face count.
+
+    Args:
+        img: Decoded BGR frame
+        facial_areas: 'facial_area' dicts from the detector
+
+    Returns:
+        Dictionary of arrays, one entry per face:
+        {
+            'size': min(w, h) in pixels,
+            'sharpness': Laplacian variance,
+            'yaw': estimated yaw in degrees,
+            'brightness': mean gray level (0-255)
+        }
+    """
+    height, width = img.shape[:2]
+
+    boxes = np.array(
+        [[a['x'], a['y'], a['w'], a['h']] for a in facial_areas], dtype=np.int64
+    ).reshape(-1, 4)
+    # Clip boxes to the frame so integral lookups stay in bounds
+    boxes[:, 0] = np.clip(boxes[:, 0], 0, width - 1)
+    boxes[:, 1] = np.clip(boxes[:, 1], 0, height - 1)
+    boxes[:, 2] = np.clip(boxes[:, 2], 1, width - boxes[:, 0])
+    boxes[:, 3] = np.clip(boxes[:, 3], 1, height - boxes[:, 1])
+
+    gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
+    laplacian = cv.Laplacian(gray, cv.CV_64F)
+    lap_sum, lap_sqsum = cv.integral2(laplacian, sdepth=cv.CV_64F, sqdepth=cv.CV_64F)
+    gray_sum = cv.integral(gray, sdepth=cv.CV_64F)
+
+    lap_mean = _box_means(lap_sum, boxes)
+    lap_sq_mean = _box_means(lap_sqsum, boxes)
+
+    return {
+        'size': np.minimum(boxes[:, 2], boxes[:, 3]),
+        'sharpness': np.maximum(lap_sq_mean - lap_mean ** 2, 0.0),
+        'yaw': _estimate_yaw(facial_areas),
+        'brightness': _box_means(gray_sum, boxes),
+    }
+
+
+def evaluate_quality(scores: Dict[str, np.ndarray]) -> List[str | None]:
+    """
+    Apply configured thresholds to face quality scores
+
+    Returns:
+        List with one entry per face: None if it passed, else the reason
+    """
+    checks = [
+        ('too_small', scores['size'] < config.QUALITY_MIN_FACE_SIZE),
+        ('blurry', scores['sharpness'] < config.QUALITY_MIN_SHARPNESS),
+        # NaN (unknown) yaw compares False, so it never fails this check
+        ('profile', scores['yaw'] > config.QUALITY_MAX_YAW),
+        ('too_dark', scores['brightness'] < config.QUALITY_MIN_BRIGHTNESS),
+        ('too_bright', scores['brightness'] > config.QUALITY_MAX_BRIGHTNESS),
+    ]
+
+    reasons = [None] * len(scores['size'])
+    for reason, failed in checks:
+        for i in np.flatnonzero(failed):
+            if reasons[i] is None:
+                reasons[i] = reason
+
+    return reasons
+
+
+def quality_action(reason: str) -> str:
+    """'defer' for transient problems a later frame may fix, else 'reject'"""
+    return "defer" if reason in config.QUALITY_DEFER_REASONS else "reject"
+
+
+def face_metrics(scores: Dict[str, np.ndarray], index: int) -> Dict:
+    """Plain-float metrics of one face, for logging and API responses (None if unknown)"""
+    return {
+        name: round(float(values[index]), 2) if np.isfinite(values[index]) else None
+        for name, values in scores.items()
+    }
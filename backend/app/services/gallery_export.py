@@ -0,0 +1,124 @@
+import json
+import struct
+import numpy as np
+from typing import Dict, List
+from services.database import get_gallery_changes
+
+MAGIC = b"VGAL"
+FORMAT_VERSION = 1
+
+DTYPES = {"float16": 1, "int8": 2}
+
+FLAG_FULL_SNAPSHOT = 1
+"""Set when the payload replaces the client's gallery instead of patching it"""
+
+# magic, format, dtype, flags, pad, version, since, count, tombstones, dim, pad, profiles bytes
+HEADER = struct.Struct("<4sBBBBQQIIHHI")
+"""
+Little-endian payload layout (every section starts 4-byte aligned):
+
+    header      40 bytes (see HEADER)
+    ids         int32[count]          face ids
+    scales      float32[count]        int8 only: row = q * scale
+    matrix      float16|int8[count*dim]
+    tombstones  int32[tombstones]     face ids removed since `since`
+    profiles    UTF-8 JSON [[person_info_id, name, conversation_context], ...] aligned with ids
+"""
+
+
+def quantize_int8(matrix: np.ndarray):
+    """Symmetric per-row int8 quantization: returns (int8 matrix, float32 scales)"""
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def pack_gallery(version: int, since: int, face_ids: List[int], matrix: np.ndarray,
+                 profiles: List, tombstones: List[int], dtype: str = "float16",
+                 full_snapshot: bool = False) -> bytes:
+    """Serialize gallery rows into the compact export format"""
+    count, dim = matrix.shape
+    profile_bytes = json.dumps(profiles, separators=(",", ":")).encode("utf-8")
+
+    parts = [HEADER.pack(
+        MAGIC, FORMAT_VERSION, DTYPES[dtype], FLAG_FULL_SNAPSHOT if full_snapshot else 0, 0,
+        version, since, count, len(tombstones), dim, 0, len(profile_bytes)
+    ), np.asarray(face_ids, dtype="<i4").tobytes()]
+
+    if dtype == "int8":
+        quantized, scales = quantize_int8(matrix)
+        parts += [scales.astype("<f4").tobytes(), quantized.tobytes()]
+    else:
+        parts.append(matrix.astype("<f2").tobytes())
+
+    parts += [np.asarray(tombstones, dtype="<i4").tobytes(), profile_bytes]
+    return b"".join(parts)
+
+
+def unpack_gallery(payload: bytes) -> Dict:
+    """Parse an export payload back into arrays (used by tooling and tests of the format)"""
+    (magic, _, dtype_code, flags, _, version, since, count,
+     tombstone_count, dim, _, profiles_length) = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError("Not a gallery export")
+
+    offset = HEADER.size
+    face_ids = np.frombuffer(payload, dtype="<i4", count=count, offset=offset)
+    offset += 4 * count
+
+    if dtype_code == DTYPES["int8"]:
+        scales = np.frombuffer(payload, dtype="<f4", count=count, offset=offset)
+        offset += 4 * count
+        quantized = np.frombuffer(payload, dtype=np.int8, count=count * dim, offset=offset)
+        matrix = quantized.reshape(count, dim).astype(np.float32) * scales[:, None]
+        offset += count * dim
+    else:
+        matrix = np.frombuffer(payload, dtype="<f2", count=count * dim, offset=offset)
+        matrix = matrix.reshape(count, dim).astype(np.float32)
+        offset += 2 * count * dim
+
+    tombstones = np.frombuffer(payload, dtype="<i4", count=tombstone_count, offset=offset)
+    offset += 4 * tombstone_count
+
+    return {
+        "version": version,
+        "since": since,
+        "full_snapshot": bool(flags & FLAG_FULL_SNAPSHOT),
+        "face_ids": face_ids,
+        "matrix": matrix,
+        "tombstones": tombstones,
+        "profiles": json.loads(payload[offset:offset + profiles_length].decode("utf-8"))
+    }
+
+
+def export_gallery(owner_id: str, since: int = 0, dtype: str = "float16"):
+    """
+    Build an owner's gallery export
+    since=0 (or a version newer than the server's) returns a full snapshot
+    Returns (version, payload bytes)
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported dtype: {dtype}")
+
+    version, rows, tombstones = get_gallery_changes(owner_id, since)
+    if since and since > version:
+        # Client is ahead of us (e.g. database restored) - start over
+        since = 0
+        version, rows, tombstones = get_gallery_changes(owner_id, 0)
+
+    matrix = np.array([row.encoding for row in rows], dtype=np.float32).reshape(len(rows), -1)
+    if not rows:
+        matrix = np.empty((0, 128), dtype=np.float32)
+
+    payload = pack_gallery(
+        version=version,
+        since=since,
+        face_ids=[row.face_id for row in rows],
+        matrix=matrix,
+        profiles=[[row.id, row.name, row.conversation_context] for row in rows],
+        tombstones=tombstones,
+        dtype=dtype,
+        full_snapshot=not since
+    )
+    return version, payload
@@ -0,0 +1,467 @@
+"""
+Memory-mapped gallery snapshot with an append-only delta log
+
+Workers search an in-process copy of face_encodings instead of Postgres:
+
+    CURRENT                  generation number of the live snapshot
+    snapshot-<gen>.bin       header, face ids, 64-byte aligned float32 matrix and
+                             an owner table; rows are grouped by owner so one
+                             owner's gallery is a contiguous slice
+    delta-<gen>.log          upserts/deletes appended by enrollments (save_enrollment) and
+                             merges since that snapshot was written
+
+Opening a snapshot is an mmap (pages are shared between workers through the
+page cache) followed by replaying the usually short log. Compaction folds the
+log into the next generation; a rebuild re-reads Postgres, the source of truth.
+The directory is per host: every worker that writes the gallery must share it.
+
+Usage:
+    cd backend/app
+    python -m services.gallery_snapshot --rebuild   # build from Postgres
+    python -m services.gallery_snapshot --compact   # fold the delta log
+"""
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config import config
+
+MAGIC = b"VSNP"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# magic, format, dim, owners, count, version, ids offset, matrix offset, owners offset, owners length
+HEADER = struct.Struct("<4sIIIQQQQQQ")
+
+# record length, op, owner length, version, face id - followed by owner bytes and the float32 vector
+LOG_RECORD = struct.Struct("<IBxHqi")
+
+OP_UPSERT = 1
+OP_DELETE = 2
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class Snapshot:
+    """One read-only, memory-mapped snapshot file"""
+
+    def __init__(self, path: str, generation: int):
+        self.path = path
+        self.generation = generation
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, _, self.dim, _, self.count, self.version, ids_offset,
+         matrix_offset, owners_offset, owners_length) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a gallery snapshot")
+
+        self.face_ids = np.frombuffer(self._mmap, dtype="<i4", count=self.count, offset=ids_offset)
+        self.matrix = np.frombuffer(self._mmap, dtype="<f4", count=self.count * self.dim,
+                                    offset=matrix_offset).reshape(self.count, self.dim)
+        self.owners: Dict[str, Tuple[int, int]] = {
+            owner: (start, count)
+            for owner, start, count in json.loads(self._mmap[owners_offset:owners_offset + owners_length])
+        }
+
+    def owner_rows(self, owner_id: str):
+        start, count = self.owners.get(owner_id, (0, 0))
+        return self.face_ids[start:start + count], self.matrix[start:start + count]
+
+
+def write_snapshot(path: str, face_ids: np.ndarray, owner_ids: List[str], matrix: np.ndarray, version: int = 0):
+    """Write rows grouped by owner to path (via a temp file and rename)"""
+    order = sorted(range(len(face_ids)), key=lambda i: (owner_ids[i], int(face_ids[i])))
+    face_ids = np.asarray(face_ids, dtype="<i4")[order]
+    matrix = np.ascontiguousarray(np.asarray(matrix, dtype="<f4")[order]) if len(order) else \
+        np.empty((0, matrix.shape[1] if matrix.ndim == 2 else 128), dtype="<f4")
+    owner_ids = [owner_ids[i] for i in order]
+
+    owners = []
+    for i, owner in enumerate(owner_ids):
+        if owners and owners[-1][0] == owner:
+            owners[-1][2] += 1
+        else:
+            owners.append([owner, i, 1])
+    owners_bytes = json.dumps(owners, separators=(",", ":")).encode("utf-8")
+
+    ids_offset = _align(HEADER.size)
+    matrix_offset = _align(ids_offset + face_ids.nbytes)
+    owners_offset = matrix_offset + matrix.nbytes
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, matrix.shape[1], len(owners), len(face_ids), version,
+                            ids_offset, matrix_offset, owners_offset, len(owners_bytes)))
+        f.seek(ids_offset)
+        f.write(face_ids.tobytes())
+        f.seek(matrix_offset)
+        f.write(matrix.tobytes())
+        f.write(owners_bytes)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def encode_log_record(op: int, owner_id: str, face_id: int, version: int = 0, vector=None) -> bytes:
+    owner = owner_id.encode("utf-8")
+    payload = np.asarray(vector, dtype="<f4").tobytes() if vector is not None else b""
+    return LOG_RECORD.pack(LOG_RECORD.size + len(owner) + len(payload), op, len(owner), version, face_id) + owner + payload
+
+
+def decode_log(data: bytes):
+    """
+    Parse log bytes into (op, owner_id, face_id, version, vector) tuples
+    Returns (records, bytes consumed) - a torn record at the tail is left for the next read
+    """
+    records, offset = [], 0
+    while offset + LOG_RECORD.size <= len(data):
+        length, op, owner_length, version, face_id = LOG_RECORD.unpack_from(data, offset)
+        if length < LOG_RECORD.size or offset + length > len(data):
+            break
+        owner_end = offset + LOG_RECORD.size + owner_length
+        owner_id = data[offset + LOG_RECORD.size:owner_end].decode("utf-8")
+        vector = np.frombuffer(data[owner_end:offset + length], dtype="<f4") if op == OP_UPSERT else None
+        records.append((op, owner_id, face_id, version, vector))
+        offset += length
+    return records, offset
+
+
+class SnapshotDirectory:
+    """File layout and locking of one snapshot directory"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def snapshot_path(self, generation: int) -> str:
+        return self.path(f"snapshot-{generation:08d}.bin")
+
+    def log_path(self, generation: int) -> str:
+        return self.path(f"delta-{generation:08d}.log")
+
+    @contextmanager
+    def lock(self, name: str = ".lock", exclusive: bool = True, blocking: bool = True):
+        """
+        flock on a lock file; yields False if non-blocking and busy
+        Appends take `.lock` shared, swapping generations takes it exclusive
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(self.path(name), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            flags = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if blocking else fcntl.LOCK_NB)
+            try:
+                fcntl.flock(fd, flags)
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+        finally:
+            os.close(fd)
+
+    def current_generation(self) -> Optional[int]:
+        try:
+            with open(self.path("CURRENT")) as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def set_current_generation(self, generation: int):
+        tmp_path = self.path("CURRENT.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(str(generation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path("CURRENT"))
+
+    def read_log(self, generation: int, offset: int = 0) -> bytes:
+        try:
+            with open(self.log_path(generation), "rb") as f:
+                f.seek(offset)
+                return f.read()
+        except FileNotFoundError:
+            return b""
+
+    def append(self, record: bytes) -> bool:
+        """Append one record to the live generation's log; False if there is no snapshot yet"""
+        with self.lock(exclusive=False):
+            generation = self.current_generation()
+            if generation is None:
+                return False
+            # One O_APPEND write per record keeps concurrent appends from interleaving
+            fd = os.open(self.log_path(generation), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, record)
+            finally:
+                os.close(fd)
+            return True
+
+    def publish(self, generation: int, face_ids, owner_ids, matrix, version: int, carry_from: Tuple[int, int] = None):
+        """
+        Make a new generation live
+        carry_from=(old generation, offset): log records appended to the old
+        generation after offset were not folded in and move to the new log
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        write_snapshot(self.snapshot_path(generation), face_ids, owner_ids, matrix, version)
+
+        with self.lock(exclusive=True):
+            tail = self.read_log(*carry_from) if carry_from else b""
+            with open(self.log_path(generation), "wb") as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            self.set_current_generation(generation)
+
+        # Workers that still map the old files keep them until they reload
+        live = {os.path.basename(self.snapshot_path(generation)), os.path.basename(self.log_path(generation))}
+        for name in os.listdir(self.directory):
+            if name.startswith(("snapshot-", "delta-")) and name not in live:
+                try:
+                    os.remove(self.path(name))
+                except FileNotFoundError:
+                    pass
+
+
+def _apply_records(face_ids: np.ndarray, owner_ids: List[str], matrix: np.ndarray, records) -> Tuple:
+    """Fold log records into full arrays (later records win)"""
+    latest: Dict[int, Tuple] = {}
+    for op, owner_id, face_id, version, vector in records:
+        latest[face_id] = (op, owner_id, vector)
+
+    keep = ~np.isin(face_ids, np.fromiter(latest, dtype=np.int64, count=len(latest)))
+    upserts = [(face_id, owner_id, vector) for face_id, (op, owner_id, vector) in latest.items() if op == OP_UPSERT]
+
+    new_ids = np.concatenate([face_ids[keep], np.array([u[0] for u in upserts], dtype=np.int64)])
+    new_owners = [o for o, k in zip(owner_ids, keep) if k] + [u[1] for u in upserts]
+    new_matrix = np.vstack([matrix[keep]] + [u[2][None, :] for u in upserts]) if upserts else matrix[keep]
+    return new_ids, new_owners, new_matrix
+
+
+def compact(directory: str = None) -> Optional[Dict]:
+    """
+    Fold the delta log into a new snapshot generation (no database access)
+    Returns None when another process is already compacting or there is nothing to fold
+    """
+    store = SnapshotDirectory(directory or config.GALLERY_SNAPSHOT_DIR)
+    with store.lock(".compact.lock", blocking=False) as acquired:
+        if not acquired:
+            return None
+
+        generation = store.current_generation()
+        if generation is None:
+            return None
+
+        log = store.read_log(generation)
+        records, consumed = decode_log(log)
+        if not records:
+            return None
+
+        snapshot = Snapshot(store.snapshot_path(generation), generation)
+        owner_ids = [None] * snapshot.count
+        for owner, (start, count) in snapshot.owners.items():
+            owner_ids[start:start + count] = [owner] * count
+
+        face_ids, owner_ids, matrix = _apply_records(
+            snapshot.face_ids.astype(np.int64), owner_ids, np.asarray(snapshot.matrix), records
+        )
+        version = max([snapshot.version] + [r[3] for r in records])
+        store.publish(generation + 1, face_ids, owner_ids, matrix, version, carry_from=(generation, consumed))
+
+        print(f"✅ Compacted gallery snapshot to generation {generation + 1}: "
+              f"{len(face_ids)} encodings, {len(records)} log records folded")
+        return {"generation": generation + 1, "encodings": len(face_ids), "records_folded": len(records)}
+
+
+def rebuild(directory: str = None) -> Dict:
+    """Write a fresh generation from Postgres, keeping log records appended meanwhile"""
+    from services.database import iter_face_encoding_batches, get_gallery_version
+
+    store = SnapshotDirectory(directory or config.GALLERY_SNAPSHOT_DIR)
+    with store.lock(".compact.lock"):
+        generation = store.current_generation()
+        # Anything appended from here on may postdate the rows we are about to read
+        carry_from = (generation, len(store.read_log(generation))) if generation is not None else None
+
+        version = get_gallery_version()
+        face_ids, owner_ids, matrices = [], [], []
+        for batch_ids, batch_matrix, _, batch_owners in iter_face_encoding_batches():
+            face_ids.append(batch_ids)
+            matrices.append(batch_matrix)
+            owner_ids.extend(batch_owners)
+
+        face_ids = np.concatenate(face_ids) if face_ids else np.empty(0, dtype=np.int64)
+        matrix = np.vstack(matrices) if matrices else np.empty((0, 128), dtype=np.float32)
+
+        new_generation = (generation or 0) + 1
+        store.publish(new_generation, face_ids, owner_ids, matrix, version, carry_from)
+
+    print(f"✅ Rebuilt gallery snapshot generation {new_generation} from Postgres: {len(face_ids)} encodings")
+    return {"generation": new_generation, "encodings": len(face_ids), "version": version}
+
+
+class InMemoryGallery:
+    """
+    This worker's view of the gallery: the mapped snapshot plus an overlay
+    built from the delta log, refreshed before every search
+    """
+
+    def __init__(self, directory: str):
+        self.store = SnapshotDirectory(directory)
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Snapshot] = None
+        self._log_offset = 0
+        self._overrides: Dict[int, Tuple[str, np.ndarray]] = {}
+        self._removed = np.empty(0, dtype=np.int64)  # snapshot rows masked by the log
+        self._overlay_cache: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def load(self):
+        """Map the live generation, building one from Postgres if none exists"""
+        if self.store.current_generation() is None:
+            rebuild(self.store.directory)
+        with self._lock:
+            self._refresh()
+        print(f"✅ Mapped gallery snapshot generation {self._snapshot.generation}: "
+              f"{self._snapshot.count} encodings + {len(self._overrides)} from the delta log")
+
+    def _reset(self, generation: int):
+        for _ in range(3):
+            try:
+                self._snapshot = Snapshot(self.store.snapshot_path(generation), generation)
+                break
+            except FileNotFoundError:
+                # Compacted away between reading CURRENT and opening it
+                generation = self.store.current_generation()
+        else:
+            raise RuntimeError("Gallery snapshot kept changing while loading")
+        self._log_offset = 0
+        self._overrides = {}
+        self._removed = np.empty(0, dtype=np.int64)
+        self._overlay_cache = {}
+
+    def _refresh(self):
+        generation = self.store.current_generation()
+        if generation is None:
+            raise RuntimeError("No gallery snapshot; run `python -m services.gallery_snapshot --rebuild`")
+        if self._snapshot is None or generation != self._snapshot.generation:
+            self._reset(generation)
+
+        records, consumed = decode_log(self.store.read_log(generation, self._log_offset))
+        if not records:
+            return
+        self._log_offset += consumed
+
+        removed = set(self._removed.tolist())
+        for op, owner_id, face_id, _, vector in records:
+            removed.add(face_id)
+            if op == OP_UPSERT:
+                self._overrides[face_id] = (owner_id, vector)
+            else:
+                previous = self._overrides.pop(face_id, None)
+                owner_id = previous[0] if previous else owner_id
+            self._overlay_cache.pop(owner_id, None)
+        self._removed = np.fromiter(removed, dtype=np.int64, count=len(removed))
+
+    def _overlay(self, owner_id: str):
+        if owner_id not in self._overlay_cache:
+            rows = [(face_id, vector) for face_id, (owner, vector) in self._overrides.items() if owner == owner_id]
+            self._overlay_cache[owner_id] = (
+                np.array([r[0] for r in rows], dtype=np.int64),
+                np.vstack([r[1] for r in rows]) if rows else np.empty((0, self._snapshot.dim), dtype=np.float32)
+            )
+        return self._overlay_cache[owner_id]
+
+    def search(self, owner_id: str, query: np.ndarray, threshold: float):
+        """
+        Nearest encoding of one owner by L2 distance
+        Returns (face_id, distance) if under threshold, (None, distance) if not, (None, None) if empty
+        """
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            self._refresh()
+            face_ids, rows = self._snapshot.owner_rows(owner_id)
+            extra_ids, extra_rows = self._overlay(owner_id)
+            removed = self._removed
+
+        distances = np.linalg.norm(rows - query, axis=1) if len(rows) else np.empty(0, dtype=np.float32)
+        if len(removed) and len(distances):
+            distances[np.isin(face_ids, removed)] = np.inf
+        if len(extra_ids):
+            face_ids = np.concatenate([face_ids, extra_ids])
+            distances = np.concatenate([distances, np.linalg.norm(extra_rows - query, axis=1)])
+
+        if not len(distances) or not np.isfinite(distances.min()):
+            return None, None
+
+        best = int(np.argmin(distances))
+        distance = float(distances[best])
+        return (int(face_ids[best]), distance) if distance < threshold else (None, distance)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            snapshot = self._snapshot
+            return {
+                "generation": snapshot.generation if snapshot else None,
+                "snapshot_encodings": snapshot.count if snapshot else 0,
+                "snapshot_version": snapshot.version if snapshot else None,
+                "log_records": len(self._overrides),
+                "log_bytes": self._log_offset
+            }
+
+
+# One view per worker process, loaded in the app lifespan when enabled
+gallery = InMemoryGallery(config.GALLERY_SNAPSHOT_DIR)
+
+
+def append_upsert(owner_id: str, face_id: int, vector, version: int = 0):
+    """Log a stored encoding for the other workers (best effort; a rebuild repairs misses)"""
+    try:
+        gallery.store.append(encode_log_record(OP_UPSERT, owner_id, face_id, version, vector))
+    except OSError as e:
+        print(f"❌ Failed to append to gallery delta log: {e}")
+
+
+def append_delete(owner_id: str, face_id: int, version: int = 0):
+    try:
+        gallery.store.append(encode_log_record(OP_DELETE, owner_id, face_id, version))
+    except OSError as e:
+        print(f"❌ Failed to append to gallery delta log: {e}")
+
+
+def compact_if_needed():
+    """Periodic job: compact once the live log has grown past GALLERY_COMPACT_LOG_BYTES"""
+    store = gallery.store
+    generation = store.current_generation()
+    if generation is None:
+        return None
+    try:
+        size = os.path.getsize(store.log_path(generation))
+    except FileNotFoundError:
+        return None
+    if size >= config.GALLERY_COMPACT_LOG_BYTES:
+        return compact(store.directory)
+    return None
+
+
+# For command-line runs
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build or compact the memory-mapped gallery snapshot')
+    parser.add_argument('--dir', default=config.GALLERY_SNAPSHOT_DIR, help='Snapshot directory')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--rebuild', action='store_true', help='Write a new generation from Postgres')
+    group.add_argument('--compact', action='store_true', help='Fold the delta log into a new generation')
+    args = parser.parse_args()
+
+    result = rebuild(args.dir) if args.rebuild else compact(args.dir)
+    print(json.dumps(result, indent=2) if result else "Nothing to compact")
@@ -0,0 +1,68 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Callable, Iterator, Tuple
+
+# Set in the parent right before the pool forks so workers inherit them without pickling
+_matrix: np.ndarray = None
+_context: Any = None
+
+
+def distance_block(matrix: np.ndarray, i0: int, j0: int, block_size: int) -> np.ndarray:
+    """
+    L2 distances between rows [i0, i0+block) and [j0, j0+block) of a matrix of unit vectors
+    One BLAS matmul per block: |a - b|^2 = 2 - 2 a.b for normalized a, b
+    """
+    a = matrix[i0:i0 + block_size]
+    b = matrix[j0:j0 + block_size]
+    distances = a @ b.T
+    distances *= -2
+    distances += 2
+    np.maximum(distances, 0, out=distances)
+    return np.sqrt(distances, out=distances)
+
+
+def pair_mask(i0: int, j0: int, shape: Tuple[int, int]) -> np.ndarray:
+    """Pairs of a block that belong to the upper triangle (each unordered pair counted once)"""
+    if i0 != j0:
+        return np.ones(shape, dtype=bool)
+    return np.triu(np.ones(shape, dtype=bool), k=1)
+
+
+def _run_block(task):
+    i0, j0, block_size, block_fn = task
+    distances = distance_block(_matrix, i0, j0, block_size)
+    return block_fn(i0, j0, distances, _context)
+
+
+def map_distance_blocks(matrix: np.ndarray, block_fn: Callable, context: Any = None,
+                        block_size: int = 2048, workers: int = None) -> Iterator:
+    """
+    Apply block_fn(i0, j0, distances, context) to every upper-triangular block
+    of the all-pairs distance matrix without ever materializing it
+
+    Blocks are spread over a fork-based process pool (one per core by default).
+    block_fn must be a module-level function and should return something small,
+    e.g. a histogram or a list of close pairs.
+    """
+    global _matrix, _context
+
+    n = len(matrix)
+    tasks = [
+        (i0, j0, block_size, block_fn)
+        for i0 in range(0, n, block_size)
+        for j0 in range(i0, n, block_size)
+    ]
+
+    _matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    _context = context
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        yield from map(_run_block, tasks)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("fork")) as pool:
+        yield from pool.map(_run_block, tasks, chunksize=max(1, len(tasks) // (workers * 8)))
+
@@ -0,0 +1,269 @@
+import select
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+from config import config
+
+NOTIFY_CHANNEL = "person_cache"
+"""Postgres channel used to broadcast invalidations to every worker process"""
+
+_PROCESS_TOKEN = uuid.uuid4().hex[:12]
+"""Tags our own notifications so the listener doesn't undo local write-throughs"""
+
+
+def normalize_name(name: str) -> str:
+    """Case- and whitespace-insensitive form of a name used as a cache key"""
+    return " ".join(name.casefold().split())
+
+
+class PersonCache:
+    """
+    Bounded LRU cache of serialized person profiles for name lookups
+
+    Keys are ('name', owner_id, normalized_name). Recognition doesn't read it:
+    recognize_face fetches the profile in the same statement as the match.
+    Every key of a person is dropped or rewritten together, indexed by the person id.
+    """
+
+    # Recent per-person changes remembered for racing fills; older ones are summarized
+    MAX_TRACKED_CHANGES = 4096
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._keys_by_person: Dict[int, set] = {}
+        self._lock = threading.Lock()
+
+        # A read that raced a write must not be cached. Every change takes the next
+        # sequence number; a fill started at `generation` is dropped only if its
+        # person (or every name lookup) changed since, not on unrelated changes.
+        self.generation = 0
+        self._person_changed: "OrderedDict[int, int]" = OrderedDict()
+        self._names_changed = 0
+        self._forgotten_through = 0  # newest change no longer in _person_changed
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        with self._lock:
+            profile = self._entries.get(key)
+            if profile is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return profile
+
+    def _changed_since(self, person_id: int, generation: int) -> bool:
+        if self._names_changed > generation or self._forgotten_through > generation:
+            return True
+        return self._person_changed.get(person_id, 0) > generation
+
+    def _mark_changed(self, person_id: int = None):
+        self.generation += 1
+        if person_id is None:
+            self._names_changed = self.generation
+            return
+        self._person_changed[person_id] = self.generation
+        self._person_changed.move_to_end(person_id)
+        while len(self._person_changed) > self.MAX_TRACKED_CHANGES:
+            _, changed = self._person_changed.popitem(last=False)
+            self._forgotten_through = max(self._forgotten_through, changed)
+
+    def put(self, key: Hashable, profile: Dict, generation: int):
+        """Cache a profile read from the database when the cache was at `generation`"""
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            if self._changed_since(profile['id'], generation):
+                return
+
+            self._entries[key] = profile
+            self._entries.move_to_end(key)
+            self._keys_by_person.setdefault(profile['id'], set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                old_key, old_profile = self._entries.popitem(last=False)
+                self._forget_key(old_profile['id'], old_key)
+                self.evictions += 1
+
+    def _forget_key(self, person_id: int, key: Hashable):
+        keys = self._keys_by_person.get(person_id)
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_person[person_id]
+
+    def update_person(self, profile: Dict):
+        """Write-through: replace every cached entry of a person with a fresh profile"""
+        with self._lock:
+            self._mark_changed(profile['id'])
+            for key in self._keys_by_person.get(profile['id'], set()):
+                self._entries[key] = profile
+
+    def invalidate_person(self, person_id: int):
+        with self._lock:
+            self._mark_changed(person_id)
+            self.invalidations += 1
+            for key in self._keys_by_person.pop(person_id, set()):
+                self._entries.pop(key, None)
+
+    def invalidate_names(self):
+        """Drop every name lookup (a new or renamed person can change which row matches)"""
+        with self._lock:
+            self._mark_changed()
+            self.invalidations += 1
+            self._entries.clear()
+            self._keys_by_person.clear()
+
+    def clear(self):
+        with self._lock:
+            self._mark_changed()
+            self.invalidations += 1
+            self._entries.clear()
+            self._keys_by_person.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+person_cache = PersonCache(config.PERSON_CACHE_SIZE)
+
+_new_person_callbacks: List[Callable[[], None]] = []
+
+
+def on_new_person(callback: Callable[[], None]):
+    """
+    Run callback when another worker may have added a person, or when the
+    listener may have missed invalidations (other per-worker caches hook in here)
+    """
+    _new_person_callbacks.append(callback)
+
+
+def _notify_new_person():
+    for callback in _new_person_callbacks:
+        callback()
+
+
+def apply_invalidation(message: str):
+    """Apply an invalidation message '<process token>:<person id | names | *>'"""
+    token, _, payload = message.partition(":")
+    if token == _PROCESS_TOKEN:
+        return
+
+    if payload == "*":
+        person_cache.clear()
+        _notify_new_person()
+    elif payload == "names":
+        person_cache.invalidate_names()
+        _notify_new_person()
+    else:
+        person_cache.invalidate_person(int(payload))
+
+
+def invalidation_message(payload: str) -> str:
+    """NOTIFY payload for an invalidation sent by this process"""
+    return f"{_PROCESS_TOKEN}:{payload}"
+
+
+def notify_invalidation(session, payload: str):
+    """
+    Queue a cross-worker invalidation on the session's transaction
+    Postgres only delivers it if the transaction commits
+    """
+    session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": NOTIFY_CHANNEL, "payload": invalidation_message(payload)})
+
+
+# ==================== LISTEN/NOTIFY LISTENER ====================
+
+_stop_event = threading.Event()
+_listener: Optional[threading.Thread] = None
+_listening = threading.Event()
+
+
+def invalidations_listening() -> bool:
+    """True while the listener holds a LISTEN connection (invalidations from other workers arrive)"""
+    return _listening.is_set()
+
+
+def _listen_loop():
+    # Dedicated connection outside the pool, held for the life of the listener
+    listen_engine = create_engine(config.DATABASE_URL, poolclass=NullPool)
+
+    while not _stop_event.is_set():
+        connection = None
+        try:
+            connection = listen_engine.raw_connection()
+            dbapi_connection = connection.driver_connection
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+
+            # Anything may have changed while we weren't listening
+            person_cache.clear()
+            _notify_new_person()
+            _listening.set()
+
+            while not _stop_event.is_set():
+                if select.select([dbapi_connection], [], [], 1.0) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    apply_invalidation(dbapi_connection.notifies.pop(0).payload)
+
+        except Exception as e:
+            _listening.clear()
+            print(f"❌ Person cache listener error: {e}")
+            person_cache.clear()
+            _notify_new_person()
+            _stop_event.wait(5)
+        finally:
+            _listening.clear()
+            if connection is not None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+
+def start_invalidation_listener():
+    """Start the LISTEN thread that applies invalidations from other workers"""
+    global _listener
+
+    if _listener or not config.PERSON_CACHE_LISTEN:
+        return
+    # The stranger gallery relies on it too (see on_new_person)
+    if config.PERSON_CACHE_SIZE <= 0 and config.STRANGER_GALLERY_SIZE <= 0:
+        return
+
+    _stop_event.clear()
+    _listener = threading.Thread(target=_listen_loop, name="person-cache-listener", daemon=True)
+    _listener.start()
+    print("✅ Person cache invalidation listener started")
+
+
+def stop_invalidation_listener(timeout: float = 5.0):
+    global _listener
+
+    _stop_event.set()
+    if _listener:
+        _listener.join(timeout)
+        _listener = None
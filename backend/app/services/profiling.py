@@ -0,0 +1,251 @@
+import gc
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, Optional
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler over every thread of the process
+
+    A background thread reads sys._current_frames() every `interval` seconds
+    and counts the stacks in folded format ("a;b;c count"), which flamegraph.pl,
+    speedscope and inferno read directly. Nothing is hooked into the
+    interpreter, so requests run at full speed between samples.
+    """
+
+    def __init__(self, interval: float = 0.005, max_requests: Optional[int] = None):
+        self.interval = interval
+        self.max_requests = max_requests
+        self.requests_seen = 0
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def wait(self, timeout: float) -> bool:
+        """Block until the profile stops on its own (True) or the timeout passes (False)"""
+        return self._stop.wait(timeout)
+
+    def request_finished(self):
+        self.requests_seen += 1
+        if self.max_requests and self.requests_seen >= self.max_requests:
+            self._stop.set()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                self._stacks[_fold(names.get(thread_id, str(thread_id)), frame)] += 1
+            self.samples += 1
+        self.stopped_at = time.monotonic()
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common()) + "\n"
+
+    def summary(self) -> Dict:
+        end = self.stopped_at or time.monotonic()
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "duration_s": round(end - self.started_at, 3) if self.started_at else 0,
+            "requests": self.requests_seen,
+            "distinct_stacks": len(self._stacks)
+        }
+
+
+def _fold(thread_name: str, frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    stack.append(thread_name.replace(";", "_").replace(" ", "_"))
+    return ";".join(reversed(stack))
+
+
+# Only one profile runs at a time
+_active: Optional[SamplingProfiler] = None
+_active_lock = threading.Lock()
+
+
+def start_profile(interval: float, max_requests: Optional[int] = None) -> SamplingProfiler:
+    global _active
+    with _active_lock:
+        if _active is not None:
+            raise ProfilerBusyError("A profile is already running")
+        _active = SamplingProfiler(interval, max_requests)
+        _active.start()
+        return _active
+
+
+def finish_profile(profiler: SamplingProfiler):
+    global _active
+    profiler.stop()
+    with _active_lock:
+        if _active is profiler:
+            _active = None
+
+
+def record_request():
+    """Called after every non-admin request while the profiling surface is mounted"""
+    profiler = _active
+    if profiler is not None:
+        profiler.request_finished()
+
+
+class RequestCounterMiddleware:
+    """Plain ASGI middleware so 'profile the next N requests' knows when N requests are done"""
+
+    def __init__(self, app, exclude_prefix: str = "/api/admin"):
+        self.app = app
+        self.exclude_prefix = exclude_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _active is None or scope["path"].startswith(self.exclude_prefix):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            record_request()
+
+
+# ==================== TRACEMALLOC ====================
+
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+def start_tracemalloc(frames: int = 25):
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    _last_snapshot = tracemalloc.take_snapshot()
+
+
+def stop_tracemalloc():
+    global _last_snapshot
+    tracemalloc.stop()
+    _last_snapshot = None
+
+
+def tracemalloc_diff(limit: int = 25, group_by: str = "lineno") -> Dict:
+    """
+    Allocation growth since tracing started or since the previous call
+    Sorted by size growth, so buffers that keep accumulating float to the top
+    """
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not running")
+
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>")
+    ])
+    stats = snapshot.compare_to(_last_snapshot, group_by) if _last_snapshot else snapshot.statistics(group_by)
+    _last_snapshot = snapshot
+
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "traced_current_bytes": current,
+        "traced_peak_bytes": peak,
+        "top": [_stat_to_dict(stat) for stat in stats[:limit]]
+    }
+
+
+def _stat_to_dict(stat) -> Dict:
+    return {
+        "size_bytes": stat.size,
+        "size_diff_bytes": getattr(stat, "size_diff", stat.size),
+        "count": stat.count,
+        "count_diff": getattr(stat, "count_diff", stat.count),
+        "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+    }
+
+
+# ==================== MEMORY REPORT ====================
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def _tensorflow_memory() -> Optional[Dict]:
+    # Never import TensorFlow just to report on it
+    tf = sys.modules.get("tensorflow")
+    if tf is None:
+        return None
+
+    report = {"version": tf.__version__, "devices": {}, "models": {}}
+    for device in tf.config.list_logical_devices():
+        try:
+            info = tf.config.experimental.get_memory_info(device.name)
+            report["devices"][device.name] = {"current_bytes": info["current"], "peak_bytes": info["peak"]}
+        except (ValueError, RuntimeError):
+            # CPU allocations aren't tracked by TensorFlow
+            report["devices"][device.name] = None
+
+    deepface_modeling = sys.modules.get("deepface.modules.modeling")
+    for task, models in (getattr(deepface_modeling, "cached_models", None) or {}).items():
+        for name, model in models.items():
+            keras_model = getattr(model, "model", None)
+            if keras_model is not None and hasattr(keras_model, "count_params"):
+                report["models"][f"{task}/{name}"] = {"weight_bytes": int(keras_model.count_params()) * 4}
+
+    return report
+
+
+def _onnx_memory() -> Optional[Dict]:
+    ort = sys.modules.get("onnxruntime")
+    if ort is None:
+        return None
+    # ONNX Runtime doesn't expose per-session arena usage; report what is available
+    return {"version": ort.__version__, "providers": ort.get_available_providers()}
+
+
+def memory_report() -> Dict:
+    """Process, Python heap and ML runtime memory of this worker"""
+    report = {
+        "pid": os.getpid(),
+        "rss_bytes": _rss_bytes(),
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "gc_objects": len(gc.get_objects()),
+        "gc_counts": gc.get_count(),
+        "threads": threading.active_count(),
+        "tracemalloc": None,
+        "tensorflow": _tensorflow_memory(),
+        "onnxruntime": _onnx_memory()
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        report["tracemalloc"] = {"current_bytes": current, "peak_bytes": peak}
+    return report
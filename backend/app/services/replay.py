@@ -0,0 +1,249 @@
+"""
+Deterministic replay of a capture corpus against a running build
+
+Re-sends every captured request (see services.capture) at its original pacing,
+a multiple of it, or as fast as possible, and records status, latency,
+per-stage Server-Timing and the match decision of each one. The run is then
+compared against a baseline - a previous run, or the responses recorded at
+capture time - for latency regressions and changed decisions/distances.
+
+For reproducible decisions run the baseline and the candidate against
+databases restored from the same snapshot (first-meeting replays enroll people).
+
+Usage:
+    cd backend/app
+    python -m services.replay captures --url http://localhost:8000 --output baseline.json
+    python -m services.replay captures --url http://localhost:8001 --speed 4 --baseline baseline.json
+"""
+import base64
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import numpy as np
+import requests
+from services.capture import CAPTURE_PATHS
+from services.timing import parse_server_timing
+
+ENDPOINT_PATHS = {endpoint: path for path, endpoint in CAPTURE_PATHS.items()}
+
+
+def load_corpus(capture_dir: str, endpoints: List[str] = None, limit: int = None) -> List[Dict]:
+    """Captured records in arrival order"""
+    records = []
+    with open(os.path.join(capture_dir, "manifest.jsonl")) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("image") and (not endpoints or record["endpoint"] in endpoints):
+                records.append(record)
+
+    records.sort(key=lambda r: r["timestamp"])
+    return records[:limit] if limit else records
+
+
+def decision(endpoint: str, status: Optional[int], body: Optional[Dict]) -> Dict:
+    """The part of a response that must not change between builds"""
+    body = body if isinstance(body, dict) else {}
+    detail = body.get("detail") if isinstance(body.get("detail"), dict) else {}
+    result = {"status": status, "reason": detail.get("reason")}
+
+    if endpoint == "recognize":
+        result["recognized"] = body.get("recognized")
+        result["name"] = (body.get("person") or {}).get("name")
+        result["distance"] = body.get("distance")
+    else:
+        result["success"] = body.get("success")
+    return result
+
+
+def replay_record(base_url: str, capture_dir: str, record: Dict, timeout: float) -> Dict:
+    with open(os.path.join(capture_dir, record["image"]), "rb") as f:
+        image_bytes = f.read()
+
+    headers = {"X-Replay": "1"}
+    if record.get("owner_id"):
+        headers["X-Owner-Id"] = record["owner_id"]
+    form = {**record.get("fields", {}), "image_data": base64.b64encode(image_bytes).decode("ascii")}
+
+    started = time.perf_counter()
+    try:
+        response = requests.post(base_url + ENDPOINT_PATHS[record["endpoint"]], data=form, headers=headers, timeout=timeout)
+        status = response.status_code
+        stages = parse_server_timing(response.headers.get("Server-Timing"))
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+    except requests.RequestException as e:
+        status, stages, body = None, {}, {"error": str(e)}
+
+    return {
+        "id": record["id"],
+        "endpoint": record["endpoint"],
+        "status": status,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "stages": stages,
+        "decision": decision(record["endpoint"], status, body)
+    }
+
+
+def replay(capture_dir: str, base_url: str, speed: float = 1.0, concurrency: int = 8,
+           endpoints: List[str] = None, limit: int = None, timeout: float = 60) -> Dict:
+    """
+    Re-drive the corpus; speed=1 keeps the original inter-arrival times,
+    speed=4 plays it four times faster, speed=0 sends as fast as concurrency allows
+    """
+    records = load_corpus(capture_dir, endpoints, limit)
+    if not records:
+        raise ValueError(f"No replayable records in {capture_dir}")
+
+    first = records[0]["timestamp"]
+    started = time.monotonic()
+    base_url = base_url.rstrip("/")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        for record in records:
+            if speed > 0:
+                delay = (record["timestamp"] - first) / speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(pool.submit(replay_record, base_url, capture_dir, record, timeout))
+        results = [future.result() for future in futures]
+
+    return {
+        "target": base_url,
+        "speed": speed,
+        "concurrency": concurrency,
+        "wall_time_s": round(time.monotonic() - started, 3),
+        "results": results,
+        "summary": summarize(results)
+    }
+
+
+def baseline_from_corpus(capture_dir: str) -> Dict:
+    """Treat what the server answered at capture time as the baseline run"""
+    results = [{
+        "id": record["id"],
+        "endpoint": record["endpoint"],
+        "status": record["status"],
+        "latency_ms": record["duration_ms"],
+        "stages": record.get("stages", {}),
+        "decision": decision(record["endpoint"], record["status"], record.get("response"))
+    } for record in load_corpus(capture_dir)]
+    return {"target": "capture", "results": results, "summary": summarize(results)}
+
+
+def _percentiles(values: List[float]) -> Dict:
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"count": len(values), "p50": round(float(p50), 1), "p95": round(float(p95), 1), "p99": round(float(p99), 1)}
+
+
+def summarize(results: List[Dict]) -> Dict:
+    """Latency percentiles per endpoint and per stage"""
+    summary = {}
+    for endpoint in sorted({r["endpoint"] for r in results}):
+        endpoint_results = [r for r in results if r["endpoint"] == endpoint]
+        stage_names = sorted({name for r in endpoint_results for name in r["stages"]})
+        summary[endpoint] = {
+            "requests": len(endpoint_results),
+            "errors": sum(1 for r in endpoint_results if r["status"] is None or r["status"] >= 500),
+            "latency_ms": _percentiles([r["latency_ms"] for r in endpoint_results]),
+            "stages_ms": {
+                name: _percentiles([r["stages"][name] for r in endpoint_results if name in r["stages"]])
+                for name in stage_names
+            }
+        }
+    return summary
+
+
+def compare(run: Dict, baseline: Dict, max_latency_regression: float = 0.2,
+            distance_tolerance: float = 0.02, min_latency_delta_ms: float = 5.0) -> Dict:
+    """
+    Latency regressions (p95 more than max_latency_regression and min_latency_delta_ms
+    slower) and decision changes (status, recognized, name, quality reason, distance drift)
+    """
+    regressions = []
+    for endpoint, candidate in run["summary"].items():
+        reference = baseline["summary"].get(endpoint)
+        if not reference:
+            continue
+        pairs = [("latency", reference["latency_ms"], candidate["latency_ms"])]
+        pairs += [(f"stage:{name}", reference["stages_ms"].get(name), stats)
+                  for name, stats in candidate["stages_ms"].items()]
+        for metric, before, after in pairs:
+            if (before and after and after["p95"] > before["p95"] * (1 + max_latency_regression)
+                    and after["p95"] - before["p95"] > min_latency_delta_ms):
+                regressions.append({
+                    "endpoint": endpoint,
+                    "metric": metric,
+                    "baseline_p95": before["p95"],
+                    "candidate_p95": after["p95"]
+                })
+
+    reference_decisions = {r["id"]: r["decision"] for r in baseline["results"]}
+    mismatches, drifts = [], []
+    for result in run["results"]:
+        before = reference_decisions.get(result["id"])
+        if before is None:
+            continue
+        after = result["decision"]
+        changed = [key for key in after if key != "distance" and after.get(key) != before.get(key)]
+        if changed:
+            mismatches.append({"id": result["id"], "fields": changed, "baseline": before, "candidate": after})
+        elif before.get("distance") is not None and after.get("distance") is not None:
+            drift = abs(after["distance"] - before["distance"])
+            if drift > distance_tolerance:
+                drifts.append({"id": result["id"], "baseline": before["distance"], "candidate": after["distance"]})
+
+    return {
+        "compared": sum(1 for r in run["results"] if r["id"] in reference_decisions),
+        "latency_regressions": regressions,
+        "decision_mismatches": mismatches,
+        "distance_drifts": drifts,
+        "passed": not (regressions or mismatches or drifts)
+    }
+
+
+# For command-line runs
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Replay a capture corpus and compare against a baseline')
+    parser.add_argument('corpus', help='Capture directory (CAPTURE_DIR)')
+    parser.add_argument('--url', default='http://localhost:8000', help='Base URL of the build under test')
+    parser.add_argument('--speed', type=float, default=1.0, help='Pacing multiplier (0 = no pacing)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Max requests in flight')
+    parser.add_argument('--endpoint', action='append', choices=sorted(ENDPOINT_PATHS), help='Only replay these endpoints')
+    parser.add_argument('--limit', type=int, help='Replay only the first N records')
+    parser.add_argument('--baseline', help='Previous run JSON (default: responses recorded at capture time)')
+    parser.add_argument('--max-latency-regression', type=float, default=0.2, help='Allowed p95 slowdown (0.2 = 20%%)')
+    parser.add_argument('--distance-tolerance', type=float, default=0.02, help='Allowed match distance drift')
+    parser.add_argument('--output', help='Write this run to a JSON file (usable as a later baseline)')
+    args = parser.parse_args()
+
+    run = replay(args.corpus, args.url, args.speed, args.concurrency, args.endpoint, args.limit)
+    print(f"✅ Replayed {len(run['results'])} requests in {run['wall_time_s']}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"✅ Wrote run to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    else:
+        baseline = baseline_from_corpus(args.corpus)
+
+    report = compare(run, baseline, args.max_latency_regression, args.distance_tolerance)
+    print(json.dumps({"summary": run["summary"], "comparison": report}, indent=2))
+
+    if not report["passed"]:
+        print("❌ Replay differs from baseline")
+        raise SystemExit(1)
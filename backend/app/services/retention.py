@@ -0,0 +1,225 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+from sqlalchemy import text
+from services.database import engine
+from config import config
+
+PARTITION_PREFIX = "photo_blobs_y"
+_PARTITION_NAME = re.compile(r"^photo_blobs_y(\d{4})m(\d{2})$")
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month.year:04d}m{month.month:02d}"
+
+
+# ==================== PARTITION MAINTENANCE ====================
+
+def ensure_photo_partitions(months_ahead: int = None):
+    """
+    Create monthly photo_blobs partitions from last month through months_ahead
+    New rows must never land in the default partition, otherwise it blocks
+    creating the partition for their month later on (see _move_out_of_default)
+    A month that can't be created is logged and retried on the next run
+    """
+    if months_ahead is None:
+        months_ahead = config.RETENTION_PARTITION_MONTHS_AHEAD
+
+    month = _month_start(date.today().replace(day=1) - timedelta(days=1))
+
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS photo_blobs_default PARTITION OF photo_blobs DEFAULT"
+        ))
+
+    for _ in range(months_ahead + 2):
+        try:
+            _ensure_month_partition(month)
+        except Exception as e:
+            print(f"❌ Could not create partition {_partition_name(month)}: {e}")
+        month = _next_month(month)
+
+
+def _ensure_month_partition(month: date):
+    name, end = _partition_name(month), _next_month(month)
+    bounds = {"start": month, "end": end}
+
+    with engine.begin() as connection:
+        # Every worker runs this at startup
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext('photo_blobs_partitions'))"))
+        if connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+            return
+
+        stranded = connection.execute(text(
+            "SELECT count(*) FROM photo_blobs_default WHERE created_at >= :start AND created_at < :end"
+        ), bounds).scalar()
+        if not stranded:
+            connection.execute(text(
+                f"CREATE TABLE {name} PARTITION OF photo_blobs "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+            return
+
+        _move_out_of_default(connection, name, month, end)
+        print(f"⚠️ Moved {stranded} photo(s) from photo_blobs_default into new partition {name}")
+
+
+def _move_out_of_default(connection, name: str, month: date, end: date):
+    """
+    Postgres refuses to create a partition whose range has rows in the default
+    partition, so: detach the default, create the month, move its rows, reattach
+    Holds an exclusive lock on photo_blobs until the caller commits
+    """
+    bounds = {"start": month, "end": end}
+    connection.execute(text("ALTER TABLE photo_blobs DETACH PARTITION photo_blobs_default"))
+    connection.execute(text(
+        f"CREATE TABLE {name} PARTITION OF photo_blobs "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    connection.execute(text(
+        f"INSERT INTO {name} (photo_id, created_at, image_data) "
+        "SELECT photo_id, created_at, image_data FROM photo_blobs_default "
+        "WHERE created_at >= :start AND created_at < :end"
+    ), bounds)
+    connection.execute(text(
+        "DELETE FROM photo_blobs_default WHERE created_at >= :start AND created_at < :end"
+    ), bounds)
+    connection.execute(text("ALTER TABLE photo_blobs ATTACH PARTITION photo_blobs_default DEFAULT"))
+
+
+def list_photo_partitions() -> List[Tuple[str, date, date, int]]:
+    """Monthly photo_blobs partitions as (name, start, end, size in bytes), oldest first"""
+    with engine.connect() as connection:
+        rows = connection.execute(text("""
+            SELECT c.relname, pg_total_relation_size(c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'photo_blobs'::regclass
+        """)).all()
+
+    partitions = []
+    for name, size in rows:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            start = date(int(match.group(1)), int(match.group(2)), 1)
+            partitions.append((name, start, _next_month(start), size))
+
+    return sorted(partitions, key=lambda p: p[1])
+
+
+# ==================== RETENTION POLICIES ====================
+
+def drop_expired_photo_partitions(days: int, dry_run: bool = False) -> Dict:
+    """
+    Drop raw-image partitions whose whole month is older than `days`
+    Photo rows, crops, encodings and profiles are kept - only image bytes go
+    """
+    cutoff = date.today() - timedelta(days=days)
+    dropped, reclaimed = [], 0
+
+    for name, start, end, size in list_photo_partitions():
+        if end > cutoff:
+            break
+
+        if not dry_run:
+            with engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE photo_blobs DETACH PARTITION {name}"))
+                connection.execute(text(f"DROP TABLE {name}"))
+            print(f"🗑️  Dropped partition {name} ({size / 1e6:.1f} MB)")
+
+        dropped.append(name)
+        reclaimed += size
+
+    # Rows that fell into the default partition are removed the slow way
+    cutoff_ts = datetime.combine(cutoff, datetime.min.time())
+    with engine.begin() as connection:
+        default_bytes = connection.execute(text(
+            "SELECT coalesce(sum(octet_length(image_data)), 0) FROM photo_blobs_default WHERE created_at < :cutoff"
+        ), {"cutoff": cutoff_ts}).scalar()
+        if not dry_run and default_bytes:
+            connection.execute(text("DELETE FROM photo_blobs_default WHERE created_at < :cutoff"),
+                               {"cutoff": cutoff_ts})
+
+    return {
+        "partitions_dropped": dropped,
+        "photo_bytes_reclaimed": int(reclaimed + default_bytes)
+    }
+
+
+def clear_expired_face_crops(days: int, dry_run: bool = False) -> Dict:
+    """Null out cropped face images older than `days`, in batches to keep locks short"""
+    cutoff = datetime.now() - timedelta(days=days)
+    cleared, reclaimed = 0, 0
+
+    if dry_run:
+        with engine.connect() as connection:
+            cleared, reclaimed = connection.execute(text("""
+                SELECT count(*), coalesce(sum(octet_length(face_image_data)), 0)
+                FROM detected_faces
+                WHERE created_at < :cutoff AND face_image_data IS NOT NULL
+            """), {"cutoff": cutoff}).one()
+        return {"crops_cleared": int(cleared), "crop_bytes_reclaimed": int(reclaimed)}
+
+    while True:
+        with engine.begin() as connection:
+            count, size = connection.execute(text("""
+                WITH batch AS (
+                    SELECT id, octet_length(face_image_data) AS bytes
+                    FROM detected_faces
+                    WHERE created_at < :cutoff AND face_image_data IS NOT NULL
+                    LIMIT :batch_size
+                    FOR UPDATE SKIP LOCKED
+                ), cleared AS (
+                    UPDATE detected_faces d SET face_image_data = NULL
+                    FROM batch WHERE d.id = batch.id
+                )
+                SELECT count(*), coalesce(sum(bytes), 0) FROM batch
+            """), {"cutoff": cutoff, "batch_size": config.RETENTION_BATCH_SIZE}).one()
+
+        cleared += count
+        reclaimed += size
+        if count < config.RETENTION_BATCH_SIZE:
+            break
+
+    return {"crops_cleared": int(cleared), "crop_bytes_reclaimed": int(reclaimed)}
+
+
+def run_retention(dry_run: bool = False) -> Dict:
+    """
+    Apply every configured retention policy and report what was reclaimed
+    A policy with 0 days is disabled
+    """
+    report = {"dry_run": dry_run}
+
+    if not dry_run:
+        ensure_photo_partitions()
+
+    if config.RETENTION_PHOTO_DAYS > 0:
+        report.update(drop_expired_photo_partitions(config.RETENTION_PHOTO_DAYS, dry_run))
+
+    if config.RETENTION_CROP_DAYS > 0:
+        report.update(clear_expired_face_crops(config.RETENTION_CROP_DAYS, dry_run))
+
+    report["bytes_reclaimed"] = report.get("photo_bytes_reclaimed", 0) + report.get("crop_bytes_reclaimed", 0)
+    print(f"✅ Retention {'dry run' if dry_run else 'run'}: {report['bytes_reclaimed'] / 1e6:.1f} MB reclaimed")
+    return report
+
+
+# For command-line runs (e.g. from cron)
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Apply photo/crop retention policies')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would be reclaimed')
+    args = parser.parse_args()
+
+    print(json.dumps(run_retention(dry_run=args.dry_run), indent=2))
@@ -0,0 +1,60 @@
+import threading
+from typing import Callable, List
+from sqlalchemy import text
+from services.database import engine
+
+_stop_event = threading.Event()
+_jobs: List[threading.Thread] = []
+
+
+def run_exclusive(lock_name: str, fn: Callable):
+    """
+    Run fn only if no other process holds the named Postgres advisory lock
+    Every worker schedules the same jobs; this keeps a single one running them
+    Returns fn's result, or None if the lock was busy
+    """
+    with engine.connect() as connection:
+        acquired = connection.execute(
+            text("SELECT pg_try_advisory_lock(hashtext(:name))"), {"name": lock_name}
+        ).scalar()
+        if not acquired:
+            return None
+
+        try:
+            return fn()
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), {"name": lock_name})
+
+
+def _periodic_loop(name: str, interval_seconds: float, fn: Callable, exclusive: bool):
+    while not _stop_event.wait(interval_seconds):
+        try:
+            if exclusive:
+                run_exclusive(f"visage:{name}", fn)
+            else:
+                fn()
+        except Exception as e:
+            print(f"❌ Scheduled job '{name}' failed: {e}")
+
+
+def start_periodic_job(name: str, interval_seconds: float, fn: Callable, exclusive: bool = True):
+    """
+    Run fn every interval_seconds in a daemon thread (first run after one interval)
+    exclusive=False runs it in every worker, for jobs that do their own (e.g. per-host) locking
+    """
+    if interval_seconds <= 0:
+        return
+
+    _stop_event.clear()
+    job = threading.Thread(target=_periodic_loop, args=(name, interval_seconds, fn, exclusive),
+                           name=f"periodic-{name}", daemon=True)
+    job.start()
+    _jobs.append(job)
+    print(f"✅ Scheduled '{name}' every {interval_seconds:g}s")
+
+
+def stop_periodic_jobs(timeout: float = 5.0):
+    _stop_event.set()
+    for job in _jobs:
+        job.join(timeout)
+    _jobs.clear()
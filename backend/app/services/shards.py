@@ -0,0 +1,382 @@
+"""
+Scatter-gather search over gallery shards
+
+With GALLERY_SHARD_URLS set, the searchable copy of face_encodings (and its
+HNSW indexes) lives on several Postgres nodes instead of the primary database:
+
+    routing     each encoding goes to the shard picked by a jump consistent hash
+                of its face id, so one owner's gallery is spread over every shard
+    writes      enrollments / identity merges upsert or delete on the
+                owning shard after the primary commits
+    search      every shard is queried concurrently under GALLERY_SHARD_TIMEOUT_MS
+                (connect, pool checkout and statement included) and the per-shard
+                top-k lists are merged; an answer missing some shards is flagged partial
+
+The primary keeps its face_encodings table as the system of record (dedup,
+calibration, exports and snapshot rebuilds read it), so `backfill` can always
+repair a shard from it. A shard write that fails after the primary committed is
+queued in shard_repairs and replayed by `repair` (a periodic job in the API).
+
+Adding a shard: append its URL to GALLERY_SHARD_URLS on every worker, restart,
+then run `init` and `rebalance`. Jump hashing moves only the ~1/n encodings
+whose shard changed; until they are moved a search may miss them on the new shard.
+
+Usage:
+    cd backend/app
+    python -m services.shards init        # create the schema on every shard
+    python -m services.vector_index       # build the per-owner indexes on every shard
+    python -m services.shards backfill    # copy every encoding from the primary
+    python -m services.shards rebalance   # move encodings to their current shard
+    python -m services.shards repair      # replay the queued failed writes
+    python -m services.shards status
+"""
+import hashlib
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Tuple
+import numpy as np
+from sqlalchemy import create_engine, select, delete, func, text
+from sqlalchemy.dialects.postgresql import insert
+from config import config
+from models.face_scan import ShardBase, ShardEncoding
+
+
+class ShardUnavailable(Exception):
+    """Raised when no gallery shard answered a search in time"""
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping & Veach): growing from n to n+1 buckets
+    moves only 1/(n+1) of the keys, all of them to the new bucket
+    """
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, j = -1, 0
+    while j < buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_key(face_id: int) -> int:
+    """Face ids are sequential; hash them so neighbours don't land together"""
+    return int.from_bytes(hashlib.blake2b(str(face_id).encode(), digest_size=8).digest(), "little")
+
+
+class GalleryShards:
+    """Engines, routing and fan-out search for the configured shards"""
+
+    def __init__(self, urls: List[str], timeout_ms: float):
+        self.urls = list(urls)
+        self.timeout_ms = timeout_ms
+        self.engines = [create_engine(url, pool_pre_ping=True, **self._engine_options(timeout_ms)) for url in self.urls]
+        self._pool = ThreadPoolExecutor(max_workers=4 * len(self.urls), thread_name_prefix="gallery-shard") \
+            if self.urls else None
+        self._lock = threading.Lock()
+        self._counters = [
+            {"searches": 0, "timeouts": 0, "errors": 0, "latency_ms": None}
+            for _ in self.urls
+        ]
+        self._partial_searches = 0
+
+    @staticmethod
+    def _engine_options(timeout_ms: float) -> Dict:
+        """Bound connecting and waiting for a pooled connection by the search timeout too"""
+        if timeout_ms <= 0:
+            return {}
+        return {
+            # libpq takes whole seconds
+            "connect_args": {"connect_timeout": max(1, math.ceil(timeout_ms / 1000))},
+            "pool_timeout": timeout_ms / 1000
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.urls)
+
+    def shard_for(self, face_id: int) -> int:
+        return jump_hash(shard_key(face_id), len(self.urls))
+
+    # Writes ----------------------------------------
+
+    def upsert(self, owner_id: str, face_id: int, vector):
+        """Store one normalized encoding on its shard"""
+        self._upsert_rows(self.shard_for(face_id), [{"face_id": face_id, "owner_id": owner_id, "encoding": list(vector)}])
+
+    def delete(self, face_ids: List[int]):
+        by_shard = defaultdict(list)
+        for face_id in face_ids:
+            by_shard[self.shard_for(face_id)].append(face_id)
+        for shard, ids in by_shard.items():
+            with self.engines[shard].begin() as connection:
+                connection.execute(delete(ShardEncoding).where(ShardEncoding.face_id.in_(ids)))
+
+    def _upsert_rows(self, shard: int, rows: List[Dict]):
+        if not rows:
+            return
+        statement = insert(ShardEncoding).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[ShardEncoding.face_id],
+            set_={"owner_id": statement.excluded.owner_id, "encoding": statement.excluded.encoding}
+        )
+        with self.engines[shard].begin() as connection:
+            connection.execute(statement)
+
+    # Search ----------------------------------------
+
+    def _search_shard(self, shard: int, owner_id: str, query: List[float], k: int):
+        started = time.monotonic()
+        with self.engines[shard].connect() as connection:
+            with connection.begin():
+                if self.timeout_ms > 0:
+                    # Stop the query server-side too, not just stop waiting for it
+                    connection.execute(text(f"SET LOCAL statement_timeout = {int(self.timeout_ms)}"))
+                distance = ShardEncoding.encoding.l2_distance(query).label("distance")
+                rows = connection.execute(
+                    select(ShardEncoding.face_id, distance)
+                    .where(ShardEncoding.owner_id == owner_id)
+                    .order_by(distance)
+                    .limit(k)
+                ).all()
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            counters = self._counters[shard]
+            counters["latency_ms"] = elapsed_ms if counters["latency_ms"] is None \
+                else 0.8 * counters["latency_ms"] + 0.2 * elapsed_ms
+        return [(row.face_id, float(row.distance)) for row in rows]
+
+    def search(self, owner_id: str, query, k: int = 1) -> Tuple[List[Tuple[int, float]], bool]:
+        """
+        Top-k (face_id, distance) of one owner across all shards, nearest first, and
+        whether the answer is partial: shards that fail or miss the timeout are left
+        out (their faces may be missing); raises ShardUnavailable if all do
+        """
+        query = np.asarray(query, dtype=np.float32).tolist()
+        futures = {
+            self._pool.submit(self._search_shard, shard, owner_id, query, k): shard
+            for shard in range(len(self.urls))
+        }
+        done, _ = wait(futures, timeout=self.timeout_ms / 1000 if self.timeout_ms > 0 else None)
+
+        candidates, answered = [], 0
+        with self._lock:
+            for future, shard in futures.items():
+                counters = self._counters[shard]
+                counters["searches"] += 1
+                if future not in done:
+                    counters["timeouts"] += 1
+                elif future.exception() is not None:
+                    counters["errors"] += 1
+                    print(f"❌ Gallery shard {shard} search failed: {future.exception()}")
+                else:
+                    answered += 1
+                    candidates.extend(future.result())
+
+            partial = answered < len(futures)
+            if partial and answered:
+                self._partial_searches += 1
+
+        if not answered:
+            raise ShardUnavailable("No gallery shard answered in time")
+
+        # An encoding being moved by a rebalance can briefly sit on two shards
+        nearest = {}
+        for face_id, distance in candidates:
+            if face_id not in nearest or distance < nearest[face_id]:
+                nearest[face_id] = distance
+        return heapq.nsmallest(k, nearest.items(), key=lambda item: item[1]), partial
+
+    def nearest(self, owner_id: str, query, threshold: float):
+        """
+        The gallery snapshot's search contract plus the partial flag
+        Returns (face_id, distance, partial) if under threshold, (None, distance, partial)
+        if not, (None, None, partial) if nothing was found
+        A miss with partial=True is not proof the face is unknown
+        """
+        matches, partial = self.search(owner_id, query, k=1)
+        if not matches:
+            return None, None, partial
+        face_id, distance = matches[0]
+        return (face_id, distance, partial) if distance < threshold else (None, distance, partial)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "timeout_ms": self.timeout_ms,
+                "partial_searches": self._partial_searches,
+                "shards": [
+                    {
+                        "url": engine.url.render_as_string(hide_password=True),
+                        **counters,
+                        "latency_ms": round(counters["latency_ms"], 1) if counters["latency_ms"] is not None else None
+                    }
+                    for engine, counters in zip(self.engines, self._counters)
+                ]
+            }
+
+    # Maintenance ----------------------------------------
+
+    def init(self):
+        """Create the pgvector extension and shard table on every shard"""
+        for engine in self.engines:
+            with engine.begin() as connection:
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            ShardBase.metadata.create_all(engine)
+
+    def backfill(self, batch_size: int = 5000) -> Dict:
+        """Upsert every encoding of the primary database onto its shard (idempotent)"""
+        from services.database import iter_face_encoding_batches
+
+        copied = [0] * len(self.urls)
+        for face_ids, encodings, _, owner_ids in iter_face_encoding_batches(batch_size):
+            by_shard = defaultdict(list)
+            for face_id, vector, owner_id in zip(face_ids.tolist(), encodings, owner_ids):
+                by_shard[self.shard_for(face_id)].append(
+                    {"face_id": face_id, "owner_id": owner_id, "encoding": vector.tolist()}
+                )
+            for shard, rows in by_shard.items():
+                self._upsert_rows(shard, rows)
+                copied[shard] += len(rows)
+        return {"copied": copied}
+
+    def rebalance(self, batch_size: int = 5000) -> Dict:
+        """
+        Move every encoding that sits on the wrong shard for the current URL list
+        Rows are copied before they are deleted, so searches never lose them
+        """
+        moved = defaultdict(int)
+        for source, engine in enumerate(self.engines):
+            last_face_id = 0
+            while True:
+                with engine.connect() as connection:
+                    rows = connection.execute(
+                        select(ShardEncoding.face_id, ShardEncoding.owner_id, ShardEncoding.encoding)
+                        .where(ShardEncoding.face_id > last_face_id)
+                        .order_by(ShardEncoding.face_id)
+                        .limit(batch_size)
+                    ).all()
+                if not rows:
+                    break
+                last_face_id = rows[-1].face_id
+
+                by_target = defaultdict(list)
+                for row in rows:
+                    target = self.shard_for(row.face_id)
+                    if target != source:
+                        by_target[target].append(
+                            {"face_id": row.face_id, "owner_id": row.owner_id, "encoding": list(row.encoding)}
+                        )
+
+                for target, misplaced in by_target.items():
+                    self._upsert_rows(target, misplaced)
+                    with engine.begin() as connection:
+                        connection.execute(delete(ShardEncoding).where(
+                            ShardEncoding.face_id.in_([row["face_id"] for row in misplaced])
+                        ))
+                    moved[f"{source}->{target}"] += len(misplaced)
+        return {"moved": dict(moved)}
+
+    def repair(self, batch_size: int = 500) -> Dict:
+        """
+        Make the shard copy of every queued face match the primary: upsert it if
+        face_encodings still has it, delete it if not. Faces that fail stay queued.
+        No primary locks are held while the shards are written; instead a queue entry
+        is only cleared if the face's gallery version didn't move meanwhile.
+        """
+        from services.database import SessionLocal
+        from models.face_scan import FaceEncoding, GalleryChange, ShardRepair
+
+        def versions(session, face_ids):
+            return dict(session.query(GalleryChange.face_id, func.max(GalleryChange.version))
+                        .filter(GalleryChange.face_id.in_(face_ids))
+                        .group_by(GalleryChange.face_id).all())
+
+        with SessionLocal() as session:
+            face_ids = [row[0] for row in session.query(ShardRepair.face_id)
+                        .order_by(ShardRepair.failed_at).limit(batch_size).all()]
+            if not face_ids:
+                return {"repaired": 0, "failed": 0, "changed": 0}
+            read_versions = versions(session, face_ids)
+            rows = {
+                row.face_id: (row.owner_id, list(row.encoding)) for row in
+                session.query(FaceEncoding.face_id, FaceEncoding.owner_id, FaceEncoding.encoding)
+                .filter(FaceEncoding.face_id.in_(face_ids)).all()
+            }
+
+        written, failed = [], 0
+        for face_id in face_ids:
+            try:
+                if face_id in rows:
+                    owner_id, encoding = rows[face_id]
+                    self.upsert(owner_id, face_id, encoding)
+                else:
+                    self.delete([face_id])
+                written.append(face_id)
+            except Exception as e:
+                failed += 1
+                print(f"❌ Shard repair of face {face_id} failed: {e}")
+
+        if not written:
+            return {"repaired": 0, "failed": failed, "changed": 0}
+
+        with SessionLocal() as session:
+            current_versions = versions(session, written)
+            # A face enrolled or merged after our read may now be stale on its shard
+            repaired = [f for f in written if current_versions.get(f) == read_versions.get(f)]
+            if repaired:
+                session.query(ShardRepair).filter(ShardRepair.face_id.in_(repaired)).delete(synchronize_session=False)
+            session.commit()
+        return {"repaired": len(repaired), "failed": failed, "changed": len(written) - len(repaired)}
+
+    def status(self) -> Dict:
+        """Encodings per shard next to the primary's count"""
+        from services.database import SessionLocal
+        from models.face_scan import FaceEncoding
+
+        counts = []
+        for engine in self.engines:
+            try:
+                with engine.connect() as connection:
+                    counts.append(connection.execute(select(func.count()).select_from(ShardEncoding)).scalar())
+            except Exception as e:
+                counts.append(f"unreachable: {e}")
+
+        with SessionLocal() as session:
+            primary = session.query(func.count(FaceEncoding.id)).scalar()
+        return {"primary": primary, "shards": counts}
+
+
+# One set of engines per worker process
+shards = GalleryShards(config.GALLERY_SHARD_URLS, config.GALLERY_SHARD_TIMEOUT_MS)
+
+
+# For command-line runs
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Manage the gallery shards listed in GALLERY_SHARD_URLS')
+    parser.add_argument('command', choices=['init', 'backfill', 'rebalance', 'repair', 'status'])
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    if not shards.enabled:
+        raise SystemExit("❌ GALLERY_SHARD_URLS is not set")
+
+    if args.command == 'init':
+        shards.init()
+        print(f"✅ Initialized {len(shards.urls)} shard(s)")
+    elif args.command == 'backfill':
+        print(json.dumps(shards.backfill(args.batch_size), indent=2))
+    elif args.command == 'rebalance':
+        print(json.dumps(shards.rebalance(args.batch_size), indent=2))
+    elif args.command == 'repair':
+        print(json.dumps(shards.repair(args.batch_size), indent=2))
+    else:
+        print(json.dumps(shards.status(), indent=2))
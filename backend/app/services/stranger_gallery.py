@@ -0,0 +1,205 @@
+"""
+Short-lived, per-worker memory of recently seen unknown faces
+
+When recognition finds no match, the embedding (with its detection and the
+frame) is kept for STRANGER_TTL_SECONDS instead of being thrown away:
+
+    - the next frames of the same stranger are answered without the database,
+      but only when the triangle inequality proves the database would miss too
+      (see StrangerGallery.lookup)
+    - first_meeting can enroll a remembered stranger by its stranger_id, reusing
+      the cached detection instead of running inference on a new photo
+
+Enrollments in this worker tighten the remembered bounds; enrollments in other
+workers (the person cache's "names" invalidations) clear the gallery. Without
+that listener nothing would tell us about them, so the gallery is only enabled
+while the listener is connected.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+import numpy as np
+from config import config
+from services.person_cache import on_new_person, invalidations_listening
+
+
+class Stranger:
+    __slots__ = ("id", "owner_id", "encoding", "face_result", "image_bytes",
+                 "gallery_distance", "first_seen", "last_seen", "sightings")
+
+    def __init__(self, owner_id: str, encoding: np.ndarray, face_result: Dict, image_bytes: bytes,
+                 gallery_distance: Optional[float]):
+        self.id = uuid.uuid4().hex
+        self.owner_id = owner_id
+        self.first_seen = self.last_seen = time.monotonic()
+        self.sightings = 1
+        self.update(encoding, face_result, image_bytes, gallery_distance)
+
+    def update(self, encoding: np.ndarray, face_result: Dict, image_bytes: bytes, gallery_distance: Optional[float]):
+        self.encoding = encoding
+        self.face_result = face_result
+        self.image_bytes = image_bytes
+        # Distance to the nearest known face of the owner when last searched (None = empty gallery)
+        self.gallery_distance = gallery_distance
+
+
+def _normalize(encoding) -> np.ndarray:
+    vector = np.asarray(encoding, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class StrangerGallery:
+    """Bounded LRU of unmatched faces, expired STRANGER_TTL_SECONDS after they were last confirmed unknown"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, radius: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.radius = radius
+        self._entries: "OrderedDict[str, Stranger]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "added": 0,
+            "refreshed": 0,
+            "promoted": 0,
+            "expired": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and invalidations_listening()
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if oldest.last_seen >= cutoff:
+                break
+            self._entries.popitem(last=False)
+            self._counters["expired"] += 1
+
+    def _nearest(self, owner_id: str, query: np.ndarray):
+        best, best_distance = None, None
+        for stranger in self._entries.values():
+            if stranger.owner_id != owner_id:
+                continue
+            distance = float(np.linalg.norm(stranger.encoding - query))
+            if best_distance is None or distance < best_distance:
+                best, best_distance = stranger, distance
+        return best, best_distance
+
+    def _touch(self, stranger: Stranger):
+        stranger.last_seen = time.monotonic()
+        stranger.sightings += 1
+        self._entries.move_to_end(stranger.id)
+
+    def lookup(self, owner_id: str, query_encoding, threshold: float) -> Optional[Stranger]:
+        """
+        A remembered stranger that proves this face is unknown too
+
+        For every known face f: d(query, f) >= d(stranger, f) - d(query, stranger)
+        >= gallery_distance - d(query, stranger). When that bound reaches the match
+        threshold the database search is skipped.
+
+        gallery_distance is whatever the search that missed returned: exact with the
+        gallery snapshot, approximate with pgvector's HNSW index (which can return a
+        neighbour farther than the true nearest). A hit therefore repeats that recent
+        answer for a near-identical face; it is only as exact as the search behind it.
+        A hit doesn't extend the stranger's TTL - only a database miss (remember) does.
+        """
+        if not self.enabled:
+            return None
+
+        query = _normalize(query_encoding)
+        with self._lock:
+            self._expire()
+            stranger, distance = self._nearest(owner_id, query)
+            if (stranger is None or distance > self.radius or
+                    (stranger.gallery_distance is not None and stranger.gallery_distance - distance < threshold)):
+                self._counters["misses"] += 1
+                return None
+
+            stranger.sightings += 1
+            self._counters["hits"] += 1
+            return stranger
+
+    def remember(self, owner_id: str, query_encoding, face_result: Dict, image_bytes: bytes,
+                 gallery_distance: Optional[float]) -> Optional[str]:
+        """
+        Keep a face the database didn't match; a stranger already within the radius
+        is refreshed with this frame and keeps its id
+        Returns the stranger_id
+        """
+        if not self.enabled:
+            return None
+
+        query = _normalize(query_encoding)
+        with self._lock:
+            self._expire()
+            stranger, distance = self._nearest(owner_id, query)
+            if stranger is not None and distance <= self.radius:
+                stranger.update(query, face_result, image_bytes, gallery_distance)
+                self._touch(stranger)
+                self._counters["refreshed"] += 1
+                return stranger.id
+
+            stranger = Stranger(owner_id, query, face_result, image_bytes, gallery_distance)
+            self._entries[stranger.id] = stranger
+            self._counters["added"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+            return stranger.id
+
+    def take(self, owner_id: str, stranger_id: str) -> Optional[Stranger]:
+        """Remove and return a remembered stranger for enrollment"""
+        with self._lock:
+            self._expire()
+            stranger = self._entries.get(stranger_id)
+            if stranger is None or stranger.owner_id != owner_id:
+                return None
+            del self._entries[stranger_id]
+            self._counters["promoted"] += 1
+            return stranger
+
+    def observe_enrollment(self, owner_id: str, encoding):
+        """A face was added to the owner's gallery: lower the bounds it beats"""
+        if not self.enabled:
+            return
+
+        enrolled = _normalize(encoding)
+        with self._lock:
+            for stranger in self._entries.values():
+                if stranger.owner_id != owner_id:
+                    continue
+                distance = float(np.linalg.norm(stranger.encoding - enrolled))
+                if stranger.gallery_distance is None or distance < stranger.gallery_distance:
+                    stranger.gallery_distance = distance
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters["invalidations"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else None,
+                **self._counters
+            }
+
+
+strangers = StrangerGallery(config.STRANGER_GALLERY_SIZE, config.STRANGER_TTL_SECONDS, config.STRANGER_MATCH_RADIUS)
+
+# Another worker may have enrolled one of our strangers
+on_new_person(strangers.clear)
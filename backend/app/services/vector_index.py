@@ -0,0 +1,74 @@
+"""
+Per-owner partial HNSW indexes on face_encodings
+
+Owner-scoped searches walk a graph the size of one user's contacts instead of
+the whole table. Building one is expensive, so it never happens on the request
+path: a periodic job (and this CLI) creates the missing ones with
+CREATE INDEX CONCURRENTLY, which lets enrollments keep writing during the build.
+Until an owner's index exists their searches use the owner_id btree index.
+With gallery shards the indexes are built on every shard instead of the primary.
+
+Usage:
+    cd backend/app
+    python -m services.vector_index
+"""
+import hashlib
+from typing import Dict, List
+from sqlalchemy import text
+from services.database import engine, list_owner_ids
+from services.shards import shards
+
+INDEX_PREFIX = "ix_face_encodings_hnsw_"
+
+
+def owner_index_name(owner_id: str) -> str:
+    return f"{INDEX_PREFIX}{hashlib.sha1(owner_id.encode()).hexdigest()[:16]}"
+
+
+def _existing_indexes(target) -> Dict[str, bool]:
+    """Name -> valid flag of the owner indexes on one database"""
+    with target.connect() as connection:
+        rows = connection.execute(text(
+            "SELECT c.relname, i.indisvalid FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "JOIN pg_class t ON t.oid = i.indrelid "
+            "WHERE t.relname = 'face_encodings' AND c.relname LIKE :prefix"
+        ), {"prefix": f"{INDEX_PREFIX}%"}).all()
+    return {name: valid for name, valid in rows}
+
+
+def build_owner_indexes(owner_ids: List[str] = None) -> Dict:
+    """
+    Create every missing owner index (one at a time, concurrently with writes)
+    A build that failed half-way leaves an INVALID index behind; it is dropped and rebuilt
+    """
+    owner_ids = list_owner_ids() if owner_ids is None else owner_ids
+    built = []
+
+    for target in (shards.engines if shards.enabled else [engine]):
+        existing = _existing_indexes(target)
+        # CONCURRENTLY can't run inside a transaction block
+        with target.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            for owner_id in owner_ids:
+                index_name = owner_index_name(owner_id)
+                if existing.get(index_name):
+                    continue
+                if index_name in existing:
+                    connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+
+                owner_literal = owner_id.replace("'", "''")
+                connection.execute(text(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON face_encodings "
+                    f"USING hnsw (encoding vector_l2_ops) WHERE owner_id = '{owner_literal}'"
+                ))
+                built.append({"database": target.url.render_as_string(hide_password=True), "owner_id": owner_id})
+                print(f"✅ Built vector index {index_name} for owner {owner_id}")
+
+    return {"built": built}
+
+
+# For command-line runs
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(build_owner_indexes(), indent=2))
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Modules import each other as top-level packages (run from backend/app)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# services.database builds its engine on import; nothing here connects to it
+os.environ.setdefault("DATABASE_URL", "postgresql+psycopg2://localhost/visage_test")
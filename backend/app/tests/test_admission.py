@@ -0,0 +1,132 @@
+import threading
+import time
+import pytest
+from services.admission import (
+    AdmissionController, AdmissionRejected, DeadlineExceeded, RECOGNITION, ENROLLMENT, BATCH
+)
+
+
+def wait_for_queue(controller: AdmissionController, depth: int, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while controller.stats()["queue_depth"] != depth:
+        assert time.monotonic() < deadline, f"queue never reached {depth}"
+        time.sleep(0.005)
+
+
+def start_waiter(controller: AdmissionController, priority: int, results: list, **kwargs):
+    """Queue one acquire in a thread; records its priority when admitted, or the exception"""
+    def run():
+        try:
+            controller.acquire(priority, **kwargs)
+        except Exception as e:
+            results.append(e)
+            return
+        results.append(priority)
+        controller.release()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_waiters_are_admitted_in_priority_order():
+    controller = AdmissionController(concurrency=1, queue_depth=10, shed_depth=10)
+    controller.acquire(RECOGNITION)
+
+    admitted, threads = [], []
+    for depth, priority in enumerate([BATCH, ENROLLMENT, RECOGNITION], start=1):
+        threads.append(start_waiter(controller, priority, admitted))
+        wait_for_queue(controller, depth)
+
+    controller.release()
+    for thread in threads:
+        thread.join(2)
+
+    assert admitted == [RECOGNITION, ENROLLMENT, BATCH]
+    assert controller.stats()["admitted"] == 4
+
+
+def test_low_priority_work_is_shed_first():
+    controller = AdmissionController(concurrency=1, queue_depth=3, shed_depth=1)
+    controller.acquire(RECOGNITION)
+    results = []
+    thread = start_waiter(controller, RECOGNITION, results)
+    wait_for_queue(controller, 1)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire(ENROLLMENT)
+    assert rejected.value.status_code == 429
+    assert rejected.value.retry_after >= 1
+
+    controller.release()
+    thread.join(2)
+    assert results == [RECOGNITION]
+    assert controller.stats()["shed_low_priority"] == 1
+
+
+def test_full_queue_evicts_lower_priority_waiter():
+    controller = AdmissionController(concurrency=1, queue_depth=1, shed_depth=5)
+    controller.acquire(RECOGNITION)
+
+    results = []
+    batch = start_waiter(controller, BATCH, results)
+    wait_for_queue(controller, 1)
+    recognition = start_waiter(controller, RECOGNITION, results)
+    batch.join(2)
+
+    assert isinstance(results[0], AdmissionRejected) and results[0].status_code == 503
+    wait_for_queue(controller, 1)
+
+    # Nothing lower-priority left to evict: same-priority work is rejected
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire(RECOGNITION)
+    assert rejected.value.status_code == 503
+
+    controller.release()
+    recognition.join(2)
+    assert results[1:] == [RECOGNITION]
+    stats = controller.stats()
+    assert stats["evicted"] == 1 and stats["rejected_full"] == 1
+
+
+def test_non_sheddable_callers_always_queue():
+    controller = AdmissionController(concurrency=1, queue_depth=0, shed_depth=0)
+    controller.acquire(RECOGNITION)
+
+    results = []
+    thread = start_waiter(controller, BATCH, results, sheddable=False)
+    wait_for_queue(controller, 1)
+    controller.release()
+    thread.join(2)
+
+    assert results == [BATCH]
+
+
+def test_deadline_passes_while_queued():
+    controller = AdmissionController(concurrency=1, queue_depth=10, shed_depth=10)
+    controller.acquire(RECOGNITION)
+
+    with pytest.raises(DeadlineExceeded):
+        controller.acquire(RECOGNITION, deadline=time.monotonic() + 0.05)
+
+    stats = controller.stats()
+    assert stats["expired"] == 1
+    assert stats["queue_depth"] == 0
+
+    # The expired waiter no longer blocks the queue
+    controller.release()
+    controller.acquire(RECOGNITION, deadline=time.monotonic() + 1)
+    controller.release()
+
+
+def test_zero_queue_depth_admits_only_free_slots():
+    controller = AdmissionController(concurrency=1, queue_depth=0, shed_depth=0)
+    controller.acquire(ENROLLMENT)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire(RECOGNITION)
+    assert rejected.value.status_code == 503
+
+    controller.release()
+    controller.acquire(RECOGNITION)
+    controller.release()
@@ -0,0 +1,103 @@
+import numpy as np
+from services import dedup
+from services.dedup import UnionFind, cluster, close_pairs
+
+
+def unit_vectors(*angles):
+    """2-d unit vectors padded to 128-d, so distances are easy to reason about"""
+    vectors = np.zeros((len(angles), 128), dtype=np.float32)
+    vectors[:, 0] = np.cos(angles)
+    vectors[:, 1] = np.sin(angles)
+    return vectors
+
+
+def test_union_find_joins_to_the_smallest_root():
+    union_find = UnionFind(6)
+    union_find.union(4, 5)
+    union_find.union(5, 2)
+    union_find.union(0, 1)
+
+    assert union_find.find(4) == union_find.find(5) == union_find.find(2) == 2
+    assert union_find.find(1) == 0
+    assert union_find.find(3) == 3
+
+
+def test_union_find_compresses_paths():
+    union_find = UnionFind(4)
+    union_find.parent[:] = [0, 0, 1, 2]  # chain 3 -> 2 -> 1 -> 0
+
+    assert union_find.find(3) == 0
+    assert list(union_find.parent) == [0, 0, 0, 0]
+
+
+def test_cluster_is_connected_components_with_min_samples_one():
+    rows, cols = np.array([0, 1, 4]), np.array([1, 2, 5])
+
+    clusters = cluster(7, rows, cols, min_samples=1)
+
+    assert sorted(sorted(c) for c in clusters) == [[0, 1, 2], [4, 5]]
+
+
+def test_border_point_joins_only_one_core_cluster():
+    # Cliques 0-3 and 5-8 are core; 4 touches core points 3 and 5 but has too few neighbours
+    cliques = [(a, b) for group in ([0, 1, 2, 3], [5, 6, 7, 8]) for a in group for b in group if a < b]
+    edges = cliques + [(3, 4), (4, 5)]
+    rows, cols = np.array([e[0] for e in edges]), np.array([e[1] for e in edges])
+
+    clusters = cluster(9, rows, cols, min_samples=4)
+
+    assert len(clusters) == 2
+    assert sum(4 in c for c in clusters) == 1
+    assert sorted(len(c) for c in clusters) == [4, 5]
+
+
+def test_cluster_drops_pairs_of_noise_points():
+    # With min_samples=3 neither point of a lone pair is core
+    clusters = cluster(2, np.array([0]), np.array([1]), min_samples=3)
+
+    assert clusters == []
+
+
+def test_close_pairs_finds_each_pair_once():
+    encodings = unit_vectors(0.0, 0.1, 1.5, 3.0)
+
+    rows, cols = close_pairs(encodings, radius=0.2, block_size=2, workers=1)
+
+    assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 1)]
+
+
+def test_merge_proposals_keep_the_earliest_met_person(monkeypatch):
+    face_ids = np.array([10, 11, 12, 13], dtype=np.int64)
+    encodings = unit_vectors(0.0, 0.05, 0.1, 2.0)
+    people = {
+        10: {"name": "Sam", "first_met_at": "2026-03-01T10:00:00"},
+        11: {"name": "sam", "first_met_at": "2026-01-15T09:00:00"},
+    }
+    monkeypatch.setattr(dedup, "load_face_encodings", lambda owner_id: (face_ids, encodings, None, None))
+    monkeypatch.setattr(dedup, "get_people_by_face_ids", lambda ids: {f: people[f] for f in ids if f in people})
+
+    proposals = dedup._propose_owner_merges("alice", radius=0.2, min_samples=1, workers=1)
+
+    assert proposals == [{
+        "owner_id": "alice",
+        "keep_face_id": 11,
+        # Faces without person info go last
+        "duplicate_face_ids": [10, 12],
+        "names": ["sam"],
+        "conflicting": False
+    }]
+
+
+def test_merge_proposals_flag_conflicting_names(monkeypatch):
+    face_ids = np.array([1, 2], dtype=np.int64)
+    people = {
+        1: {"name": "Sam", "first_met_at": "2026-01-01T00:00:00"},
+        2: {"name": "Alex", "first_met_at": "2026-02-01T00:00:00"},
+    }
+    monkeypatch.setattr(dedup, "load_face_encodings", lambda owner_id: (face_ids, unit_vectors(0.0, 0.05), None, None))
+    monkeypatch.setattr(dedup, "get_people_by_face_ids", lambda ids: people)
+
+    [proposal] = dedup._propose_owner_merges("alice", radius=0.2, min_samples=1, workers=1)
+
+    assert proposal["conflicting"] is True
+    assert proposal["names"] == ["alex", "sam"]
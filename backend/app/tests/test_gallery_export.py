@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from services.gallery_export import HEADER, MAGIC, pack_gallery, unpack_gallery, quantize_int8
+
+
+def gallery_rows(count: int = 3, dim: int = 128):
+    rng = np.random.default_rng(7)
+    matrix = rng.normal(size=(count, dim)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    face_ids = [101, 205, 309][:count]
+    profiles = [[i + 1, f"Person {i}", "Met at the café"] for i in range(count)]
+    return face_ids, matrix, profiles
+
+
+def test_header_round_trip():
+    face_ids, matrix, profiles = gallery_rows()
+
+    payload = pack_gallery(42, 17, face_ids, matrix, profiles, tombstones=[7, 8], full_snapshot=True)
+    unpacked = unpack_gallery(payload)
+
+    assert payload[:4] == MAGIC
+    assert HEADER.size % 4 == 0
+    assert unpacked["version"] == 42
+    assert unpacked["since"] == 17
+    assert unpacked["full_snapshot"] is True
+    assert unpacked["face_ids"].tolist() == face_ids
+    assert unpacked["tombstones"].tolist() == [7, 8]
+    assert unpacked["profiles"] == profiles
+
+
+def test_float16_round_trip_is_close():
+    face_ids, matrix, profiles = gallery_rows()
+
+    unpacked = unpack_gallery(pack_gallery(1, 0, face_ids, matrix, profiles, []))
+
+    assert unpacked["full_snapshot"] is False
+    assert unpacked["matrix"].shape == matrix.shape
+    np.testing.assert_allclose(unpacked["matrix"], matrix, atol=1e-3)
+
+
+def test_int8_round_trip_is_close():
+    face_ids, matrix, profiles = gallery_rows()
+
+    unpacked = unpack_gallery(pack_gallery(1, 0, face_ids, matrix, profiles, [], dtype="int8"))
+
+    # Half a quantization step per component at most
+    step = np.abs(matrix).max(axis=1, keepdims=True) / 127
+    assert np.all(np.abs(unpacked["matrix"] - matrix) <= step / 2 + 1e-6)
+
+
+def test_quantize_int8_keeps_zero_rows():
+    quantized, scales = quantize_int8(np.zeros((1, 4), dtype=np.float32))
+
+    assert quantized.tolist() == [[0, 0, 0, 0]]
+    assert scales.tolist() == [1.0]
+
+
+def test_delta_with_only_tombstones():
+    payload = pack_gallery(9, 8, [], np.empty((0, 128), dtype=np.float32), [], tombstones=[3], dtype="int8")
+    unpacked = unpack_gallery(payload)
+
+    assert len(unpacked["face_ids"]) == 0
+    assert unpacked["matrix"].shape == (0, 128)
+    assert unpacked["tombstones"].tolist() == [3]
+    assert unpacked["profiles"] == []
+
+
+def test_rejects_other_payloads():
+    with pytest.raises(ValueError):
+        unpack_gallery(b"NOPE" + bytes(HEADER.size))
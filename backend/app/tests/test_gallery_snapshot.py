@@ -0,0 +1,120 @@
+import os
+import numpy as np
+from services.gallery_snapshot import (
+    OP_DELETE, OP_UPSERT, InMemoryGallery, Snapshot, SnapshotDirectory,
+    compact, decode_log, encode_log_record
+)
+
+
+def axis(i: int, dim: int = 128) -> np.ndarray:
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[i] = 1.0
+    return vector
+
+
+def publish(directory, face_ids, owner_ids, generation: int = 1, version: int = 5) -> SnapshotDirectory:
+    store = SnapshotDirectory(str(directory))
+    matrix = np.vstack([axis(i) for i in range(len(face_ids))])
+    store.publish(generation, np.array(face_ids), owner_ids, matrix, version)
+    return store
+
+
+def test_log_records_round_trip():
+    data = (encode_log_record(OP_UPSERT, "alice", 7, 3, axis(2)) +
+            encode_log_record(OP_DELETE, "bob", 8, 4))
+
+    records, consumed = decode_log(data)
+
+    assert consumed == len(data)
+    (op, owner, face_id, version, vector), deleted = records
+    assert (op, owner, face_id, version) == (OP_UPSERT, "alice", 7, 3)
+    np.testing.assert_array_equal(vector, axis(2))
+    assert deleted == (OP_DELETE, "bob", 8, 4, None)
+
+
+def test_torn_tail_is_left_for_the_next_read():
+    whole = encode_log_record(OP_UPSERT, "alice", 7, 1, axis(0))
+    torn = encode_log_record(OP_UPSERT, "alice", 8, 2, axis(1))[:-10]
+
+    records, consumed = decode_log(whole + torn)
+
+    assert [r[2] for r in records] == [7]
+    assert consumed == len(whole)
+
+
+def test_snapshot_groups_rows_by_owner(tmp_path):
+    store = publish(tmp_path, [3, 1, 2], ["bob", "alice", "bob"])
+
+    snapshot = Snapshot(store.snapshot_path(1), 1)
+
+    assert snapshot.version == 5
+    assert snapshot.owner_rows("alice")[0].tolist() == [1]
+    assert snapshot.owner_rows("bob")[0].tolist() == [2, 3]
+    assert snapshot.owner_rows("carol")[0].tolist() == []
+
+
+def test_search_replays_the_delta_log(tmp_path):
+    store = publish(tmp_path, [1, 2], ["alice", "alice"])
+    gallery = InMemoryGallery(str(tmp_path))
+
+    assert gallery.search("alice", axis(1), threshold=0.5) == (2, 0.0)
+
+    store.append(encode_log_record(OP_DELETE, "alice", 2))
+    store.append(encode_log_record(OP_UPSERT, "alice", 9, 6, axis(5)))
+    store.append(encode_log_record(OP_UPSERT, "bob", 10, 7, axis(1)))
+
+    # Deleted face no longer matches; appended faces do, for their owner only
+    face_id, distance = gallery.search("alice", axis(1), threshold=0.5)
+    assert face_id is None and distance > 0.5
+    assert gallery.search("alice", axis(5), threshold=0.5) == (9, 0.0)
+    assert gallery.search("bob", axis(1), threshold=0.5) == (10, 0.0)
+    assert gallery.search("carol", axis(1), threshold=0.5) == (None, None)
+
+
+def test_compact_folds_the_log_into_the_next_generation(tmp_path):
+    store = publish(tmp_path, [1, 2], ["alice", "alice"])
+    store.append(encode_log_record(OP_DELETE, "alice", 1, 6))
+    store.append(encode_log_record(OP_UPSERT, "alice", 3, 7, axis(3)))
+    store.append(encode_log_record(OP_UPSERT, "alice", 3, 8, axis(4)))  # later record wins
+
+    result = compact(str(tmp_path))
+
+    assert result == {"generation": 2, "encodings": 2, "records_folded": 3}
+    assert store.current_generation() == 2
+    assert store.read_log(2) == b""
+    assert not os.path.exists(store.snapshot_path(1))
+
+    snapshot = Snapshot(store.snapshot_path(2), 2)
+    face_ids, rows = snapshot.owner_rows("alice")
+    assert snapshot.version == 8
+    assert face_ids.tolist() == [2, 3]
+    np.testing.assert_array_equal(rows[1], axis(4))
+
+    # Nothing left to fold
+    assert compact(str(tmp_path)) is None
+
+
+def test_publish_carries_records_appended_after_the_fold(tmp_path):
+    store = publish(tmp_path, [1], ["alice"])
+    store.append(encode_log_record(OP_UPSERT, "alice", 2, 6, axis(2)))
+    folded = len(store.read_log(1))
+    late = encode_log_record(OP_UPSERT, "alice", 3, 7, axis(3))
+    store.append(late)
+
+    store.publish(2, np.array([1, 2]), ["alice", "alice"], np.vstack([axis(0), axis(2)]), 6, carry_from=(1, folded))
+
+    assert store.read_log(2) == late
+    gallery = InMemoryGallery(str(tmp_path))
+    assert gallery.search("alice", axis(3), threshold=0.5) == (3, 0.0)
+
+
+def test_gallery_follows_a_new_generation(tmp_path):
+    store = publish(tmp_path, [1], ["alice"])
+    gallery = InMemoryGallery(str(tmp_path))
+    assert gallery.search("alice", axis(0), threshold=0.5) == (1, 0.0)
+
+    store.append(encode_log_record(OP_UPSERT, "alice", 2, 6, axis(1)))
+    compact(str(tmp_path))
+
+    assert gallery.search("alice", axis(1), threshold=0.5) == (2, 0.0)
+    assert gallery.stats()["generation"] == 2
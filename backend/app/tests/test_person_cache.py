@@ -0,0 +1,82 @@
+from services.person_cache import PersonCache
+
+
+def profile(person_id: int, times_met: int = 1):
+    return {"id": person_id, "name": f"Person {person_id}", "times_met": times_met}
+
+
+def name_key(person_id: int):
+    return ("name", "alice", f"person {person_id}")
+
+
+def test_fill_survives_changes_to_other_people():
+    cache = PersonCache(10)
+    generation = cache.generation
+    # Sightings of someone else while the fill was reading the database
+    cache.update_person(profile(2, times_met=5))
+    cache.invalidate_person(3)
+
+    cache.put(name_key(1), profile(1), generation)
+
+    assert cache.get(name_key(1)) == profile(1)
+
+
+def test_fill_that_raced_its_own_person_is_dropped():
+    cache = PersonCache(10)
+    generation = cache.generation
+    cache.update_person(profile(1, times_met=2))
+
+    cache.put(name_key(1), profile(1), generation)
+
+    assert cache.get(name_key(1)) is None
+
+
+def test_fill_that_raced_a_names_invalidation_is_dropped():
+    cache = PersonCache(10)
+    generation = cache.generation
+    cache.invalidate_names()
+
+    cache.put(name_key(1), profile(1), generation)
+
+    assert cache.get(name_key(1)) is None
+
+
+def test_write_through_and_invalidation_touch_every_key_of_a_person():
+    cache = PersonCache(10)
+    cache.put(name_key(1), profile(1), cache.generation)
+    cache.put(("name", "alice", "person"), profile(1), cache.generation)
+
+    cache.update_person(profile(1, times_met=3))
+    assert cache.get(name_key(1))["times_met"] == 3
+    assert cache.get(("name", "alice", "person"))["times_met"] == 3
+
+    cache.invalidate_person(1)
+    assert cache.get(name_key(1)) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_forgotten_changes_reject_older_fills():
+    cache = PersonCache(10)
+    cache.MAX_TRACKED_CHANGES = 2
+    generation = cache.generation
+    for person_id in (1, 2, 3):
+        cache.invalidate_person(person_id)
+
+    # Person 1's change is no longer tracked, so its age can't be proven
+    cache.put(name_key(1), profile(1), generation)
+    assert cache.get(name_key(1)) is None
+
+    cache.put(name_key(1), profile(1), cache.generation)
+    assert cache.get(name_key(1)) == profile(1)
+
+
+def test_lru_eviction():
+    cache = PersonCache(2)
+    for person_id in (1, 2):
+        cache.put(name_key(person_id), profile(person_id), cache.generation)
+    cache.get(name_key(1))
+    cache.put(name_key(3), profile(3), cache.generation)
+
+    assert cache.get(name_key(2)) is None
+    assert cache.get(name_key(1)) is not None
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,184 @@
+import { config } from './config';
+
+const MAGIC = 'VGAL';
+const HEADER_SIZE = 40;
+const DTYPE_FLOAT16 = 1;
+const DTYPE_INT8 = 2;
+const FLAG_FULL_SNAPSHOT = 1;
+
+export interface GalleryProfile {
+    face_id: number;
+    person_info_id: number | null;
+    name: string | null;
+    conversation_context: string | null;
+}
+
+export interface GalleryMatch {
+    profile: GalleryProfile;
+    distance: number;
+}
+
+interface GalleryDelta {
+    version: number;
+    fullSnapshot: boolean;
+    faceIds: Int32Array;
+    dim: number;
+    matrix: Float32Array;
+    tombstones: Int32Array;
+    profiles: [number | null, string | null, string | null][];
+}
+
+function float16ToFloat32(bits: number): number {
+    const sign = bits & 0x8000 ? -1 : 1;
+    const exponent = (bits >> 10) & 0x1f;
+    const fraction = bits & 0x3ff;
+
+    if (exponent === 0) {
+        return sign * 2 ** -14 * (fraction / 1024);
+    }
+    if (exponent === 0x1f) {
+        return fraction ? NaN : sign * Infinity;
+    }
+    return sign * 2 ** (exponent - 15) * (1 + fraction / 1024);
+}
+
+/**
+ * Parse a /gallery/export payload (layout documented in backend services/gallery_export.py)
+ */
+function parseGalleryExport(buffer: ArrayBuffer): GalleryDelta {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== MAGIC) {
+        throw new Error('Not a gallery export');
+    }
+
+    const dtype = view.getUint8(5);
+    const flags = view.getUint8(6);
+    const version = Number(view.getBigUint64(8, true));
+    const count = view.getUint32(24, true);
+    const tombstoneCount = view.getUint32(28, true);
+    const dim = view.getUint16(32, true);
+    const profilesLength = view.getUint32(36, true);
+
+    let offset = HEADER_SIZE;
+    const faceIds = new Int32Array(buffer.slice(offset, offset + 4 * count));
+    offset += 4 * count;
+
+    const matrix = new Float32Array(count * dim);
+    if (dtype === DTYPE_INT8) {
+        const scales = new Float32Array(buffer.slice(offset, offset + 4 * count));
+        offset += 4 * count;
+        const quantized = new Int8Array(buffer, offset, count * dim);
+        for (let i = 0; i < count * dim; i++) {
+            matrix[i] = quantized[i]! * scales[Math.floor(i / dim)]!;
+        }
+        offset += count * dim;
+    } else if (dtype === DTYPE_FLOAT16) {
+        for (let i = 0; i < count * dim; i++) {
+            matrix[i] = float16ToFloat32(view.getUint16(offset + 2 * i, true));
+        }
+        offset += 2 * count * dim;
+    } else {
+        throw new Error(`Unsupported gallery dtype: ${dtype}`);
+    }
+
+    const tombstones = new Int32Array(buffer.slice(offset, offset + 4 * tombstoneCount));
+    offset += 4 * tombstoneCount;
+
+    const profiles = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, offset, profilesLength)));
+
+    return {
+        version,
+        fullSnapshot: (flags & FLAG_FULL_SNAPSHOT) !== 0,
+        faceIds,
+        dim,
+        matrix,
+        tombstones,
+        profiles,
+    };
+}
+
+/**
+ * Local copy of one user's gallery, kept current with delta syncs
+ * so known faces can be matched without a round trip to the backend
+ */
+export class GalleryClient {
+    private version = 0;
+    private embeddings = new Map<number, Float32Array>();
+    private profiles = new Map<number, GalleryProfile>();
+
+    constructor(
+        private userId: string,
+        private dtype: 'float16' | 'int8' = 'float16',
+    ) {}
+
+    get size(): number {
+        return this.embeddings.size;
+    }
+
+    /**
+     * Fetch and apply everything that changed since the last sync
+     * Returns the gallery version now held locally
+     */
+    async sync(): Promise<number> {
+        const url = `${config.BACKEND_URL}/api/gallery/export?since=${this.version}&dtype=${this.dtype}`;
+        const response = await fetch(url, {
+            headers: { 'X-Owner-Id': this.userId },
+        });
+
+        if (!response.ok) {
+            throw new Error(`Gallery sync failed: ${response.status}`);
+        }
+
+        this.apply(parseGalleryExport(await response.arrayBuffer()));
+        return this.version;
+    }
+
+    private apply(delta: GalleryDelta): void {
+        if (delta.fullSnapshot) {
+            this.embeddings.clear();
+            this.profiles.clear();
+        }
+
+        for (const faceId of delta.tombstones) {
+            this.embeddings.delete(faceId);
+            this.profiles.delete(faceId);
+        }
+
+        delta.faceIds.forEach((faceId, i) => {
+            const [personInfoId, name, context] = delta.profiles[i]!;
+            this.embeddings.set(faceId, delta.matrix.slice(i * delta.dim, (i + 1) * delta.dim));
+            this.profiles.set(faceId, {
+                face_id: faceId,
+                person_info_id: personInfoId,
+                name,
+                conversation_context: context,
+            });
+        });
+
+        this.version = delta.version;
+    }
+
+    /**
+     * Nearest known face by L2 distance, or null if none is under the threshold
+     * (the caller should then fall back to the backend's /workflow2/recognize)
+     */
+    match(embedding: ArrayLike<number>, threshold: number): GalleryMatch | null {
+        let best: GalleryMatch | null = null;
+
+        for (const [faceId, stored] of this.embeddings) {
+            let sum = 0;
+            for (let i = 0; i < stored.length; i++) {
+                const diff = stored[i]! - embedding[i]!;
+                sum += diff * diff;
+            }
+            const distance = Math.sqrt(sum);
+
+            if (distance < threshold && (!best || distance < best.distance)) {
+                best = { profile: this.profiles.get(faceId)!, distance };
+            }
+        }
+
+        return best;
+    }
+}
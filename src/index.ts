@@ -187,7 +187,7 @@ class MentraOSApp extends AppServer {
                         try {
                             const response = await fetch(`${config.BACKEND_URL}/api/workflow1/first-meeting`, {
                                 method: "POST",
-                                headers: { "Content-Type": "application/x-www-form-urlencoded" },
+                                headers: { "Content-Type": "application/x-www-form-urlencoded", "X-Owner-Id": userId },
                                 body: new URLSearchParams({
                                     image_data: base64Image,
                                     name: personInfo.name || '',
@@ -232,7 +232,9 @@ class MentraOSApp extends AppServer {
                     }
 
                     // Query backend for person info
-                    const response = await fetch(`${config.BACKEND_URL}/api/people/search?name=${encodeURIComponent(name)}`);
+                    const response = await fetch(`${config.BACKEND_URL}/api/people/search?name=${encodeURIComponent(name)}`, {
+                        headers: { 'X-Owner-Id': userId }
+                    });
 
                     if (!response.ok) {
                         session.audio.speak("I couldn't find that person").catch(console.error);
@@ -302,6 +304,7 @@ class MentraOSApp extends AppServer {
                                     method: "POST",
                                     headers: {
                                         'Content-Type': 'application/x-www-form-urlencoded',
+                                        'X-Owner-Id': userId,
                                     },
                                     body: new URLSearchParams({
                                         image_data: base64Image,
@@ -347,7 +350,7 @@ class MentraOSApp extends AppServer {
 
                     const response = await fetch(`${config.BACKEND_URL}/api/workflow2/recognize`, {
                         method: "POST",
-                        headers: { "Content-Type": "application/x-www-form-urlencoded" },
+                        headers: { "Content-Type": "application/x-www-form-urlencoded", "X-Owner-Id": userId },
                         body: new URLSearchParams({ image_data: base64Image })
                     });
 